@@ -17,6 +17,35 @@ from swift_inspector import __version__ as version
 
 name = "swift-inspector"
 
+proxy_inspectors = [
+    'backends=swift_inspector.inspectors.backends:proxy_wrapper',
+    'handlers=swift_inspector.inspectors.handlers:proxy_wrapper',
+    'hub=swift_inspector.inspectors.hub:proxy_wrapper',
+    'nodes=swift_inspector.inspectors.nodes:proxy_wrapper',
+    'probe=swift_inspector.inspectors.probe:proxy_wrapper',
+    'profile=swift_inspector.inspectors.profile:proxy_wrapper',
+    'timing=swift_inspector.inspectors.timing:proxy_wrapper',
+    ]
+object_inspectors = [
+    'disk=swift_inspector.inspectors.disk:object_wrapper',
+    'handlers=swift_inspector.inspectors.handlers:object_wrapper',
+    'hub=swift_inspector.inspectors.hub:object_wrapper',
+    'profile=swift_inspector.inspectors.profile:object_wrapper',
+    'timing=swift_inspector.inspectors.timing:object_wrapper',
+    ]
+
+# The Memory inspector needs tracemalloc, which Python 2.7 only has when
+# patched for pytracemalloc.
+try:
+    import tracemalloc
+except ImportError:
+    pass
+else:
+    proxy_inspectors.append(
+        'memory=swift_inspector.inspectors.memory:proxy_wrapper')
+    object_inspectors.append(
+        'memory=swift_inspector.inspectors.memory:object_wrapper')
+
 setup(
     name = name,
     version = version,
@@ -40,5 +69,7 @@ setup(
             'swift_proxy_inspector=swift_inspector.middleware.proxy:filter_factory',
             'swift_object_inspector=swift_inspector.middleware.object:filter_factory',
             ],
+        'swift_inspector.proxy': proxy_inspectors,
+        'swift_inspector.object': object_inspectors,
         },
     )
@@ -0,0 +1,180 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tracking of the backend connections made by the proxy controllers.
+
+The proxy controllers import http_connect into their own namespace, so it is
+replaced there with a wrapper which records every connection made on behalf
+of a tracked request.  Requests are matched to their connections by the
+X-Trans-Id header the proxy sends to every backend, which also works for
+connections made from other greenthreads (e.g. a GreenPile of PUTs).
+
+A tracker may also carry headers to add to every backend request, in which
+case the Inspector-* headers of each backend response are kept on its
+record.
+"""
+
+import time
+import weakref
+
+CONTROLLER_MODULES = ['swift.proxy.controllers.base',
+                      'swift.proxy.controllers.obj']
+
+_trackers = weakref.WeakValueDictionary()
+_installed = False
+
+
+class BackendRecord(object):
+    """A single connection to an account, container or object server."""
+    __slots__ = ('ip', 'port', 'device', 'partition', 'method', 'path',
+                 'policy_index', 'start', 'connect_time', 'response_time',
+                 'status', 'inspector_headers')
+
+    def __init__(self, ip, port, device, partition, method, path,
+                 policy_index=None):
+        self.ip = ip
+        self.port = port
+        self.device = device
+        self.partition = partition
+        self.method = method
+        self.path = path
+        self.policy_index = policy_index
+        self.start = time.time()
+        self.connect_time = None
+        self.response_time = None
+        self.status = None
+        self.inspector_headers = None
+
+    @property
+    def server_type(self):
+        """The type of server contacted, based on the backend path."""
+        segments = len(self.path.strip('/').split('/', 2))
+        return ('account', 'container', 'object')[segments - 1]
+
+
+class BackendTracker(object):
+    """Collects the BackendRecords for a single client request."""
+    def __init__(self, trans_id):
+        self.trans_id = trans_id
+        self.records = []
+        self.backend_headers = {}
+        self.users = 0
+
+
+def _get_header(headers, name):
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.lower())
+    return value
+
+
+def _inspector_headers(resp):
+    return [(name.title(), value) for name, value in resp.getheaders()
+            if name.lower().startswith('inspector-')]
+
+
+def _wrap_response(conn, record, method_name, collect=False):
+    getresponse = getattr(conn, method_name, None)
+    if getresponse is None:
+        return
+
+    def _getresponse(*args, **kwargs):
+        try:
+            resp = getresponse(*args, **kwargs)
+        finally:
+            record.response_time = time.time() - record.start
+        record.status = resp.status
+        if collect:
+            inspector_headers = _inspector_headers(resp)
+            if inspector_headers:
+                record.inspector_headers = inspector_headers
+        return resp
+    setattr(conn, method_name, _getresponse)
+
+
+def _wrap_http_connect(http_connect):
+    def _http_connect(ipaddr, port, device, partition, method, path,
+                      headers=None, query_string=None, ssl=False):
+        tracker = None
+        if _trackers and headers:
+            tracker = _trackers.get(_get_header(headers, 'X-Trans-Id'))
+        if tracker is None:
+            return http_connect(ipaddr, port, device, partition, method,
+                                path, headers=headers,
+                                query_string=query_string, ssl=ssl)
+
+        record = BackendRecord(
+            ipaddr, port, device, partition, method, path,
+            _get_header(headers, 'X-Backend-Storage-Policy-Index'))
+        tracker.records.append(record)
+        if tracker.backend_headers:
+            headers = dict(headers)
+            headers.update(tracker.backend_headers)
+        try:
+            conn = http_connect(ipaddr, port, device, partition, method,
+                                path, headers=headers,
+                                query_string=query_string, ssl=ssl)
+        finally:
+            record.connect_time = time.time() - record.start
+        _wrap_response(conn, record, 'getexpect')
+        _wrap_response(conn, record, 'getresponse',
+                       bool(tracker.backend_headers))
+        return conn
+
+    _http_connect.inspector_original = http_connect
+    return _http_connect
+
+
+def install():
+    """Wrap http_connect in the proxy controllers, only done once."""
+    global _installed
+    if _installed:
+        return
+    for module_name in CONTROLLER_MODULES:
+        try:
+            module = __import__(module_name, fromlist=['http_connect'])
+        except ImportError:
+            continue
+        http_connect = getattr(module, 'http_connect', None)
+        if http_connect is None or hasattr(http_connect,
+                                           'inspector_original'):
+            continue
+        module.http_connect = _wrap_http_connect(http_connect)
+    _installed = True
+
+
+def track(trans_id):
+    """Start tracking backend connections for the given transaction id.
+
+    Inspectors tracking the same transaction id share a tracker, which is
+    tracked until each of them has called untrack once, or it is no longer
+    referenced.
+
+    :returns: a BackendTracker, or None if trans_id is not set.
+    """
+    if not trans_id:
+        return None
+    install()
+    tracker = _trackers.get(trans_id)
+    if tracker is None:
+        tracker = _trackers[trans_id] = BackendTracker(trans_id)
+    tracker.users += 1
+    return tracker
+
+
+def untrack(tracker):
+    """Release a tracker, which stops being tracked with its last user."""
+    if tracker is None or _trackers.get(tracker.trans_id) is not tracker:
+        return
+    tracker.users -= 1
+    if tracker.users <= 0:
+        del _trackers[tracker.trans_id]
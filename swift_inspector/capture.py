@@ -0,0 +1,160 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tail-based capture of slow and failed requests.
+
+Every request is timed and its backend connections tracked, which is about
+as cheap as the Timing and Handlers inspectors.  Only once a request is
+known to have been slower than the threshold, or to have returned a 5xx, is
+the full record of it built and kept in a fixed-size buffer of the most
+recent captures.
+"""
+
+import collections
+import time
+
+import swift.common.swob as swob
+
+from swift_inspector import backends
+from swift_inspector import stats
+from swift_inspector.inspectors import handlers as handlers_inspector
+from swift_inspector.inspectors import nodes as nodes_inspector
+from swift_inspector.utils import add_iter_wrapper, close_if_possible
+
+
+class CapturedRequest(object):
+    """app_iter wrapper deciding whether to capture a request once its
+    response body has been sent.
+    """
+    def __init__(self, app_iter, capture, env, request):
+        self.app_iter = app_iter
+        self.capture = capture
+        self.env = env
+        self.request = request
+        self.bytes_sent = 0
+        self.finished = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.app_iter:
+                self.bytes_sent += len(chunk)
+                yield chunk
+        finally:
+            self.finish()
+
+    def close(self):
+        try:
+            close_if_possible(self.app_iter)
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.request['last_byte'] = time.time() - self.request['start']
+        self.request['bytes'] = self.bytes_sent
+        self.capture.finish(self.env, self.request)
+
+
+class TailCapture(object):
+    """Keeps the records of the most recent slow or failed requests.
+
+    :param ring_cache: a swift_inspector.rings.RingCache.
+    :param threshold: requests taking longer than this many seconds to
+                      send their last byte are captured, 0 to only capture
+                      5xx responses.
+    :param capture_5xx: if True, 5xx responses are captured.
+    :param size: number of captured requests kept.
+    """
+    def __init__(self, ring_cache, threshold=1.0, capture_5xx=True,
+                 size=100):
+        self.ring_cache = ring_cache
+        self.threshold = threshold
+        self.capture_5xx = capture_5xx
+        self.captures = collections.deque(maxlen=size)
+        self.requests = 0
+        self.captured = 0
+
+    def start_response(self, env, start_response):
+        """Start timing a request, wrapping its start_response."""
+        request = {'start': time.time(), 'status': None,
+                   'tracker': backends.track(env.get('swift.trans_id'))}
+        add_iter_wrapper(env, lambda app_iter: CapturedRequest(
+            app_iter, self, env, request))
+
+        def _start_response(status, headers, exc_info=None):
+            request['status'] = status
+            request['timing'] = time.time() - request['start']
+            return start_response(status, headers, exc_info)
+        return _start_response
+
+    def should_capture(self, request):
+        if self.capture_5xx and str(request['status']).startswith('5'):
+            return True
+        return bool(self.threshold) and \
+            request['last_byte'] >= self.threshold
+
+    def finish(self, env, request):
+        self.requests += 1
+        tracker = request.pop('tracker')
+        backends.untrack(tracker)
+        if not self.should_capture(request):
+            return
+        self.captured += 1
+        self.captures.append(self.record(env, request, tracker))
+
+    def record(self, env, request, tracker):
+        """Build the full record of a captured request."""
+        status = request['status']
+        record = {'time': request['start'],
+                  'method': env.get('REQUEST_METHOD'),
+                  'path': env.get('PATH_INFO'),
+                  'trans_id': env.get('swift.trans_id'),
+                  'status': status and int(status.split(' ', 1)[0]),
+                  'timing': request.get('timing'),
+                  'last_byte': request['last_byte'],
+                  'bytes': request['bytes'],
+                  'handlers': None,
+                  'nodes': None}
+        if tracker is not None:
+            record['handlers'] = [
+                handlers_inspector.format_backend(backend, self.ring_cache)
+                for backend in tracker.records]
+        try:
+            placement = nodes_inspector.get_request_nodes(
+                self.ring_cache, env)
+        except Exception:
+            placement = None
+        if placement is not None:
+            ring_name, partition, primaries = placement
+            record['nodes'] = nodes_inspector.node_urls(primaries,
+                                                        partition)
+        return record
+
+    def response(self, env, start_response):
+        """Respond with the captured requests, most recent first.
+
+        The "limit" query parameter limits the number returned.
+        """
+        captures = list(reversed(self.captures))
+        try:
+            limit = int(swob.Request(env).params.get('limit', 0))
+        except ValueError:
+            limit = 0
+        if limit > 0:
+            captures = captures[:limit]
+        return stats.stats_response(env, start_response, {
+            'threshold': self.threshold,
+            'requests': self.requests,
+            'captured': self.captured,
+            'captures': captures})
@@ -0,0 +1,244 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Export of inspection records to a local sink.
+
+Requests only append their record to a bounded queue, dropping it if the
+queue is full, and a background greenthread sends the queued records to the
+sink in batches of newline delimited JSON.  The greenthread is started by
+the first record, so each worker process gets its own.
+"""
+
+import collections
+import json
+import os
+import socket
+import time
+import urlparse
+
+import eventlet
+import eventlet.green.socket as green_socket
+import eventlet.tpool as tpool
+
+MAX_DATAGRAM_SIZE = 8192
+
+
+class DatagramSink(object):
+    """Sends batches as datagrams of up to max_size bytes of lines."""
+    def __init__(self, family, address, max_size=MAX_DATAGRAM_SIZE):
+        self.address = address
+        self.max_size = max_size
+        self.sock = green_socket.socket(family, socket.SOCK_DGRAM)
+
+    def send(self, lines):
+        datagram = []
+        size = 0
+        for line in lines:
+            if datagram and size + len(line) > self.max_size:
+                self.sock.sendto(''.join(datagram), self.address)
+                datagram = []
+                size = 0
+            datagram.append(line)
+            size += len(line)
+        if datagram:
+            self.sock.sendto(''.join(datagram), self.address)
+
+    def close(self):
+        self.sock.close()
+
+
+class RotatingFileSink(object):
+    """Appends batches to a file, rotating it once it reaches max_bytes.
+
+    Writes are done in a tpool thread so the hub isn't blocked on the disk.
+    """
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backup_count=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fp = None
+
+    def _rotate(self):
+        self.fp.close()
+        self.fp = None
+        for i in range(self.backup_count - 1, 0, -1):
+            source = '{0}.{1}'.format(self.path, i)
+            if os.path.exists(source):
+                os.rename(source, '{0}.{1}'.format(self.path, i + 1))
+        if self.backup_count > 0:
+            os.rename(self.path, self.path + '.1')
+        else:
+            os.unlink(self.path)
+
+    def _write(self, data):
+        if self.fp is None:
+            self.fp = open(self.path, 'ab')
+        self.fp.write(data)
+        self.fp.flush()
+        if self.max_bytes and self.fp.tell() >= self.max_bytes:
+            self._rotate()
+
+    def send(self, lines):
+        tpool.execute(self._write, ''.join(lines))
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+
+def make_sink(uri, file_max_bytes=64 * 1024 * 1024, file_backups=5):
+    """Create a sink from a udp://host:port, unix:///path or file:///path
+    uri.
+
+    :raises ValueError: if the uri is not supported.
+    """
+    parsed = urlparse.urlparse(uri)
+    if parsed.scheme == 'udp':
+        if not parsed.hostname or not parsed.port:
+            raise ValueError('Invalid export sink {0!r}, expected '
+                             'udp://host:port'.format(uri))
+        return DatagramSink(socket.AF_INET, (parsed.hostname, parsed.port))
+    if parsed.scheme == 'unix':
+        return DatagramSink(socket.AF_UNIX, parsed.path)
+    if parsed.scheme == 'file':
+        return RotatingFileSink(parsed.path, file_max_bytes, file_backups)
+    raise ValueError('Invalid export sink {0!r}, expected a udp, unix or '
+                     'file uri'.format(uri))
+
+
+def inspection_record(env, server_type, status, headers):
+    """Build the record for an inspected request from its response."""
+    path = env.get('PATH_INFO')
+    if isinstance(path, str):
+        # Paths need not be UTF-8, and json can only encode ones that are.
+        path = path.decode('utf-8', 'replace')
+    record = {'time': time.time(),
+              'server_type': server_type,
+              'method': env.get('REQUEST_METHOD'),
+              'path': path,
+              'status': int(status.split(' ', 1)[0]),
+              'trans_id': env.get('swift.trans_id')}
+    for header, value in headers:
+        if header.lower().startswith('inspector-'):
+            record[header.lower()[len('inspector-'):]] = value
+    return record
+
+
+class Exporter(object):
+    """Queues inspection records and sends them to a sink in batches.
+
+    :param sink: an object with a send(lines) method.
+    :param max_queue: records queued beyond this are dropped.
+    :param batch_size: maximum records sent to the sink at a time.
+    :param interval: seconds to wait for records when the queue is empty.
+    :param logger: used to log errors from the sink.
+    """
+    def __init__(self, sink, max_queue=10000, batch_size=100, interval=1.0,
+                 logger=None):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self.logger = logger
+        self.queue = collections.deque()
+        self.queued = 0
+        self.exported = 0
+        self.dropped = 0
+        self.errors = 0
+        self._thread = None
+
+    def put(self, record):
+        """Queue a record without blocking, dropping it if the queue is
+        full.
+        """
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.queue.append(record)
+        self.queued += 1
+        if self._thread is None or self._thread.dead:
+            self._thread = eventlet.spawn(self._run)
+
+    def flush(self):
+        """Send up to batch_size queued records to the sink.
+
+        :returns: the number of records taken from the queue.
+        """
+        lines = []
+        taken = 0
+        while self.queue and taken < self.batch_size:
+            record = self.queue.popleft()
+            taken += 1
+            try:
+                lines.append(json.dumps(record) + '\n')
+            except (TypeError, ValueError) as e:
+                self.dropped += 1
+                if self.logger is not None:
+                    self.logger.error(
+                        'Error serializing inspection record: {0}'.format(e))
+        if not lines:
+            return taken
+        try:
+            self.sink.send(lines)
+            self.exported += len(lines)
+        except Exception as e:
+            self.errors += 1
+            self.dropped += len(lines)
+            if self.logger is not None:
+                self.logger.error(
+                    'Error exporting inspection records: {0}'.format(e))
+        return taken
+
+    def _run(self):
+        while True:
+            try:
+                flushed = self.flush()
+            except Exception:
+                flushed = 0
+                if self.logger is not None:
+                    self.logger.exception('Error exporting inspection records')
+            if not flushed:
+                eventlet.sleep(self.interval)
+            else:
+                # Let requests run between batches.
+                eventlet.sleep(0)
+
+    def start_response(self, env, server_type, start_response):
+        """Wrap start_response to export the request's inspection record."""
+        def _start_response(status, headers, exc_info=None):
+            self.put(inspection_record(env, server_type, status, headers))
+            return start_response(status, headers, exc_info)
+        return _start_response
+
+    def stats(self):
+        return {'queued': self.queued,
+                'exported': self.exported,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'size': len(self.queue)}
+
+
+def get_exporter(conf, logger=None):
+    """Create an Exporter from the middleware config.
+
+    :returns: an Exporter, or None if export_sink is not set.
+    """
+    uri = conf.get('export_sink')
+    if not uri:
+        return None
+    sink = make_sink(uri, int(conf.get('export_file_max_bytes',
+                                       64 * 1024 * 1024)),
+                     int(conf.get('export_file_backups', 5)))
+    return Exporter(sink, int(conf.get('export_queue_size', 10000)),
+                    int(conf.get('export_batch_size', 100)),
+                    float(conf.get('export_interval', 1.0)), logger)
@@ -0,0 +1,161 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fixed memory tracking of the partitions and devices taking the most
+requests.
+
+Each request is mapped to its partition and primary devices with the cached
+rings, and counted in a count-min sketch, for estimated counts, and a
+space-saving top-K, for the candidate heavy hitters.  A sliding window is
+kept as a ring of sketches, one per slice of the window, the oldest being
+reset as time moves on.
+"""
+
+import time
+
+from swift_inspector.inspectors import nodes as nodes_inspector
+
+
+class CountMinSketch(object):
+    """Count-min sketch of width counters for each of depth hashes."""
+    def __init__(self, width=1024, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for i in range(depth)]
+
+    def _indexes(self, key):
+        # Double hashing derives the depth row hashes from one hash.
+        h = hash(key)
+        h1 = h & 0xffffffff
+        h2 = ((h >> 32) & 0xffffffff) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        for row, index in zip(self.rows, self._indexes(key)):
+            row[index] += count
+
+    def estimate(self, key):
+        return min([row[index]
+                    for row, index in zip(self.rows, self._indexes(key))])
+
+
+class SpaceSaving(object):
+    """Space-saving top-K, keeping counts for at most k keys.
+
+    A new key replaces the key with the lowest count when full, taking over
+    its count, so counts are over-estimates by at most that minimum.
+    """
+    def __init__(self, k=32):
+        self.k = k
+        self.counts = {}
+
+    def add(self, key, count=1):
+        if key in self.counts or len(self.counts) < self.k:
+            self.counts[key] = self.counts.get(key, 0) + count
+            return
+        smallest = min(self.counts, key=self.counts.get)
+        self.counts[key] = self.counts.pop(smallest) + count
+
+
+class WindowedHeavyHitters(object):
+    """The heavy hitters over the last window seconds.
+
+    :param window: length of the window in seconds.
+    :param slices: number of sketches the window is split into.
+    """
+    def __init__(self, window=60, slices=6, width=1024, depth=4, k=32):
+        self.slice_time = float(window) / slices
+        self.width = width
+        self.depth = depth
+        self.k = k
+        self.slices = [None] * slices
+
+    def _current(self, now):
+        epoch = int(now // self.slice_time)
+        index = epoch % len(self.slices)
+        current = self.slices[index]
+        if current is None or current[0] != epoch:
+            current = self.slices[index] = (
+                epoch, CountMinSketch(self.width, self.depth),
+                SpaceSaving(self.k))
+        return current
+
+    def add(self, key, now=None):
+        if now is None:
+            now = time.time()
+        _, sketch, top = self._current(now)
+        sketch.add(key)
+        top.add(key)
+
+    def top(self, n=None, now=None):
+        """Get the n keys with the highest estimated counts in the window.
+
+        :returns: a list of (key, count) tuples, highest count first.
+        """
+        if now is None:
+            now = time.time()
+        oldest = int(now // self.slice_time) - len(self.slices)
+        live = [entry for entry in self.slices
+                if entry is not None and entry[0] > oldest]
+        candidates = set()
+        for _, _, top in live:
+            candidates.update(top.counts)
+        counts = [(key, sum([sketch.estimate(key) for _, sketch, _ in live]))
+                  for key in candidates]
+        counts.sort(key=lambda item: (-item[1], item[0]))
+        return counts[:n or self.k]
+
+
+class HotTracker(object):
+    """Counts the partitions and primary devices requests go to.
+
+    Object requests are only counted when their container's storage policy
+    is in the request's infocache, so no extra requests are made.
+    """
+    def __init__(self, ring_cache, window=60, slices=6, width=1024, depth=4,
+                 k=32):
+        self.ring_cache = ring_cache
+        self.partitions = WindowedHeavyHitters(window, slices, width, depth,
+                                               k)
+        self.devices = WindowedHeavyHitters(window, slices, width, depth, k)
+        self.errors = 0
+
+    def track(self, env):
+        try:
+            placement = nodes_inspector.get_request_nodes(
+                self.ring_cache, env)
+        except Exception:
+            self.errors += 1
+            return
+        if placement is None:
+            return
+        ring_name, partition, primaries = placement
+        now = time.time()
+        self.partitions.add('{0}/{1}'.format(ring_name, partition), now)
+        for node in primaries:
+            self.devices.add('{0}:{1}/{2}'.format(
+                node['ip'], node['port'], node['device']), now)
+
+    def start_response(self, env, start_response):
+        """Wrap start_response to track the request once it's handled."""
+        def _start_response(status, headers, exc_info=None):
+            self.track(env)
+            return start_response(status, headers, exc_info)
+        return _start_response
+
+    def stats(self):
+        return {
+            'partitions': [{'partition': key, 'count': count}
+                           for key, count in self.partitions.top()],
+            'devices': [{'device': key, 'count': count}
+                        for key, count in self.devices.top()],
+            'errors': self.errors}
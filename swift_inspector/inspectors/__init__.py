@@ -10,16 +10,37 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+"""Registry of the inspectors available to each server type.
 
-# import swift_inspector.handlers
-# import swift_inspector.nodes
-# import swift_inspector.timing
+Inspectors are found through the "swift_inspector.proxy" and
+"swift_inspector.object" entry point groups, with the built in inspectors
+also listed here so they are found when running from a source tree.  An
+inspector's module is only imported the first time it is requested, and
+inspectors whose REQUIRED_MODULES can't be imported are left out.
+"""
 
-# inspector_handlers = {
-#     'handlers': swift_inspector.handlers.wrapper,
-#     'nodes': swift_inspector.nodes.wrapper,
-#     'timing': swift_inspector.timing.wrapper
-# }
+ENTRY_POINT_GROUP = 'swift_inspector.{0}'
+
+BUILTIN_INSPECTORS = {
+    'proxy': {
+        'backends': 'swift_inspector.inspectors.backends:proxy_wrapper',
+        'handlers': 'swift_inspector.inspectors.handlers:proxy_wrapper',
+        'hub': 'swift_inspector.inspectors.hub:proxy_wrapper',
+        'memory': 'swift_inspector.inspectors.memory:proxy_wrapper',
+        'nodes': 'swift_inspector.inspectors.nodes:proxy_wrapper',
+        'probe': 'swift_inspector.inspectors.probe:proxy_wrapper',
+        'profile': 'swift_inspector.inspectors.profile:proxy_wrapper',
+        'timing': 'swift_inspector.inspectors.timing:proxy_wrapper'},
+    'object': {
+        'disk': 'swift_inspector.inspectors.disk:object_wrapper',
+        'handlers': 'swift_inspector.inspectors.handlers:object_wrapper',
+        'hub': 'swift_inspector.inspectors.hub:object_wrapper',
+        'memory': 'swift_inspector.inspectors.memory:object_wrapper',
+        'profile': 'swift_inspector.inspectors.profile:object_wrapper',
+        'timing': 'swift_inspector.inspectors.timing:object_wrapper'}}
+
+# Modules an inspector needs, which it is left out without.
+REQUIRED_MODULES = {'memory': 'tracemalloc'}
 
 
 def import_from(module, name):
@@ -27,16 +48,102 @@ def import_from(module, name):
     return getattr(module, name)
 
 
-inspector_handlers = {
-    'proxy': {},
-    'object': {}}
+def _load_spec(spec):
+    module, _, name = spec.partition(':')
+    return import_from(module, name)
+
+
+def _importable(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def _entry_points(server_type):
+    """Get the installed inspector entry points for a server type."""
+    try:
+        import pkg_resources
+    except ImportError:
+        return {}
+    entry_points = {}
+    for entry_point in pkg_resources.iter_entry_points(
+            ENTRY_POINT_GROUP.format(server_type)):
+        entry_points[entry_point.name.lower()] = entry_point.load
+    return entry_points
+
+
+class InspectorRegistry(object):
+    """The inspectors for one middleware instance, loaded on first use.
 
+    :param server_type: 'proxy' or 'object'.
+    :param enable: names of the inspectors to make available, or None for
+                   all of them.
+    :param exclude: names of inspectors to leave out.
+    :param logger: used to log inspectors that fail to load.
+    """
+    def __init__(self, server_type, enable=None, exclude=None, logger=None):
+        self.server_type = server_type
+        self.logger = logger
+        loaders = {}
+        for name, spec in BUILTIN_INSPECTORS.get(server_type, {}).items():
+            loaders[name] = lambda spec=spec: _load_spec(spec)
+        # Installed entry points may replace the built in inspectors.
+        loaders.update(_entry_points(server_type))
+        for name, module in REQUIRED_MODULES.items():
+            if name in loaders and not _importable(module):
+                del loaders[name]
+        if enable is not None:
+            enable = set(name.lower() for name in enable)
+            loaders = dict((name, loader) for name, loader in loaders.items()
+                           if name in enable)
+        for name in exclude or []:
+            loaders.pop(name.lower(), None)
+        self._loaders = loaders
+        self._handlers = {}
 
-for server_type in ['proxy', 'object']:
-    for inspector_name in ['handlers', 'nodes', 'timing']:
-        mod = import_from('swift_inspector.inspectors', inspector_name)
+    def names(self):
+        """Get the sorted names of the available inspectors."""
+        return sorted(self._loaders)
+
+    def get(self, name, default=None):
+        """Get an inspector's handler, importing it if needed.
+
+        Inspectors that fail to load are logged and treated as unavailable.
+        """
+        handler = self._handlers.get(name)
+        if handler is not None:
+            return handler
+        loader = self._loaders.get(name)
+        if loader is None:
+            return default
         try:
-            inspector_handlers[server_type][inspector_name] = getattr(
-                mod, '{0}_wrapper'.format(server_type))
-        except AttributeError:
-            continue
+            handler = loader()
+        except Exception:
+            if self.logger is not None:
+                self.logger.exception(
+                    'Unable to load {0} inspector {1}'.format(
+                        self.server_type, name))
+            del self._loaders[name]
+            return default
+        self._handlers[name] = handler
+        return handler
+
+    def loaded(self):
+        """Get the sorted names of the inspectors imported so far."""
+        return sorted(self._handlers)
+
+    def __contains__(self, name):
+        return name in self._loaders
+
+
+def get_registry(server_type, conf, logger=None):
+    """Get an InspectorRegistry for a server type from its config.
+
+    "inspectors" lists the inspectors to enable, all of them if unset, and
+    "exclude" lists inspectors to leave out.
+    """
+    enable = conf.get('inspectors', '').split() or None
+    return InspectorRegistry(server_type, enable,
+                             conf.get('exclude', '').split(), logger)
@@ -0,0 +1,51 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from swift_inspector import backends
+
+
+def format_node(record):
+    """Format the inspector headers returned by a backend.
+
+    ip:port/device/partition method status followed by "; name=value" for
+    each header, without the "Inspector-" prefix.
+    """
+    node = '{0}:{1}/{2}/{3} {4} {5}'.format(
+        record.ip, record.port, record.device, record.partition,
+        record.method, record.status or '-')
+    for name, value in record.inspector_headers:
+        node += '; {0}={1}'.format(name[len('Inspector-'):], value)
+    return node
+
+
+def proxy_wrapper(env, start_response, app, config):
+    tracker = backends.track(env.get('swift.trans_id'))
+    # start_response may be called again with exc_info, but the tracker
+    # must only be released once.
+    tracking = [tracker is not None]
+    signer = config.get('backend_signer')
+    if tracker is not None and signer is not None:
+        tracker.backend_headers = signer.headers()
+
+    def _start_response(status, headers, exc_info=None):
+        """start_response wrapper to add request status to env."""
+        if tracker is None:
+            headers.append(('Inspector-Backends', 'Unknown'))
+        else:
+            if tracking[0]:
+                tracking[0] = False
+                backends.untrack(tracker)
+            headers.append(('Inspector-Backends', ', '.join(
+                [format_node(record) for record in tracker.records
+                 if record.inspector_headers])))
+        return start_response(status, headers, exc_info)
+    return _start_response
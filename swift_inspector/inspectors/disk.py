@@ -0,0 +1,265 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Disk and network I/O timing for the object server.
+
+The request body is timed by wrapping wsgi.input, and the response body by
+wrapping the app_iter, where the time spent getting each chunk is reading
+from disk and the time spent before the next chunk is requested is sending
+it to the client.  Writes to disk are timed by wrapping the methods of the
+diskfile writer: write() runs in the request's greenthread, and the final
+fsync and rename (or link) run in a tpool thread during _finalize_put.
+"""
+import threading
+import time
+import weakref
+
+import eventlet
+
+from swift_inspector.utils import add_iter_wrapper, close_if_possible
+
+WRITE_METHODS = ('PUT',)
+
+_recorders = weakref.WeakKeyDictionary()
+_finalizing = threading.local()
+_installed = False
+
+
+class DiskRecorder(object):
+    """Counters for the I/O done by a single request."""
+    __slots__ = ('input_bytes', 'input_time', 'write_bytes', 'write_time',
+                 'fsync_time', 'rename_time', 'finalize_time', 'read_bytes',
+                 'read_time', 'send_time', '__weakref__')
+
+    def __init__(self):
+        self.input_bytes = 0
+        self.input_time = 0.0
+        self.write_bytes = 0
+        self.write_time = 0.0
+        self.fsync_time = 0.0
+        self.rename_time = 0.0
+        self.finalize_time = 0.0
+        self.read_bytes = 0
+        self.read_time = 0.0
+        self.send_time = 0.0
+
+
+def _rate(nbytes, seconds):
+    if seconds <= 0:
+        return 0.0
+    return nbytes / seconds
+
+
+def format_put(recorder):
+    return ('input_bytes={0} input_time={1:.6f} input_rate={2:.1f} '
+            'write_bytes={3} write_time={4:.6f} write_rate={5:.1f} '
+            'fsync_time={6:.6f} rename_time={7:.6f} '
+            'finalize_time={8:.6f}').format(
+                recorder.input_bytes, recorder.input_time,
+                _rate(recorder.input_bytes, recorder.input_time),
+                recorder.write_bytes, recorder.write_time,
+                _rate(recorder.write_bytes, recorder.write_time),
+                recorder.fsync_time, recorder.rename_time,
+                recorder.finalize_time)
+
+
+def format_get(recorder):
+    return ('read_bytes={0} read_time={1:.6f} read_rate={2:.1f} '
+            'send_time={3:.6f} send_rate={4:.1f}').format(
+                recorder.read_bytes, recorder.read_time,
+                _rate(recorder.read_bytes, recorder.read_time),
+                recorder.send_time,
+                _rate(recorder.read_bytes, recorder.send_time))
+
+
+class TimedInput(object):
+    """wsgi.input wrapper timing how long reads of the request body take."""
+    def __init__(self, wsgi_input, recorder):
+        self.wsgi_input = wsgi_input
+        self.recorder = recorder
+
+    def _timed(self, method, *args, **kwargs):
+        start = time.time()
+        data = method(*args, **kwargs)
+        self.recorder.input_time += time.time() - start
+        self.recorder.input_bytes += len(data)
+        return data
+
+    def read(self, *args, **kwargs):
+        return self._timed(self.wsgi_input.read, *args, **kwargs)
+
+    def readline(self, *args, **kwargs):
+        return self._timed(self.wsgi_input.readline, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.wsgi_input, name)
+
+
+class TimedAppIter(object):
+    """app_iter wrapper timing reading the response body from disk and
+    sending it to the client.
+    """
+    def __init__(self, app_iter, env, recorder, logger):
+        self.app_iter = app_iter
+        self.env = env
+        self.recorder = recorder
+        self.logger = logger
+        self.finished = False
+
+    def __iter__(self):
+        recorder = self.recorder
+        iterator = iter(self.app_iter)
+        try:
+            while True:
+                start = time.time()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                sent = time.time()
+                recorder.read_time += sent - start
+                recorder.read_bytes += len(chunk)
+                yield chunk
+                recorder.send_time += time.time() - sent
+        finally:
+            self.finish()
+
+    def close(self):
+        try:
+            close_if_possible(self.app_iter)
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        release(self.recorder)
+        if self.logger is None:
+            return
+        method = self.env.get('REQUEST_METHOD', 'UNKNOWN')
+        self.logger.info('Inspector-Disk-Object {0} {1} {2}'.format(
+            method, self.env.get('PATH_INFO', ''),
+            format_get(self.recorder)))
+        self.logger.timing('{0}.disk_read.timing'.format(method),
+                           self.recorder.read_time * 1000)
+        self.logger.timing('{0}.send.timing'.format(method),
+                           self.recorder.send_time * 1000)
+        self.logger.update_stats('{0}.disk_read.xfer'.format(method),
+                                 self.recorder.read_bytes)
+
+
+def release(recorder):
+    """Stop recording writes made by the current greenthread."""
+    current = eventlet.getcurrent()
+    if _recorders.get(current) is recorder:
+        del _recorders[current]
+
+
+def _timed_writer_init(init):
+    def __init__(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        self._inspector_recorder = _recorders.get(eventlet.getcurrent())
+    return __init__
+
+
+def _timed_write(write):
+    def write_chunk(self, chunk):
+        recorder = getattr(self, '_inspector_recorder', None)
+        if recorder is None:
+            return write(self, chunk)
+        start = time.time()
+        try:
+            return write(self, chunk)
+        finally:
+            recorder.write_time += time.time() - start
+            recorder.write_bytes += len(chunk)
+    return write_chunk
+
+
+def _timed_finalize_put(finalize_put):
+    def _finalize_put(self, *args, **kwargs):
+        recorder = getattr(self, '_inspector_recorder', None)
+        if recorder is None:
+            return finalize_put(self, *args, **kwargs)
+        _finalizing.recorder = recorder
+        start = time.time()
+        try:
+            return finalize_put(self, *args, **kwargs)
+        finally:
+            recorder.finalize_time += time.time() - start
+            _finalizing.recorder = None
+    return _finalize_put
+
+
+def _timed_call(func, attr):
+    def _timed(*args, **kwargs):
+        recorder = getattr(_finalizing, 'recorder', None)
+        if recorder is None:
+            return func(*args, **kwargs)
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            setattr(recorder, attr,
+                    getattr(recorder, attr) + time.time() - start)
+    return _timed
+
+
+def install():
+    """Wrap the diskfile writer to time writes, fsync and rename.
+
+    Only done once, and only the parts present in the installed version of
+    swift are wrapped.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    try:
+        import swift.obj.diskfile as diskfile
+    except ImportError:
+        return
+    writer_cls = getattr(diskfile, 'BaseDiskFileWriter', None) or \
+        getattr(diskfile, 'DiskFileWriter', None)
+    if writer_cls is None:
+        return
+    writer_cls.__init__ = _timed_writer_init(writer_cls.__init__)
+    writer_cls.write = _timed_write(writer_cls.write)
+    if hasattr(writer_cls, '_finalize_put'):
+        writer_cls._finalize_put = _timed_finalize_put(
+            writer_cls._finalize_put)
+    # Newer versions link an O_TMPFILE into place instead of renaming.
+    for name, attr in (('fsync', 'fsync_time'), ('renamer', 'rename_time'),
+                       ('link_fd_to_path', 'rename_time')):
+        if hasattr(diskfile, name):
+            setattr(diskfile, name,
+                    _timed_call(getattr(diskfile, name), attr))
+
+
+def object_wrapper(env, start_response, app, config):
+    install()
+    logger = config.get('logger')
+    recorder = DiskRecorder()
+    _recorders[eventlet.getcurrent()] = recorder
+    if 'wsgi.input' in env:
+        env['wsgi.input'] = TimedInput(env['wsgi.input'], recorder)
+    add_iter_wrapper(env, lambda app_iter: TimedAppIter(
+        app_iter, env, recorder, logger))
+
+    def _start_response(status, headers, exc_info=None):
+        """start_response wrapper to add request status to env."""
+        release(recorder)
+        if env.get('REQUEST_METHOD') in WRITE_METHODS:
+            headers.append(('Inspector-Disk-Object', format_put(recorder)))
+        return start_response(status, headers, exc_info)
+    return _start_response
@@ -11,6 +11,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from swift_inspector import backends
+
 
 def _get_handler(env):
     protocol = env.get('SERVER_PROTOCOL').lower().split('/')[0]
@@ -21,10 +23,64 @@ def _get_handler(env):
     return handler
 
 
+def _is_handoff(ring_cache, record):
+    """Check if a backend record was for a handoff node.
+
+    :returns: True or False, or None if the ring could not be checked.
+    """
+    try:
+        node_ring = ring_cache.get_ring(record.server_type,
+                                        record.policy_index)
+        primaries = node_ring.get_part_nodes(int(record.partition))
+    except Exception:
+        return None
+    for node in primaries:
+        if (node['ip'], node['port'], node['device']) == (
+                record.ip, int(record.port), record.device):
+            return False
+    return True
+
+
+def format_backend(record, ring_cache=None):
+    """Format a BackendRecord in the compact Inspector-Handlers format.
+
+    ip:port/device/partition method status connect_time response_time
+    followed by "handoff" if the node was not a primary for the partition.
+    """
+    def _format_time(value):
+        if value is None:
+            return '-'
+        return '{0:.4f}'.format(value)
+
+    handler = '{0}:{1}/{2}/{3} {4} {5} {6} {7}'.format(
+        record.ip, record.port, record.device, record.partition,
+        record.method, record.status or '-',
+        _format_time(record.connect_time),
+        _format_time(record.response_time))
+    if ring_cache is not None and _is_handoff(ring_cache, record):
+        handler += ' handoff'
+    return handler
+
+
 def proxy_wrapper(env, start_response, app, config):
+    ring_cache = config.get('ring_cache')
+    tracker = backends.track(env.get('swift.trans_id'))
+    # start_response may be called again with exc_info, but the tracker
+    # must only be released once.
+    tracking = [tracker is not None]
+
     def _start_response(status, headers, exc_info=None):
         """start_response wrapper to add request status to env."""
         headers.append(('Inspector-Handlers-Proxy', _get_handler(env)))
+        if tracker is None:
+            headers.append(('Inspector-Handlers', 'Unknown'))
+        else:
+            if tracking[0]:
+                tracking[0] = False
+                backends.untrack(tracker)
+            headers.append(('Inspector-Handlers', ', '.join(
+                [format_backend(record, ring_cache)
+                 for record in tracker.records])))
         return start_response(status, headers, exc_info)
     return _start_response
 
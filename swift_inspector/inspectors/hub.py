@@ -0,0 +1,187 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time a request's greenthread spent waiting for the eventlet hub.
+
+Each time the greenthread yields and is resumed by the hub, the time from
+when it became runnable until it ran is its scheduling delay.  It became
+runnable no earlier than when the hub last returned from polling, or when
+it yielded if that was later (e.g. eventlet.sleep(0)).
+
+The optional LagSampler greenthread sleeps for an interval and records how
+much longer than that it took to wake, which is the time the hub was
+blocked by the process.  The lag overlapping a request is reported with it.
+"""
+import collections
+import time
+
+import eventlet
+import eventlet.hubs
+
+from swift_inspector.stats import get_policy_index
+from swift_inspector.utils import (
+    add_iter_wrapper, add_switch_tracer, remove_switch_tracer)
+
+_woke = [0.0]
+
+
+def install(hub):
+    """Wrap a hub's wait to record when it last returned from polling."""
+    if getattr(hub, 'inspector_wait', None) is not None:
+        return
+    wait = hub.wait
+
+    def _wait(*args, **kwargs):
+        try:
+            return wait(*args, **kwargs)
+        finally:
+            _woke[0] = time.time()
+    hub.inspector_wait = wait
+    hub.wait = _wait
+
+
+class LagSampler(object):
+    """Samples the lag of the hub from a background greenthread.
+
+    :param interval: seconds to sleep between samples.
+    :param max_samples: number of the most recent lagging samples kept.
+    """
+    def __init__(self, interval, max_samples=1024):
+        self.interval = interval
+        self.samples = collections.deque(maxlen=max_samples)
+        self.max_lag = 0.0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+
+    def record(self, end, lag):
+        if lag > 0:
+            self.samples.append((end, lag))
+            self.max_lag = max(self.max_lag, lag)
+
+    def _run(self):
+        while True:
+            start = time.time()
+            eventlet.sleep(self.interval)
+            end = time.time()
+            self.record(end, end - start - self.interval)
+
+    def overlap(self, start, end):
+        """Get the total lag overlapping the time from start to end."""
+        total = 0.0
+        for sample_end, lag in reversed(self.samples):
+            if sample_end <= start:
+                break
+            total += max(0.0, min(end, sample_end) -
+                         max(start, sample_end - lag))
+        return total
+
+
+def get_lag_sampler(conf):
+    """Create a LagSampler from the middleware config.
+
+    :returns: a LagSampler, or None if hub_lag_interval is not set.
+    """
+    interval = float(conf.get('hub_lag_interval', 0))
+    if interval <= 0:
+        return None
+    return LagSampler(interval, int(conf.get('hub_lag_samples', 1024)))
+
+
+class HubTrace(object):
+    """Scheduling delay and run time of the current greenthread."""
+    def __init__(self):
+        self.hub = eventlet.hubs.get_hub()
+        install(self.hub)
+        self.start = time.time()
+        self.running_since = self.start
+        self.yielded_at = None
+        self.yields = 0
+        self.delay = 0.0
+        self.max_delay = 0.0
+        self.run = 0.0
+        self.tracing = True
+        add_switch_tracer(self)
+
+    def __call__(self, switched_to, other):
+        now = time.time()
+        if not switched_to:
+            self.run += now - self.running_since
+            self.yielded_at = now
+            return
+        self.running_since = now
+        if other is not self.hub.greenlet or self.yielded_at is None:
+            return
+        self.yields += 1
+        delay = now - max(_woke[0], self.yielded_at)
+        self.delay += delay
+        self.max_delay = max(self.max_delay, delay)
+
+    def stop(self):
+        """Stop tracing the greenthread, if not already stopped."""
+        if self.tracing:
+            self.tracing = False
+            remove_switch_tracer(self)
+
+    def stop_after_app(self, app_iter):
+        """Iter wrapper stopping tracing once the app has returned or
+        raised, in case start_response was never called.
+        """
+        self.stop()
+        return app_iter
+
+    def finish(self):
+        self.stop()
+        end = time.time()
+        self.run += end - self.running_since
+        return end
+
+
+def _hub_wrapper(env, start_response, config, header):
+    stats = config.get('stats')
+    sampler = config.get('hub_sampler')
+    if sampler is not None:
+        sampler.start()
+    trace = HubTrace()
+    add_iter_wrapper(env, trace.stop_after_app)
+
+    def _start_response(status, headers, exc_info=None):
+        """start_response wrapper to add request status to env."""
+        end = trace.finish()
+        hub_lag = '-'
+        if sampler is not None:
+            hub_lag = '{0:.6f}'.format(sampler.overlap(trace.start, end))
+        headers.append((header, 'yields={0} sched_delay={1:.6f} '
+                        'max_delay={2:.6f} run={3:.6f} hub_lag={4}'.format(
+                            trace.yields, trace.delay, trace.max_delay,
+                            trace.run, hub_lag)))
+        if stats is not None:
+            stats.record(env.get('REQUEST_METHOD'), status,
+                         get_policy_index(env, headers), 'sched_delay',
+                         trace.delay)
+        return start_response(status, headers, exc_info)
+    return _start_response
+
+
+def proxy_wrapper(env, start_response, app, config):
+    return _hub_wrapper(env, start_response, config, 'Inspector-Hub')
+
+
+def object_wrapper(env, start_response, app, config):
+    return _hub_wrapper(env, start_response, config, 'Inspector-Hub-Object')
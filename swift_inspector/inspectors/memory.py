@@ -0,0 +1,166 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Memory allocated while handling a request, using tracemalloc.
+
+tracemalloc traces the whole process, so it is only started while at least
+one inspected request is being traced, and allocations made by other
+greenthreads in that time are included.  Python 2.7 only has tracemalloc
+when patched for pytracemalloc, and the inspector isn't registered without
+it.
+"""
+import random
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from swift_inspector.utils import add_iter_wrapper, close_if_possible
+
+_active = [0]
+_started = [False]
+
+
+def _start_tracing(frames):
+    if _active[0] == 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        _started[0] = True
+    _active[0] += 1
+
+
+def _stop_tracing():
+    _active[0] -= 1
+    if _active[0] == 0 and _started[0]:
+        tracemalloc.stop()
+        _started[0] = False
+
+
+def format_sites(stats, top):
+    """Format the top allocation sites of a snapshot comparison."""
+    sites = []
+    for stat in stats[:top]:
+        frame = stat.traceback[0]
+        sites.append('{0}:{1} {2:+d}B {3:+d}'.format(
+            frame.filename, frame.lineno, stat.size_diff, stat.count_diff))
+    return ', '.join(sites)
+
+
+class MemoryTrace(object):
+    """Tracks the memory allocated from the start of a request."""
+    def __init__(self, frames=1, top=0):
+        self.top = top
+        self.finished = False
+        _start_tracing(frames)
+        if hasattr(tracemalloc, 'reset_peak') and _active[0] == 1:
+            tracemalloc.reset_peak()
+        self.start_size = tracemalloc.get_traced_memory()[0]
+        self.snapshot = None
+        if top:
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def result(self):
+        """Get the allocation delta, peak and top sites so far."""
+        current, peak = tracemalloc.get_traced_memory()
+        sites = ''
+        if self.snapshot is not None:
+            sites = format_sites(tracemalloc.take_snapshot().compare_to(
+                self.snapshot, 'lineno'), self.top)
+        return current - self.start_size, max(0, peak - self.start_size), \
+            sites
+
+    def finish(self):
+        """Get the final result and stop tracing."""
+        if self.finished:
+            return None
+        self.finished = True
+        try:
+            return self.result()
+        finally:
+            _stop_tracing()
+
+
+class MemoryAppIter(object):
+    """app_iter wrapper logging the memory allocated by the whole request,
+    including the response body.
+    """
+    def __init__(self, app_iter, env, trace, logger):
+        self.app_iter = app_iter
+        self.env = env
+        self.trace = trace
+        self.logger = logger
+
+    def __iter__(self):
+        try:
+            for chunk in self.app_iter:
+                yield chunk
+        finally:
+            self.finish()
+
+    def close(self):
+        try:
+            close_if_possible(self.app_iter)
+        finally:
+            self.finish()
+
+    def finish(self):
+        result = self.trace.finish()
+        if result is None or self.logger is None:
+            return
+        delta, peak, sites = result
+        method = self.env.get('REQUEST_METHOD', 'UNKNOWN')
+        self.logger.info('Inspector-Memory {0} {1} delta={2} peak={3} '
+                         'sites={4}'.format(method,
+                                            self.env.get('PATH_INFO', ''),
+                                            delta, peak, sites))
+        self.logger.update_stats('{0}.memory.delta'.format(method), delta)
+        self.logger.update_stats('{0}.memory.peak'.format(method), peak)
+
+
+def _memory_wrapper(env, start_response, config, header):
+    if not config.get('signed'):
+        value = 'Requires hmac_key'
+    elif tracemalloc is None:
+        value = 'Unavailable'
+    elif random.random() >= config.get('memory_sample_rate', 1.0):
+        value = 'Not Sampled'
+    else:
+        value = None
+    if value is not None:
+        def _start_response(status, headers, exc_info=None):
+            """start_response wrapper to add request status to env."""
+            headers.append((header, value))
+            return start_response(status, headers, exc_info)
+        return _start_response
+
+    trace = MemoryTrace(config.get('memory_frames', 1),
+                        config.get('memory_top', 0))
+    add_iter_wrapper(env, lambda app_iter: MemoryAppIter(
+        app_iter, env, trace, config.get('logger')))
+
+    def _start_response(status, headers, exc_info=None):
+        """start_response wrapper to add request status to env."""
+        delta, peak, sites = trace.result()
+        headers.append((header, 'delta={0} peak={1}'.format(delta, peak)))
+        if sites:
+            headers.append((header + '-Sites', sites))
+        return start_response(status, headers, exc_info)
+    return _start_response
+
+
+def proxy_wrapper(env, start_response, app, config):
+    return _memory_wrapper(env, start_response, config, 'Inspector-Memory')
+
+
+def object_wrapper(env, start_response, app, config):
+    return _memory_wrapper(env, start_response, config,
+                           'Inspector-Memory-Object')
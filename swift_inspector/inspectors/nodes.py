@@ -10,16 +10,216 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
+import time
 import urllib
 
-import swift.common.ring as ring
-import swift.common.storage_policy as storage_policy
 import swift.common.swob as swob
+import swift.common.utils as utils
 import swift.proxy.controllers.base as controllers
 
 
+NODES_TEMPLATE = 'http://{ip}:{port}/{device}/{partition}'
+CONTAINER_INFO_TTL = 10
+CONTAINER_INFO_CACHE_SIZE = 10000
+HANDOFF_LIMIT = 10
+HANDOFF_MAX_LIMIT = 100
+HANDOFF_MAX_OFFSET = 1000
+
+_container_policies = {}
+
+
+def get_ring(ring_cache, container=None, obj=None, policy_index=None):
+    """Get the ring responsible for an account, container or object path."""
+    if obj is not None:
+        return ring_cache.get_ring('object', policy_index)
+    if container is not None:
+        return ring_cache.get_ring('container')
+    return ring_cache.get_ring('account')
+
+
+def get_nodes(ring_cache, account, container=None, obj=None,
+              policy_index=None):
+    """Look up the partition and primary nodes for a path.
+
+    :returns: a tuple of (ring, partition, nodes)
+    """
+    node_ring = get_ring(ring_cache, container, obj, policy_index)
+    partition, nodes = node_ring.get_nodes(account, container, obj)
+    return node_ring, partition, nodes
+
+
+def get_request_nodes(ring_cache, env):
+    """Get the ring name, partition and primary nodes of a request.
+
+    Only the cached rings are used, so object requests are only looked up
+    if their container's storage policy is in the request's infocache.
+
+    :returns: a tuple of (ring name, partition, nodes), or None if the
+              request isn't to an account, container or object or its
+              policy isn't known.
+    """
+    try:
+        version, account, container, obj = utils.split_path(
+            env.get('PATH_INFO', ''), 2, 4, rest_with_last=True)
+    except ValueError:
+        return None
+    account = urllib.unquote(account)
+    policy_index = None
+    if container is not None:
+        container = urllib.unquote(container)
+    if obj is not None:
+        obj = urllib.unquote(obj)
+        info = env.get('swift.infocache', {}).get(
+            controllers.get_cache_key(account, container))
+        if not info or info.get('storage_policy') is None:
+            return None
+        policy_index = int(info['storage_policy'])
+    node_ring, partition, primaries = get_nodes(
+        ring_cache, account, container, obj, policy_index)
+    if obj is not None:
+        ring_name = 'object-{0}'.format(policy_index)
+    elif container is not None:
+        ring_name = 'container'
+    else:
+        ring_name = 'account'
+    return ring_name, partition, primaries
+
+
+def node_urls(nodes, partition):
+    """Format nodes as a list of URLs."""
+    return [NODES_TEMPLATE.format(
+        ip=node['ip'],
+        port=node['port'],
+        device=node['device'],
+        partition=partition) for node in nodes]
+
+
+def format_nodes(nodes, partition):
+    """Format nodes as a comma separated list of URLs."""
+    return ', '.join(node_urls(nodes, partition))
+
+
+class HandoffCache(object):
+    """LRU of the handoff nodes enumerated per ring and partition.
+
+    Handoffs are only taken from the ring's get_more_nodes generator as far
+    as has been requested, and the generator is kept to continue from for
+    later pages.  All entries are dropped when the ring cache reloads a
+    ring.
+    """
+    def __init__(self, ring_cache, max_size=1024):
+        self.ring_cache = ring_cache
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._reloads = ring_cache.reloads
+        self._cache = collections.OrderedDict()
+
+    def get_handoffs(self, node_ring, partition, offset, limit):
+        """Get up to limit handoff nodes after the first offset.
+
+        :returns: a tuple of (handoff nodes, True if there are more)
+        """
+        if self.ring_cache.reloads != self._reloads:
+            self._reloads = self.ring_cache.reloads
+            self._cache.clear()
+        key = (node_ring.serialized_path, partition)
+        entry = self._cache.pop(key, None)
+        if entry is None or entry[0] is not node_ring:
+            self.misses += 1
+            entry = (node_ring, [], node_ring.get_more_nodes(partition))
+        else:
+            self.hits += 1
+        _, handoffs, more_nodes = entry
+        end = offset + limit
+        # There are fewer handoffs than devices in the ring, so a large
+        # offset doesn't enumerate any further than that.  Take one extra
+        # node to know if there are more.
+        while len(handoffs) <= min(end, len(node_ring.devs)):
+            try:
+                handoffs.append(next(more_nodes))
+            except StopIteration:
+                break
+        if self.max_size > 0:
+            if len(self._cache) >= self.max_size:
+                self._cache.popitem(last=False)
+            self._cache[key] = entry
+        return handoffs[offset:end], len(handoffs) > end
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache)}
+
+
+def get_handoff_range(env, config):
+    """Get the offset and limit of the handoffs requested.
+
+    The Inspector-Handoffs-Offset and Inspector-Handoffs-Limit request
+    headers default to 0 and handoff_limit, and the limit is capped at
+    handoff_max_limit.
+
+    :raises ValueError: if either header is not a non-negative integer or
+                        the offset is over handoff_max_offset.
+    """
+    offset = int(env.get('HTTP_INSPECTOR_HANDOFFS_OFFSET', 0))
+    limit = int(env.get('HTTP_INSPECTOR_HANDOFFS_LIMIT',
+                        config.get('handoff_limit', HANDOFF_LIMIT)))
+    if offset < 0 or limit < 0:
+        raise ValueError('Handoff offset and limit must not be negative')
+    if offset > config.get('handoff_max_offset', HANDOFF_MAX_OFFSET):
+        raise ValueError('Handoff offset is too large')
+    return offset, min(limit, config.get('handoff_max_limit',
+                                         HANDOFF_MAX_LIMIT))
+
+
+def get_container_policy(app, account, container, version='v1', env=None):
+    """Get the storage policy index of a container.
+
+    The container info is taken from the first of these that has it: the
+    request's env, memcache, a short-lived local cache and finally a
+    backend request to the container server.
+
+    :param env: environ of the request, used for its infocache and memcache.
+    :returns: a tuple of (policy index, source) where source is one of
+              'env', 'memcache', 'local' or 'backend'.
+    """
+    cache_key = controllers.get_cache_key(account, container)
+    if env is not None:
+        info = env.get('swift.infocache', {}).get(cache_key)
+        if info:
+            return info.get('storage_policy'), 'env'
+        memcache = env.get('swift.cache')
+        if memcache is not None:
+            info = memcache.get(cache_key)
+            if info:
+                return info.get('storage_policy'), 'memcache'
+
+    key = (account, container)
+    now = time.time()
+    entry = _container_policies.get(key)
+    if entry is not None and entry[1] > now:
+        return entry[0], 'local'
+
+    backend_env = {'PATH_INFO': '/{0}/{1}/{2}'.format(
+        version, account, container)}
+    if env is not None and 'swift.cache' in env:
+        backend_env['swift.cache'] = env['swift.cache']
+    container_info = controllers.get_container_info(
+        backend_env, app, swift_source='LE')
+    policy_index = container_info['storage_policy']
+    if len(_container_policies) >= CONTAINER_INFO_CACHE_SIZE:
+        _container_policies.clear()
+    _container_policies[key] = (policy_index, now + CONTAINER_INFO_TTL)
+    return policy_index, 'backend'
+
+
 def proxy_wrapper(env, start_response, app, config):
-    swift_dir = config.get('swift_dir')
+    ring_cache = config.get('ring_cache')
+    handoff_cache = config.get('handoff_cache')
+    if handoff_cache is None:
+        handoff_cache = HandoffCache(ring_cache, max_size=0)
     request = swob.Request(env)
 
     def _start_response(status, headers, exc_info=None):
@@ -40,54 +240,30 @@ def proxy_wrapper(env, start_response, app, config):
 
         storage_policy_index = None
         if obj is not None:
-            container_info = controllers.get_container_info(
-                {'PATH_INFO': '/{0}/{1}/{2}'.format(
-                    version, account, container)},
-                app, swift_source='LE')
-            storage_policy_index = container_info['storage_policy']
-            obj_ring = storage_policy.POLICIES.get_object_ring(
-                storage_policy_index, swift_dir)
-            partition, nodes = obj_ring.get_nodes(
-                account, container, obj)
-            more_nodes = obj_ring.get_more_nodes(partition)
-            nodes_template = ('http://{ip}:{port}/{device}/{partition}')
-        elif container is not None:
-            partition, nodes = ring.Ring(
-                swift_dir, ring_name='container').get_nodes(account, container)
-            more_nodes = ring.Ring(
-                swift_dir, ring_name='container').get_more_nodes(partition)
-            nodes_template = ('http://{ip}:{port}/{device}/{partition}')
-        else:
-            partition, nodes = ring.Ring(
-                swift_dir, ring_name='account').get_nodes(account)
-            more_nodes = ring.Ring(
-                swift_dir, ring_name='account').get_more_nodes(partition)
-            nodes_template = ('http://{ip}:{port}/{device}/{partition}')
-
-        object_nodes = []
-        for node in nodes:
-            object_nodes.append(nodes_template.format(
-                ip=node['ip'],
-                port=node['port'],
-                device=node['device'],
-                partition=partition,
-                account=urllib.quote(account),
-                container=urllib.quote(container or ''),
-                obj=urllib.quote(obj or '')))
-        headers.append(('Inspector-Nodes', ', '.join(object_nodes)))
-
-        object_more_nodes = []
-        for node in more_nodes:
-            object_more_nodes.append(nodes_template.format(
-                ip=node['ip'],
-                port=node['port'],
-                device=node['device'],
-                partition=partition,
-                account=urllib.quote(account),
-                container=urllib.quote(container or ''),
-                obj=urllib.quote(obj or '')))
-        headers.append(('Inspector-More-Nodes', ', '.join(
-            object_more_nodes)))
+            storage_policy_index, source = get_container_policy(
+                app, account, container, version, env)
+            headers.append(('Inspector-Container-Info-Source', source))
+
+        node_ring, partition, nodes = get_nodes(
+            ring_cache, account, container, obj, storage_policy_index)
+        headers.append(('Inspector-Nodes', format_nodes(nodes, partition)))
+        try:
+            offset, limit = get_handoff_range(env, config)
+        except ValueError:
+            headers.append(('Inspector-Error', 'Invalid Header: '
+                            'Inspector-Handoffs-Offset and '
+                            'Inspector-Handoffs-Limit must be '
+                            'non-negative integers, and the offset at '
+                            'most {0}'.format(config.get(
+                                'handoff_max_offset', HANDOFF_MAX_OFFSET))))
+            return start_response(status, headers, exc_info)
+        handoffs, more = handoff_cache.get_handoffs(
+            node_ring, partition, offset, limit)
+        headers.append(('Inspector-More-Nodes',
+                        format_nodes(handoffs, partition)))
+        if more:
+            headers.append(('Inspector-More-Nodes-Next',
+                            str(offset + limit)))
 
         return start_response(status, headers, exc_info)
 
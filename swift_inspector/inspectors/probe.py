@@ -0,0 +1,115 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import itertools
+import time
+import urllib
+
+import eventlet
+import swift.common.bufferedhttp as bufferedhttp
+import swift.common.swob as swob
+
+from swift_inspector.inspectors import nodes as nodes_inspector
+
+
+def probe_node(node, partition, path, headers, timeout):
+    """HEAD a path on a node.
+
+    :returns: a tuple of (status, latency, x-timestamp, etag), where status
+              is 'timeout' or 'error' if no response was received.
+    """
+    start = time.time()
+    conn = None
+    try:
+        with eventlet.Timeout(timeout):
+            conn = bufferedhttp.http_connect(
+                node['ip'], node['port'], node['device'], partition, 'HEAD',
+                path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+        return (resp.status, time.time() - start,
+                resp.getheader('X-Timestamp'), resp.getheader('Etag'))
+    except eventlet.Timeout:
+        return 'timeout', time.time() - start, None, None
+    except Exception:
+        return 'error', time.time() - start, None, None
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def probe_nodes(nodes, partition, path, headers, timeout, concurrency):
+    """Probe nodes concurrently, returning results in the order of nodes."""
+    pool = eventlet.GreenPool(max(1, min(concurrency, len(nodes))))
+    return list(pool.imap(
+        lambda node: probe_node(node, partition, path, headers, timeout),
+        nodes))
+
+
+def format_probe(node, partition, result, handoff):
+    status, latency, timestamp, etag = result
+    probe = '{0}:{1}/{2}/{3} {4} {5:.4f} {6} {7}'.format(
+        node['ip'], node['port'], node['device'], partition, status,
+        latency, timestamp or '-', etag or '-')
+    if handoff:
+        probe += ' handoff'
+    return probe
+
+
+def proxy_wrapper(env, start_response, app, config):
+    ring_cache = config.get('ring_cache')
+    handoffs = config.get('probe_handoffs', 0)
+    timeout = config.get('probe_timeout', 1.0)
+    concurrency = config.get('probe_concurrency', 10)
+    request = swob.Request(env)
+
+    def _start_response(status, headers, exc_info=None):
+        """start_response wrapper to add request status to env."""
+        try:
+            version, account, container, obj = request.split_path(
+                2, 4, rest_with_last=True)
+        except ValueError:
+            headers.append(('Inspector-Probe', ''))
+            return start_response(status, headers, exc_info)
+
+        account = urllib.unquote(account)
+        if container is not None:
+            container = urllib.unquote(container)
+        if obj is not None:
+            obj = urllib.unquote(obj)
+
+        backend_headers = {'User-Agent': 'swift-inspector-probe'}
+        if 'swift.trans_id' in env:
+            backend_headers['X-Trans-Id'] = env['swift.trans_id']
+        storage_policy_index = None
+        if obj is not None:
+            storage_policy_index = nodes_inspector.get_container_policy(
+                app, account, container, version, env)[0]
+            backend_headers['X-Backend-Storage-Policy-Index'] = \
+                storage_policy_index
+
+        node_ring, partition, primaries = nodes_inspector.get_nodes(
+            ring_cache, account, container, obj, storage_policy_index)
+        probed = list(primaries)
+        if handoffs:
+            probed.extend(itertools.islice(
+                node_ring.get_more_nodes(partition), handoffs))
+        path = '/' + '/'.join(
+            [part for part in (account, container, obj) if part is not None])
+        results = probe_nodes(probed, partition, path, backend_headers,
+                              timeout, concurrency)
+        headers.append(('Inspector-Probe', ', '.join([
+            format_probe(node, partition, result, i >= len(primaries))
+            for i, (node, result) in enumerate(zip(probed, results))])))
+        return start_response(status, headers, exc_info)
+
+    return _start_response
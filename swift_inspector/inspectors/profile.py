@@ -0,0 +1,132 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""CPU profile of a single request.
+
+cProfile profiles the whole OS thread, so a switch tracer enables each
+request's profiler only while its greenthread is running.
+"""
+import cProfile
+import os
+import pstats
+import time
+
+from swift_inspector.utils import (
+    add_iter_wrapper, add_switch_tracer, close_if_possible,
+    remove_switch_tracer)
+
+
+def _start(profiler):
+    """Enable profiler while the current greenthread runs.
+
+    :returns: the switch tracer to pass to _stop.
+    """
+    def _tracer(switched_to, other):
+        if switched_to:
+            profiler.enable()
+        else:
+            profiler.disable()
+    add_switch_tracer(_tracer)
+    profiler.enable()
+    return _tracer
+
+
+def _stop(profiler, tracer):
+    profiler.disable()
+    remove_switch_tracer(tracer)
+
+
+def top_functions(profiler, top):
+    """Format the top functions of a profile by cumulative time."""
+    stats = pstats.Stats(profiler).stats
+    functions = sorted(stats.items(), key=lambda item: -item[1][3])[:top]
+    return ', '.join([
+        '{0}:{1}({2}) {3:.4f} {4}'.format(
+            os.path.basename(filename), lineno, name, cumulative, calls)
+        for (filename, lineno, name), (_, calls, _, cumulative, _)
+        in functions])
+
+
+class ProfileAppIter(object):
+    """app_iter wrapper profiling the response body, which stops the
+    profiler once it is closed.
+    """
+    def __init__(self, app_iter, env, profiler, tracer, config):
+        self.app_iter = app_iter
+        self.env = env
+        self.profiler = profiler
+        self.tracer = tracer
+        self.config = config
+        self.finished = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.app_iter:
+                yield chunk
+        finally:
+            self.finish()
+
+    def close(self):
+        try:
+            close_if_possible(self.app_iter)
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        _stop(self.profiler, self.tracer)
+        profile_dir = self.config.get('profile_dir')
+        logger = self.config.get('logger')
+        path = None
+        if profile_dir:
+            path = os.path.join(profile_dir, '{0}-{1:.6f}.pstats'.format(
+                self.env.get('swift.trans_id', 'unknown'), time.time()))
+            self.profiler.dump_stats(path)
+        if logger is not None:
+            logger.info('Inspector-Profile {0} {1} pstats={2} top={3}'.format(
+                self.env.get('REQUEST_METHOD'), self.env.get('PATH_INFO'),
+                path or '-', top_functions(
+                    self.profiler, self.config.get('profile_top', 10))))
+
+
+def _profile_wrapper(env, start_response, config, header):
+    if not config.get('signed'):
+        def _start_response(status, headers, exc_info=None):
+            """start_response wrapper to add request status to env."""
+            headers.append((header, 'Requires hmac_key'))
+            return start_response(status, headers, exc_info)
+        return _start_response
+
+    profiler = cProfile.Profile()
+    tracer = _start(profiler)
+    add_iter_wrapper(env, lambda app_iter: ProfileAppIter(
+        app_iter, env, profiler, tracer, config))
+
+    def _start_response(status, headers, exc_info=None):
+        """start_response wrapper to add request status to env."""
+        # Getting the stats disables the profiler.
+        top = top_functions(profiler, config.get('profile_top', 10))
+        profiler.enable()
+        headers.append((header, top))
+        return start_response(status, headers, exc_info)
+    return _start_response
+
+
+def proxy_wrapper(env, start_response, app, config):
+    return _profile_wrapper(env, start_response, config, 'Inspector-Profile')
+
+
+def object_wrapper(env, start_response, app, config):
+    return _profile_wrapper(env, start_response, config,
+                            'Inspector-Profile-Object')
@@ -13,23 +13,104 @@
 
 import time
 
+from swift_inspector.stats import get_policy_index
+from swift_inspector.utils import add_iter_wrapper, close_if_possible
 
-def proxy_wrapper(env, start_response, app, config):
-    def _start_response(status, headers, exc_info=None):
-        """start_response wrapper to add request status to env."""
-        end = time.time()
-        headers.append(('Inspector-Timing', str(end - start)))
-        return start_response(status, headers, exc_info)
 
-    start = time.time()
-    return _start_response
+class StreamingTiming(object):
+    """app_iter wrapper timing how long the response body took to send.
+
+    Once the body has been sent (or the app_iter is closed) the time to the
+    first and last byte, bytes sent and throughput are written to the log
+    and emitted as metrics, and the times are recorded in the stats.
+    """
+    def __init__(self, app_iter, env, start, server_type, config,
+                 response=None):
+        self.app_iter = app_iter
+        self.env = env
+        self.start = start
+        self.server_type = server_type
+        self.logger = config.get('logger')
+        self.stats = config.get('stats')
+        self.response = response or {}
+        self.first_byte = None
+        self.last_byte = None
+        self.bytes_sent = 0
+
+    def __iter__(self):
+        try:
+            for chunk in self.app_iter:
+                if self.first_byte is None:
+                    self.first_byte = time.time()
+                self.bytes_sent += len(chunk)
+                yield chunk
+        finally:
+            self.finish()
+
+    def close(self):
+        try:
+            close_if_possible(self.app_iter)
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.last_byte is not None:
+            return
+        self.last_byte = time.time()
+        if self.first_byte is None:
+            self.first_byte = self.last_byte
+        first_byte = self.first_byte - self.start
+        last_byte = self.last_byte - self.start
+        throughput = 0.0
+        if last_byte > 0:
+            throughput = self.bytes_sent / last_byte
+        method = self.env.get('REQUEST_METHOD', 'UNKNOWN')
+        if self.stats is not None and 'status' in self.response:
+            for inspector, value in (('first_byte', first_byte),
+                                     ('last_byte', last_byte)):
+                self.stats.record(method, self.response['status'],
+                                  self.response['policy'], inspector, value)
+        if self.logger is None:
+            return
+        self.logger.info(
+            'Inspector-Timing {0} {1} {2} first_byte={3:.6f} '
+            'last_byte={4:.6f} bytes={5} throughput={6:.1f}'.format(
+                self.server_type, method, self.env.get('PATH_INFO', ''),
+                first_byte, last_byte, self.bytes_sent, throughput))
+        self.logger.timing('{0}.first_byte.timing'.format(method),
+                           first_byte * 1000)
+        self.logger.timing('{0}.last_byte.timing'.format(method),
+                           last_byte * 1000)
+        self.logger.update_stats('{0}.xfer'.format(method), self.bytes_sent)
+
+
+def _timing_wrapper(env, start_response, config, server_type, header):
+    stats = config.get('stats')
+    response = {}
 
-def object_wrapper(env, start_response, app, config):
     def _start_response(status, headers, exc_info=None):
         """start_response wrapper to add request status to env."""
         end = time.time()
-        headers.append(('Inspector-Timing-Object', str(end - start)))
+        headers.append((header, str(end - start)))
+        response['status'] = status
+        response['policy'] = get_policy_index(env, headers)
+        if stats is not None:
+            stats.record(env.get('REQUEST_METHOD'), status,
+                         response['policy'], 'timing', end - start)
         return start_response(status, headers, exc_info)
 
     start = time.time()
+    if config.get('streaming_timing'):
+        add_iter_wrapper(env, lambda app_iter: StreamingTiming(
+            app_iter, env, start, server_type, config, response))
     return _start_response
+
+
+def proxy_wrapper(env, start_response, app, config):
+    return _timing_wrapper(env, start_response, config, 'proxy',
+                           'Inspector-Timing')
+
+
+def object_wrapper(env, start_response, app, config):
+    return _timing_wrapper(env, start_response, config, 'object',
+                           'Inspector-Timing-Object')
@@ -0,0 +1,194 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import hashlib
+import hmac
+import time
+
+try:
+    from hmac import compare_digest
+except ImportError:
+    from swift.common.utils import streq_const_time as compare_digest
+
+
+def _sign(inspector, expires, key):
+    hmac_body = '{0}\n{1}'.format(inspector, expires)
+    return hmac.new(key, hmac_body, hashlib.sha1).hexdigest()
+
+
+def create_sig(inspector, expires, key):
+    inspector = ' '.join(inspector).lower()
+    expires = int(expires)
+    return _sign(inspector, expires, key)
+
+
+class InspectorError(Exception):
+    pass
+
+
+class SignatureCache(object):
+    """Bounded LRU cache of verified inspector signatures.
+
+    Entries are keyed on the raw Inspector, Inspector-Expires and
+    Inspector-Sig header values, so a client reusing a signed set of headers
+    only pays for a dict lookup.  Entries are evicted once they have
+    expired or are the least recently used when the cache is full.
+    """
+    def __init__(self, key, max_size=1024, default=None):
+        self.key = key
+        self.max_size = max_size
+        self.default = default or []
+        self.hits = 0
+        self.misses = 0
+        self._cache = collections.OrderedDict()
+
+    def check(self, inspector, expires, sig):
+        """Check the signature for a request's inspector headers.
+
+        :param inspector: the raw Inspector header value.
+        :param expires: the raw Inspector-Expires header value.
+        :param sig: the raw Inspector-Sig header value.
+        :raises InspectorError: if the signature is missing or invalid.
+        :raises ValueError: if expires is not an integer.
+        """
+        if sig == '':
+            raise InspectorError('Missing Header: Inspector-Sig')
+        if expires == '':
+            raise InspectorError('Missing Header: Inspector-Expires')
+
+        cache_key = (inspector, expires, sig)
+        expires_at = self._cache.pop(cache_key, None)
+        if expires_at is not None:
+            if expires_at < int(time.time()):
+                raise InspectorError(
+                    'Invalid Header: Inspector-Expires has expired')
+            self._cache[cache_key] = expires_at
+            self.hits += 1
+            return
+
+        self.misses += 1
+        expires_at = int(expires)
+        if expires_at < int(time.time()):
+            raise InspectorError(
+                'Invalid Header: Inspector-Expires has expired')
+        inspectors = ' '.join(self.default + inspector.split()).lower()
+        if not compare_digest(sig, _sign(inspectors, expires_at, self.key)):
+            raise InspectorError('Invalid Signature')
+
+        if self.max_size > 0:
+            if len(self._cache) >= self.max_size:
+                self._cache.popitem(last=False)
+            self._cache[cache_key] = expires_at
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache)}
+
+
+class InspectorPlan(object):
+    """The handlers resolved for a list of inspector names.
+
+    Invalid names are collected up front into the Inspector-Error header
+    value, so running the plan only wraps start_response with each handler.
+    Names are case insensitive and only the first of repeated names is used.
+    """
+    def __init__(self, inspector, handlers):
+        self.handlers = []
+        invalid = []
+        seen = set()
+        for name in inspector:
+            name = name.lower()
+            if name in seen:
+                continue
+            seen.add(name)
+            handler = handlers.get(name)
+            if handler is None:
+                invalid.append(name)
+            else:
+                self.handlers.append(handler)
+        self.error = None
+        if invalid:
+            self.error = 'Invalid Inspectors: {0}'.format(
+                ', '.join(invalid).title())
+
+    def wrap(self, env, start_response, app, config):
+        """Wrap start_response with the plan's handlers."""
+        _start_response = start_response
+        for handler in self.handlers:
+            _start_response = handler(env, _start_response, app, config)
+        if self.error is None:
+            return _start_response
+        error = self.error
+
+        def inspector_start_response(status, headers, exc_info=None):
+            headers.append(('Inspector-Error', error))
+            return _start_response(status, headers, exc_info)
+        return inspector_start_response
+
+
+class PlanCache(object):
+    """Memoizes an InspectorPlan per Inspector header value.
+
+    Plans are keyed on the default names and the raw header value, so a
+    cached plan is found without parsing the header.  Up to max_size plans
+    are kept, evicting the least recently used, and plans with invalid
+    names are not kept so junk headers can't evict them.
+    """
+    def __init__(self, handlers, default=None, max_size=256):
+        self.handlers = handlers
+        self.default = default or []
+        self.max_size = max_size
+        self._plans = collections.OrderedDict()
+
+    def get(self, inspector):
+        key = (tuple(self.default), inspector)
+        plan = self._plans.pop(key, None)
+        if plan is None:
+            plan = InspectorPlan(self.default + inspector.split(),
+                                 self.handlers)
+            if plan.error is not None or self.max_size <= 0:
+                return plan
+            if len(self._plans) >= self.max_size:
+                self._plans.popitem(last=False)
+        self._plans[key] = plan
+        return plan
+
+
+class BackendSigner(object):
+    """Inspector headers for the proxy to send to backend servers.
+
+    The headers are signed with key, if set, and reused until less than
+    half of ttl is left before they expire, so the backends' signature
+    caches are hit.
+    """
+    def __init__(self, inspector, key=None, ttl=300):
+        self.inspector = inspector
+        self.key = key
+        self.ttl = ttl
+        self._headers = None
+        self._renew_at = 0
+
+    def headers(self):
+        now = time.time()
+        if self._headers is None or now >= self._renew_at:
+            headers = {'Inspector': ' '.join(self.inspector)}
+            if self.key:
+                expires = int(now + self.ttl)
+                headers['Inspector-Expires'] = str(expires)
+                headers['Inspector-Sig'] = create_sig(
+                    self.inspector, expires, self.key)
+            self._headers = headers
+            self._renew_at = now + self.ttl / 2
+        return self._headers
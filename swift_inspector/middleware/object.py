@@ -11,26 +11,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import hashlib
-import hmac
-import time
-
 import swift.common.swob as swob
 import swift.common.utils as utils
 
-from swift_inspector.inspectors import inspector_handlers
-
-
-def create_sig(inspector, expires, key):
-    inspector = ' '.join(inspector).lower()
-    expires = int(expires)
-    hmac_body = '{0}\n{1}'.format(inspector, expires)
-    sig = hmac.new(key, hmac_body, hashlib.sha1).hexdigest()
-    return sig
-
-
-class InspectorError(Exception):
-    pass
+from swift_inspector import export
+from swift_inspector import rings
+from swift_inspector import shared
+from swift_inspector import stats
+from swift_inspector.inspectors import get_registry
+from swift_inspector.inspectors.hub import get_lag_sampler
+from swift_inspector.middleware import (
+    create_sig, InspectorError, PlanCache, SignatureCache)
+from swift_inspector.utils import call_app
 
 
 class InspectorMiddleware(object):
@@ -39,7 +31,42 @@ class InspectorMiddleware(object):
         self.app = app
         self.logger = utils.get_logger(conf, log_route='informant')
         self.hmac_key = conf.get('hmac_key')
+        self.sig_cache = SignatureCache(
+            self.hmac_key, int(conf.get('sig_cache_size', 1024)),
+            default=None)
+        self.inspectors = get_registry('object', conf, self.logger)
+        self.plans = PlanCache(self.inspectors)
         self.swift_dir = conf.get('here', '/etc/swift')
+        # This imports swift.common.ring, but so does the object server,
+        # through swift.common.storage_policy.  None of the built in object
+        # inspectors use it (only the proxy's Handlers, Nodes and Probe do),
+        # so rings are only loaded if an installed inspector looks one up
+        # through inspector_config, and otherwise it just reports its
+        # empty stats.
+        self.ring_cache = rings.get_ring_cache(self.swift_dir)
+        self.shared_stats = None
+        if conf.get('shared_stats_path'):
+            self.shared_stats = shared.SharedStats(
+                conf['shared_stats_path'],
+                int(conf.get('shared_stats_workers', 64)),
+                int(conf.get('shared_stats_keys', 64)))
+        self.stats = stats.InspectorStats(shared=self.shared_stats)
+        self.stats_path = conf.get('stats_path', '/inspector/stats') or None
+        self.inspector_config = {
+            'swift_dir': self.swift_dir,
+            'ring_cache': self.ring_cache,
+            'stats': self.stats,
+            'logger': self.logger,
+            'streaming_timing': utils.config_true_value(
+                conf.get('streaming_timing', 'false')),
+            'memory_sample_rate': float(conf.get('memory_sample_rate', 1.0)),
+            'memory_top': int(conf.get('memory_top', 5)),
+            'memory_frames': int(conf.get('memory_frames', 1)),
+            'signed': bool(self.hmac_key),
+            'profile_dir': conf.get('profile_dir') or None,
+            'profile_top': int(conf.get('profile_top', 10)),
+            'hub_sampler': get_lag_sampler(conf)}
+        self.exporter = export.get_exporter(conf, self.logger)
 
     def handle_error(self, msg, env, start_response):
         def _start_response(status, headers, exc_info=None):
@@ -48,50 +75,54 @@ class InspectorMiddleware(object):
             start_response(status, headers, exc_info)
         return self.app(env, _start_response)
 
-    def handle_request(self, env, start_response):
-        req = swob.Request(env)
-
-        inspector = req.headers.get('inspector', '').lower().split()
-        if self.hmac_key:
-            expires = req.headers.get('inspector_expires', '')
-            sig = req.headers.get('inspector_sig', '')
-            try:
-                if sig == '':
-                    raise InspectorError('Missing Header: Inspector-Sig')
-                if expires == '':
-                    raise InspectorError('Missing Header: Inspector-Expires')
-                if int(expires) < int(time.time()):
-                    raise InspectorError(
-                        'Invalid Header: Inspector-Expires has expired')
-                valid_sig = create_sig(inspector, expires, self.hmac_key)
-                if sig != valid_sig:
-                    raise InspectorError('Invalid Signature')
-            except InspectorError as e:
-                return self.handle_error(str(e), env, start_response)
-            except ValueError:
-                return self.handle_error(
-                    'Invalid Header: Inspector-Expires must be an integer',
-                    env, start_response)
-
-        _start_response = start_response
-        inspector_errors = []
+    def check_signature(self, env):
+        """Check the signature of a request's inspector headers.
 
-        def inspector_start_response(status, headers, exc_info=None):
-            if inspector_errors:
-                errors = ', '.join(inspector_errors).title()
-                headers.append(('Inspector-Error',
-                                'Invalid Inspectors: {0}'.format(errors)))
-            return _start_response(status, headers, exc_info)
+        :returns: an error message if the signature is not valid.
+        """
+        try:
+            self.sig_cache.check(env.get('HTTP_INSPECTOR', ''),
+                                 env.get('HTTP_INSPECTOR_EXPIRES', ''),
+                                 env.get('HTTP_INSPECTOR_SIG', ''))
+        except InspectorError as e:
+            return str(e)
+        except ValueError:
+            return 'Invalid Header: Inspector-Expires must be an integer'
 
-        for i in inspector:
-            if i not in inspector_handlers['object']:
-                inspector_errors.append(i)
-                continue
-            _start_response = inspector_handlers['object'][i](
-                env, _start_response, self.app, {'swift_dir': self.swift_dir})
-        return self.app(env, inspector_start_response)
+    def handle_request(self, env, start_response):
+        if self.hmac_key:
+            error = self.check_signature(env)
+            if error:
+                return self.handle_error(error, env, start_response)
+
+        plan = self.plans.get(env.get('HTTP_INSPECTOR', ''))
+        if self.exporter is not None:
+            start_response = self.exporter.start_response(
+                env, 'object', start_response)
+        inspector_start_response = plan.wrap(
+            env, start_response, self.app, self.inspector_config)
+        return call_app(env, self.app, inspector_start_response)
+
+    def handle_stats(self, env, start_response):
+        if self.hmac_key:
+            error = self.check_signature(env)
+            if error:
+                return swob.HTTPUnauthorized(
+                    request=swob.Request(env), body=error,
+                    headers={'Inspector-Error': error})(env, start_response)
+        return stats.stats_response(env, start_response, {
+            'server_type': 'object',
+            'inspectors': {'available': self.inspectors.names(),
+                           'loaded': self.inspectors.loaded()},
+            'histograms': self.stats.to_list(),
+            'server': self.shared_stats and self.shared_stats.to_dict(),
+            'ring_cache': self.ring_cache.stats(),
+            'sig_cache': self.sig_cache.stats(),
+            'export': self.exporter and self.exporter.stats()})
 
     def __call__(self, env, start_response):
+        if env.get('PATH_INFO') == self.stats_path:
+            return self.handle_stats(env, start_response)
         if 'HTTP_INSPECTOR' in env:
             return self.handle_request(env, start_response)
         return self.app(env, start_response)
@@ -100,11 +131,8 @@ class InspectorMiddleware(object):
 def filter_factory(global_conf, **local_conf):
     conf = global_conf.copy()
     conf.update(local_conf)
-    exclude_inspectors = local_conf.get('exclude', '').lower().split()
-    for inspector in exclude_inspectors:
-        if inspector in inspector_handlers['object']:
-            del inspector_handlers['object'][inspector]
-    avaiable_inspectors = [i.title() for i in inspector_handlers['object']]
+    avaiable_inspectors = [
+        i.title() for i in get_registry('object', conf).names()]
     utils.register_swift_info('inspector', inspectors=avaiable_inspectors)
 
     def informant_filter(app):
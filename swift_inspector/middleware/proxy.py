@@ -11,26 +11,39 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import hashlib
-import hmac
+import random
 import time
 
 import swift.common.swob as swob
 import swift.common.utils as utils
 
-from swift_inspector.inspectors import inspector_handlers
+from swift_inspector import capture
+from swift_inspector import export
+from swift_inspector import hot
+from swift_inspector import placement
+from swift_inspector import rings
+from swift_inspector import shared
+from swift_inspector import stats
+from swift_inspector import trace
+from swift_inspector.inspectors import get_registry
+from swift_inspector.inspectors.hub import get_lag_sampler
+from swift_inspector.inspectors.nodes import HandoffCache
+from swift_inspector.middleware import (
+    BackendSigner, create_sig, InspectorError, InspectorPlan, PlanCache,
+    SignatureCache)
+from swift_inspector.utils import call_app
 
 
-def create_sig(inspector, expires, key):
-    inspector = ' '.join(inspector).lower()
-    expires = int(expires)
-    hmac_body = '{0}\n{1}'.format(inspector, expires)
-    sig = hmac.new(key, hmac_body, hashlib.sha1).hexdigest()
-    return sig
-
-
-class InspectorError(Exception):
-    pass
+def parse_sample_rates(value):
+    """Parse a list of "name:rate" pairs separated by spaces into a dict."""
+    rates = {}
+    for item in value.split():
+        name, _, rate = item.rpartition(':')
+        if not name:
+            raise ValueError(
+                'Invalid sample rate {0!r}, expected name:rate'.format(item))
+        rates[name] = float(rate)
+    return rates
 
 
 class InspectorMiddleware(object):
@@ -39,77 +52,301 @@ class InspectorMiddleware(object):
         self.app = app
         self.logger = utils.get_logger(conf, log_route='inspector')
         self.hmac_key = conf.get('hmac_key')
+        self.sig_cache = SignatureCache(
+            self.hmac_key, int(conf.get('sig_cache_size', 1024)),
+            default=default)
+        self.inspectors = get_registry('proxy', conf, self.logger)
+        self.plans = PlanCache(self.inspectors, default=default)
         self.swift_dir = conf.get('here', '/etc/swift')
+        self.ring_cache = rings.get_ring_cache(self.swift_dir)
+        self.shared_stats = None
+        if conf.get('shared_stats_path'):
+            self.shared_stats = shared.SharedStats(
+                conf['shared_stats_path'],
+                int(conf.get('shared_stats_workers', 64)),
+                int(conf.get('shared_stats_keys', 64)))
+        self.stats = stats.InspectorStats(shared=self.shared_stats)
+        self.stats_path = conf.get('stats_path', '/inspector/stats') or None
+        self.nodes_path = conf.get('nodes_path', '/inspector/nodes') or None
+        self.capture = None
+        if utils.config_true_value(conf.get('tail_capture', 'false')):
+            self.capture = capture.TailCapture(
+                self.ring_cache, float(conf.get('capture_threshold', 1.0)),
+                utils.config_true_value(conf.get('capture_5xx', 'true')),
+                int(conf.get('capture_size', 100)))
+        capture_path = conf.get('capture_path', '/inspector/slow') or None
+        self.reserved_paths = {}
+        if self.stats_path:
+            self.reserved_paths[self.stats_path] = self.handle_stats
+        if self.nodes_path:
+            self.reserved_paths[self.nodes_path] = self.handle_nodes
+        if self.capture is not None and capture_path:
+            self.reserved_paths[capture_path] = self.handle_capture
+        self.handoff_cache = HandoffCache(
+            self.ring_cache, int(conf.get('handoff_cache_size', 1024)))
+        self.inspector_config = {
+            'swift_dir': self.swift_dir,
+            'ring_cache': self.ring_cache,
+            'handoff_cache': self.handoff_cache,
+            'handoff_limit': int(conf.get('handoff_limit', 10)),
+            'handoff_max_limit': int(conf.get('handoff_max_limit', 100)),
+            'handoff_max_offset': int(conf.get('handoff_max_offset', 1000)),
+            'stats': self.stats,
+            'logger': self.logger,
+            'streaming_timing': utils.config_true_value(
+                conf.get('streaming_timing', 'false')),
+            'probe_handoffs': int(conf.get('probe_handoffs', 0)),
+            'probe_timeout': float(conf.get('probe_timeout', 1.0)),
+            'probe_concurrency': int(conf.get('probe_concurrency', 10)),
+            'memory_sample_rate': float(conf.get('memory_sample_rate', 1.0)),
+            'memory_top': int(conf.get('memory_top', 5)),
+            'memory_frames': int(conf.get('memory_frames', 1)),
+            'signed': bool(self.hmac_key),
+            'profile_dir': conf.get('profile_dir') or None,
+            'profile_top': int(conf.get('profile_top', 10)),
+            'hub_sampler': get_lag_sampler(conf),
+            'backend_signer': BackendSigner(
+                conf.get('backend_inspectors', 'Timing').split(),
+                conf.get('backend_hmac_key', self.hmac_key),
+                int(conf.get('backend_sig_ttl', 300)))}
         self.default = default
+        self.output = conf.get('output', 'headers').lower()
+        self.trace_max_size = int(conf.get('trace_max_size', 4096))
+        self.exporter = export.get_exporter(conf, self.logger)
+        self.hot = None
+        if utils.config_true_value(conf.get('hot_tracking', 'false')):
+            self.hot = hot.HotTracker(
+                self.ring_cache, float(conf.get('hot_window', 60)),
+                int(conf.get('hot_slices', 6)),
+                int(conf.get('hot_width', 1024)),
+                int(conf.get('hot_depth', 4)), int(conf.get('hot_top', 32)))
+
+        self.sample_rate = float(conf.get('sample_rate', 0))
+        self.sample_rate_methods = parse_sample_rates(
+            conf.get('sample_rate_methods', ''))
+        self.sample_rate_accounts = parse_sample_rates(
+            conf.get('sample_rate_accounts', ''))
+        self.sample_rate_containers = parse_sample_rates(
+            conf.get('sample_rate_containers', ''))
+        self.sample_plan = InspectorPlan(
+            conf.get('sample_inspectors', 'Timing').split(),
+            self.inspectors)
+        self.sampling = bool(
+            self.sample_rate or self.sample_rate_methods or
+            self.sample_rate_accounts or self.sample_rate_containers)
+        self.sample_by_path = bool(
+            self.sample_rate_accounts or self.sample_rate_containers)
+        self.sampled_requests = 0
+        self.sample_overhead = 0.0
 
     def handle_error(self, msg, env, start_response):
         def _start_response(status, headers, exc_info=None):
             """start_response wrapper to add request status to env."""
             headers.append(('Inspector-Error', msg))
             start_response(status, headers, exc_info)
-        return self.app(env, _start_response)
+        return call_app(env, self.app, _start_response)
+
+    def check_signature(self, env):
+        """Check the signature of a request's inspector headers.
+
+        :returns: an error message if the signature is not valid.
+        """
+        try:
+            self.sig_cache.check(env.get('HTTP_INSPECTOR', ''),
+                                 env.get('HTTP_INSPECTOR_EXPIRES', ''),
+                                 env.get('HTTP_INSPECTOR_SIG', ''))
+        except InspectorError as e:
+            return str(e)
+        except ValueError:
+            return 'Invalid Header: Inspector-Expires must be an integer'
+
+    def unauthorized(self, error, env, start_response):
+        return swob.HTTPUnauthorized(
+            request=swob.Request(env), body=error,
+            headers={'Inspector-Error': error})(env, start_response)
 
     def handle_request(self, env, start_response):
-        req = swob.Request(env)
+        if self.hmac_key:
+            error = self.check_signature(env)
+            if error:
+                return self.handle_error(error, env, start_response)
+
+        plan = self.plans.get(env.get('HTTP_INSPECTOR', ''))
+        return self.inspect(env, start_response, plan)
+
+    def inspect(self, env, start_response, plan):
+        """Run the request through the app with an InspectorPlan.
+
+        The output mode is taken from the Inspector-Output header, falling
+        back to the configured output.
+        """
+        output = env.get('HTTP_INSPECTOR_OUTPUT', self.output).lower()
+        if output == 'compact':
+            start_response = self.compact_start_response(start_response)
+        if self.exporter is not None:
+            start_response = self.exporter.start_response(
+                env, 'proxy', start_response)
+        inspector_start_response = plan.wrap(
+            env, start_response, self.app, self.inspector_config)
+        return call_app(env, self.app, inspector_start_response)
+
+    def compact_start_response(self, start_response):
+        """Wrap start_response to gather the inspector headers into the
+        Server-Timing and Inspector-Trace headers.
+        """
+        max_size = self.trace_max_size
+
+        def _start_response(status, headers, exc_info=None):
+            trace.compact_headers(headers, max_size)
+            return start_response(status, headers, exc_info)
+        return _start_response
+
+    def get_sample_rate(self, env):
+        """Get the rate at which to sample a request.
+
+        The most specific configured rate applies, with container rates
+        taking priority over account rates, then method rates and finally
+        the default sample_rate.
+        """
+        rate = self.sample_rate
+        if self.sample_rate_methods:
+            rate = self.sample_rate_methods.get(
+                env.get('REQUEST_METHOD'), rate)
+        if self.sample_by_path:
+            path = env.get('PATH_INFO', '').split('/', 4)
+            if len(path) > 2:
+                rate = self.sample_rate_accounts.get(path[2], rate)
+            if len(path) > 3:
+                rate = self.sample_rate_containers.get(
+                    '{0}/{1}'.format(path[2], path[3]), rate)
+        return rate
+
+    def handle_sampled(self, env, start_response, start):
+        """Inspect a sampled request, sending the results to the log.
+
+        Results are removed from the response headers and logged along with
+        the time spent in the middleware, which is also emitted as the
+        sample.overhead metric.
+        """
+        timer = [0.0, 0.0]
+
+        def sampled_start_response(status, headers, exc_info=None):
+            now = time.time()
+            overhead = timer[0] + now - timer[1]
+            results = []
+            response_headers = []
+            for header, value in headers:
+                if header.lower().startswith('inspector'):
+                    results.append((header, value))
+                else:
+                    response_headers.append((header, value))
+            headers[:] = response_headers
+            for header, value in results:
+                try:
+                    metric = float(value) * 1000
+                except ValueError:
+                    continue
+                self.logger.timing('sample.{0}'.format(
+                    header.lower().replace('inspector-', '', 1)), metric)
+            self.sampled_requests += 1
+            self.sample_overhead += overhead
+            self.logger.timing('sample.overhead', overhead * 1000)
+            self.logger.info('Inspector-Sample {0} {1} {2} {3} '
+                             'overhead={4:.6f}'.format(
+                                 env.get('REQUEST_METHOD'),
+                                 env.get('PATH_INFO'), status.split(' ')[0],
+                                 ' '.join(['{0}={1}'.format(h, v)
+                                           for h, v in results]),
+                                 overhead))
+            return start_response(status, headers, exc_info)
+
+        if self.exporter is not None:
+            sampled_start_response = self.exporter.start_response(
+                env, 'proxy', sampled_start_response)
+        chain = self.sample_plan.wrap(
+            env, sampled_start_response, self.app, self.inspector_config)
+
+        def _start_response(status, headers, exc_info=None):
+            timer[1] = time.time()
+            return chain(status, headers, exc_info)
+
+        timer[0] = time.time() - start
+        return call_app(env, self.app, _start_response)
+
+    def handle_stats(self, env, start_response):
+        if self.hmac_key:
+            error = self.check_signature(env)
+            if error:
+                return self.unauthorized(error, env, start_response)
+        return stats.stats_response(env, start_response, {
+            'server_type': 'proxy',
+            'inspectors': {'available': self.inspectors.names(),
+                           'loaded': self.inspectors.loaded()},
+            'histograms': self.stats.to_list(),
+            'server': self.shared_stats and self.shared_stats.to_dict(),
+            'ring_cache': self.ring_cache.stats(),
+            'handoff_cache': self.handoff_cache.stats(),
+            'sig_cache': self.sig_cache.stats(),
+            'sampling': {
+                'requests': self.sampled_requests,
+                'overhead': self.sample_overhead},
+            'export': self.exporter and self.exporter.stats(),
+            'hot': self.hot and self.hot.stats()})
+
+    def handle_nodes(self, env, start_response):
+        """Handle a batch placement lookup request.
+
+        Requires the Nodes inspector, which must also be signed for if
+        hmac_key is set.
+        """
+        if 'nodes' not in self.inspectors:
+            return self.app(env, start_response)
+        if self.hmac_key:
+            error = self.check_signature(env)
+            if not error and 'nodes' not in env.get(
+                    'HTTP_INSPECTOR', '').lower().split():
+                error = 'Invalid Inspectors: Nodes must be signed for'
+            if error:
+                return self.unauthorized(error, env, start_response)
+        return placement.placement_response(
+            env, start_response, self.ring_cache, self.app)
+
+    def handle_capture(self, env, start_response):
+        """Serve the captured slow and failed requests.
 
-        inspector = req.headers.get('inspector', '').lower().split()
-        if self.default:
-            inspector = self.default + inspector
-        
+        Captures include other accounts' paths and the backend nodes, so
+        the request must be signed if hmac_key is set.
+        """
         if self.hmac_key:
-            expires = req.headers.get('inspector_expires', '')
-            sig = req.headers.get('inspector_sig', '')
-            try:
-                if sig == '':
-                    raise InspectorError('Missing Header: Inspector-Sig')
-                if expires == '':
-                    raise InspectorError('Missing Header: Inspector-Expires')
-                if int(expires) < int(time.time()):
-                    raise InspectorError(
-                        'Invalid Header: Inspector-Expires has expired')
-                valid_sig = create_sig(inspector, expires, self.hmac_key)
-                if sig != valid_sig:
-                    raise InspectorError('Invalid Signature')
-            except InspectorError as e:
-                return self.handle_error(str(e), env, start_response)
-            except ValueError:
-                return self.handle_error(
-                    'Invalid Header: Inspector-Expires must be an integer',
-                    env, start_response)
-
-        _start_response = start_response
-        inspector_errors = []
-
-        def inspector_start_response(status, headers, exc_info=None):
-            if inspector_errors:
-                errors = ', '.join(inspector_errors).title()
-                headers.append(('Inspector-Error',
-                                'Invalid Inspectors: {0}'.format(errors)))
-            return _start_response(status, headers, exc_info)
-
-        for i in inspector:
-            i = i.lower()
-            if i not in inspector_handlers['proxy']:
-                inspector_errors.append(i)
-                continue
-            _start_response = inspector_handlers['proxy'][i](
-                env, _start_response, self.app, {'swift_dir': self.swift_dir})
-        return self.app(env, inspector_start_response)
+            error = self.check_signature(env)
+            if error:
+                return self.unauthorized(error, env, start_response)
+        return self.capture.response(env, start_response)
 
     def __call__(self, env, start_response):
+        handler = self.reserved_paths.get(env.get('PATH_INFO'))
+        if handler is not None:
+            return handler(env, start_response)
+        if self.hot is not None:
+            start_response = self.hot.start_response(env, start_response)
+        if self.capture is not None:
+            start_response = self.capture.start_response(env, start_response)
         if self.default or 'HTTP_INSPECTOR' in env:
             return self.handle_request(env, start_response)
+        if self.sampling:
+            start = time.time()
+            if random.random() < self.get_sample_rate(env):
+                return self.handle_sampled(env, start_response, start)
+        if self.capture is not None:
+            return call_app(env, self.app, start_response)
         return self.app(env, start_response)
 
 
 def filter_factory(global_conf, **local_conf):
     conf = global_conf.copy()
     conf.update(local_conf)
-    exclude_inspectors = local_conf.get('exclude', '').lower().split()
-    for inspector in exclude_inspectors:
-        if inspector in inspector_handlers['proxy']:
-            del inspector_handlers['proxy'][inspector]
-    avaiable_inspectors = [i.title() for i in inspector_handlers['proxy']]
+    avaiable_inspectors = [
+        i.title() for i in get_registry('proxy', conf).names()]
     default_inspectors = local_conf.get('default', '').title().split()
     utils.register_swift_info('inspector', inspectors=avaiable_inspectors, default=default_inspectors)
 
@@ -0,0 +1,386 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Placement lookups for many account, container and object paths."""
+
+import argparse
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+
+import swift.common.storage_policy as storage_policy
+import swift.common.swob as swob
+import swift.common.utils as utils
+
+from swift_inspector import rings
+from swift_inspector.inspectors import nodes as nodes_inspector
+
+MAX_LINE_LENGTH = 8192
+# Length of the start of an over-long line included in its error record.
+TOO_LONG_PREFIX = 64
+OUTPUT_CHUNK_SIZE = 65536
+POLICY_CACHE_SIZE = 10000
+
+# The PlacementLookup of a worker process of main().
+_lookup = None
+
+
+def parse_path(line):
+    """Split an "account[/container[/object]]" line into its parts.
+
+    A leading slash is optional.
+
+    :returns: a tuple of (account, container, obj), or None for blank lines.
+    :raises ValueError: if the path has an empty account or container.
+    """
+    path = line.rstrip('\r\n')
+    if path.startswith('/'):
+        path = path[1:]
+    if not path:
+        return None
+    parts = path.split('/', 2)
+    if '' in parts[:2]:
+        raise ValueError('Invalid path')
+    parts.extend([None] * (3 - len(parts)))
+    if parts[2] == '':
+        raise ValueError('Invalid path')
+    return tuple(parts)
+
+
+class PlacementLookup(object):
+    """Resolves the partition and nodes for paths using cached rings.
+
+    :param ring_cache: a swift_inspector.rings.RingCache.
+    :param policy_index: storage policy index used for all object paths.
+    :param get_policy: if policy_index is None, called with the account and
+                       container to get the policy index of object paths.
+                       Results are cached per container.
+    :param handoffs: number of handoff nodes to include.
+    """
+    def __init__(self, ring_cache, policy_index=None, get_policy=None,
+                 handoffs=0):
+        self.ring_cache = ring_cache
+        self.policy_index = policy_index
+        self.get_policy = get_policy
+        self.handoffs = handoffs
+        self._policies = {}
+
+    def container_policy(self, account, container):
+        if self.policy_index is not None or self.get_policy is None:
+            return self.policy_index
+        key = (account, container)
+        policy_index = self._policies.get(key)
+        if policy_index is None:
+            if len(self._policies) >= POLICY_CACHE_SIZE:
+                self._policies.clear()
+            policy_index = self._policies[key] = self.get_policy(
+                account, container)
+        return policy_index
+
+    def lookup(self, account, container=None, obj=None):
+        """Look up a path.
+
+        :returns: a tuple of (partition, nodes, handoff nodes)
+        """
+        policy_index = None
+        if obj is not None:
+            policy_index = self.container_policy(account, container)
+        node_ring = nodes_inspector.get_ring(
+            self.ring_cache, container, obj, policy_index)
+        partition = node_ring.get_part(account, container, obj)
+        primaries = node_ring.get_part_nodes(partition)
+        handoffs = []
+        if self.handoffs:
+            handoffs = list(itertools.islice(
+                node_ring.get_more_nodes(partition), self.handoffs))
+        return partition, primaries, handoffs
+
+    def record(self, line):
+        """Get the placement record for a line, or None for blank lines."""
+        if isinstance(line, LineTooLong):
+            return {'path': line.prefix.decode('utf-8', 'replace'),
+                    'error': 'Line too long'}
+        path_name = line.rstrip('\r\n').decode('utf-8', 'replace')
+        try:
+            path = parse_path(line)
+            if path is None:
+                return None
+            partition, primaries, handoffs = self.lookup(*path)
+        except Exception as e:
+            return {'path': path_name, 'error': str(e)}
+        record = {'path': path_name,
+                  'partition': partition,
+                  'nodes': nodes_inspector.node_urls(primaries, partition)}
+        if self.handoffs:
+            record['handoffs'] = nodes_inspector.node_urls(
+                handoffs, partition)
+        return record
+
+
+class LineTooLong(object):
+    """Stands in for a line longer than MAX_LINE_LENGTH.
+
+    :param prefix: the start of the line.
+    """
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+
+def iter_lines(wsgi_input):
+    """Iterate over the lines of a request body without reading it all.
+
+    Lines longer than MAX_LINE_LENGTH are skipped and a LineTooLong is
+    yielded in their place.
+    """
+    while True:
+        line = wsgi_input.readline(MAX_LINE_LENGTH)
+        if not line:
+            return
+        if len(line) >= MAX_LINE_LENGTH and not line.endswith('\n'):
+            rest = wsgi_input.readline(MAX_LINE_LENGTH)
+            if rest:
+                while rest and not rest.endswith('\n'):
+                    rest = wsgi_input.readline(MAX_LINE_LENGTH)
+                yield LineTooLong(line[:TOO_LONG_PREFIX])
+                continue
+        yield line
+
+
+def iter_ndjson(lookup, lines):
+    """Look up lines, yielding NDJSON output in chunks."""
+    chunk = []
+    size = 0
+    for line in lines:
+        record = lookup.record(line)
+        if record is None:
+            continue
+        output = json.dumps(record) + '\n'
+        chunk.append(output)
+        size += len(output)
+        if size >= OUTPUT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def placement_response(env, start_response, ring_cache, app):
+    """Respond to a batch placement request.
+
+    The request body is a newline delimited list of paths, and the query
+    string may include "policy" to use a storage policy index for all
+    object paths instead of looking up each container's policy, and
+    "handoffs" for the number of handoff nodes to include.
+    """
+    req = swob.Request(env)
+    if req.method != 'POST':
+        return swob.HTTPMethodNotAllowed(
+            request=req, headers={'Allow': 'POST'})(env, start_response)
+    try:
+        handoffs = max(0, int(req.params.get('handoffs', 0)))
+        policy_index = req.params.get('policy')
+        if policy_index is not None:
+            policy_index = int(policy_index)
+    except ValueError:
+        return swob.HTTPBadRequest(
+            request=req, body='handoffs and policy must be integers')(
+                env, start_response)
+
+    def get_policy(account, container):
+        return nodes_inspector.get_container_policy(
+            app, account, container, env=env)[0]
+
+    lookup = PlacementLookup(ring_cache, policy_index, get_policy, handoffs)
+    return swob.Response(
+        request=req, content_type='application/x-ndjson',
+        app_iter=iter_ndjson(lookup, iter_lines(env['wsgi.input'])))(
+            env, start_response)
+
+
+def set_swift_dir(swift_dir):
+    """Use the swift.conf in swift_dir for the hash path and policies."""
+    swift_conf = os.path.join(swift_dir, 'swift.conf')
+    if not os.path.exists(swift_conf):
+        return
+    utils.SWIFT_CONF_FILE = swift_conf
+    storage_policy.reload_storage_policies()
+
+
+def init_worker(swift_dir, policy_index, handoffs):
+    global _lookup
+    _lookup = PlacementLookup(
+        rings.RingCache(swift_dir), policy_index=policy_index,
+        handoffs=handoffs)
+
+
+def lookup_chunk(args):
+    """Look up a chunk of lines in a worker.
+
+    :returns: a tuple of (output, device counts, partition counts)
+    """
+    lines, with_paths = args
+    output = []
+    devices = collections.defaultdict(int)
+    partitions = collections.defaultdict(int)
+    for line in lines:
+        record = _lookup.record(line)
+        if record is None:
+            continue
+        if with_paths:
+            output.append(json.dumps(record) + '\n')
+        if 'error' in record:
+            continue
+        path = parse_path(line)
+        if path[2] is not None:
+            server_type = 'object'
+        elif path[1] is not None:
+            server_type = 'container'
+        else:
+            server_type = 'account'
+        partitions[(server_type, record['partition'])] += 1
+        for url in record['nodes']:
+            devices[(server_type, url.rsplit('/', 1)[0])] += 1
+    return ''.join(output), dict(devices), dict(partitions)
+
+
+def iter_chunks(paths, chunk_size):
+    chunk = []
+    for line in paths:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def summarize(devices, partitions, top):
+    summary = {}
+    for name, counts in (('devices', devices), ('partitions', partitions)):
+        by_type = collections.defaultdict(dict)
+        for (server_type, key), count in counts.items():
+            by_type[server_type][str(key)] = count
+        if top:
+            for server_type, type_counts in by_type.items():
+                by_type[server_type] = dict(sorted(
+                    type_counts.items(), key=lambda item: -item[1])[:top])
+        summary[name] = by_type
+    return summary
+
+
+def check_rings(swift_dir, policy_index):
+    """Load the rings used for lookups, so a missing ring or policy is
+    reported once up front rather than for every path.
+
+    :raises Exception: if a ring can't be loaded.
+    """
+    ring_cache = rings.RingCache(swift_dir)
+    for ring_name in ('account', 'container', 'object'):
+        ring_cache.get_ring(ring_name, policy_index)
+
+
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    """Swift Inspector Placement
+
+       Offline placement lookup of account, container and object paths
+       using the rings in a swift_dir.  Paths are read one per line, as
+       "account[/container[/object]]", and a JSON placement record is
+       written for each.  Per-device and per-partition counts of the
+       primary placements are written to the summary.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    parser = argparse.ArgumentParser(
+        description=' '.join(main.__doc__.split()))
+    parser.add_argument(
+        'paths', nargs='?', default='-',
+        help='File of paths to look up, defaults to stdin.')
+    parser.add_argument(
+        '--swift-dir', default='/etc/swift',
+        help='Directory containing the rings and swift.conf.')
+    parser.add_argument(
+        '--policy', type=int, default=0,
+        help='Storage policy index to use for object paths.')
+    parser.add_argument(
+        '--handoffs', type=int, default=0,
+        help='Number of handoff nodes to include for each path.')
+    parser.add_argument(
+        '--workers', type=int, default=multiprocessing.cpu_count(),
+        help='Number of worker processes.')
+    parser.add_argument(
+        '--chunk-size', type=int, default=10000,
+        help='Number of paths sent to a worker at a time.')
+    parser.add_argument(
+        '--summary-only', default=False, action='store_true',
+        help='Only output the summary, not a record per path.')
+    parser.add_argument(
+        '--summary', default=None,
+        help='File to write the summary to, defaults to stderr.')
+    parser.add_argument(
+        '--top', type=int, default=0,
+        help='Only include the N most used devices and partitions in the '
+             'summary.')
+    args = parser.parse_args(argv)
+
+    set_swift_dir(args.swift_dir)
+    try:
+        check_rings(args.swift_dir, args.policy)
+    except Exception as e:
+        parser.error('Unable to load rings: {0}'.format(e))
+    if args.paths == '-':
+        paths = stdin
+    else:
+        paths = open(args.paths, 'rb')
+
+    pool = multiprocessing.Pool(
+        args.workers, init_worker,
+        (args.swift_dir, args.policy, max(0, args.handoffs)))
+    # Only keep a few chunks in flight so the input isn't read into memory
+    # faster than the workers can look it up.
+    pending = collections.deque()
+    devices = collections.defaultdict(int)
+    partitions = collections.defaultdict(int)
+
+    def collect(result):
+        output, chunk_devices, chunk_partitions = result.get()
+        if output:
+            stdout.write(output)
+        for key, count in chunk_devices.items():
+            devices[key] += count
+        for key, count in chunk_partitions.items():
+            partitions[key] += count
+
+    try:
+        for chunk in iter_chunks(paths, args.chunk_size):
+            pending.append(pool.apply_async(
+                lookup_chunk, ((chunk, not args.summary_only),)))
+            if len(pending) >= args.workers * 2:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+    finally:
+        pool.terminate()
+        if paths is not stdin:
+            paths.close()
+
+    summary = json.dumps(summarize(devices, partitions, args.top),
+                         sort_keys=True)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            f.write(summary + '\n')
+    else:
+        stderr.write(summary + '\n')
@@ -0,0 +1,262 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Replay of proxy access logs, or a synthetic request mix, under load.
+
+Requests are run concurrently in greenthreads through the proxy middleware
+around a stand-in for the proxy app, which sleeps for the request's backend
+latency and returns its logged status and body size.  Latencies are drawn
+when the requests are loaded, so every run of the same requests sees the
+same backend latencies and only the inspection differs.
+"""
+
+import collections
+import itertools
+import math
+import os
+import random
+import StringIO
+import time
+import urllib
+
+import eventlet
+import swift.common.swob as swob
+
+from swift_inspector.middleware import create_sig
+from swift_inspector.stats import LatencyHistogram, METHODS
+from swift_inspector.utils import close_if_possible
+
+ReplayRequest = collections.namedtuple(
+    'ReplayRequest', 'method path status bytes_sent latency')
+
+SYNTHETIC_STATUS = {'GET': 200, 'HEAD': 200, 'PUT': 201, 'POST': 202,
+                    'DELETE': 204, 'COPY': 201, 'OPTIONS': 200}
+CHUNK_SIZE = 65536
+
+
+def parse_log_line(line):
+    """Parse a line of the proxy-logging access log.
+
+    The syslog prefix, up to "proxy-server:", is optional.
+
+    :returns: a ReplayRequest with the logged request_time as its latency,
+              or None if the line is not an access log line.
+    """
+    if 'proxy-server:' in line:
+        line = line.split('proxy-server:', 1)[1]
+    fields = line.split()
+    if len(fields) < 16 or fields[3] not in METHODS:
+        return None
+    try:
+        status = int(fields[6])
+        bytes_sent = 0 if fields[11] == '-' else int(fields[11])
+        request_time = float(fields[15])
+    except ValueError:
+        return None
+    # The path is quoted, the query string appended and the result quoted
+    # again.
+    path = urllib.unquote(urllib.unquote(fields[4]).split('?', 1)[0])
+    return ReplayRequest(fields[3], path, status, bytes_sent, request_time)
+
+
+def parse_mix(value):
+    """Parse a list of "METHOD:weight" pairs separated by spaces."""
+    mix = []
+    for item in value.split():
+        method, _, weight = item.rpartition(':')
+        method = method.upper()
+        if method not in METHODS:
+            raise ValueError(
+                'Invalid request mix {0!r}, expected METHOD:weight'.format(
+                    item))
+        mix.append((method, float(weight)))
+    if not mix or sum(weight for method, weight in mix) <= 0:
+        raise ValueError('Request mix {0!r} has no weight'.format(value))
+    return mix
+
+
+def synthetic_requests(count, mix, accounts=1, containers=10,
+                       objects=1000, object_size=4096, rand=random):
+    """Generate a request mix over object paths picked uniformly."""
+    total = sum(weight for method, weight in mix)
+    for i in range(count):
+        choice = rand.random() * total
+        for method, weight in mix:
+            choice -= weight
+            if choice < 0:
+                break
+        path = '/v1/AUTH_{0}/c{1}/o{2}'.format(
+            rand.randrange(accounts), rand.randrange(containers),
+            rand.randrange(objects))
+        bytes_sent = object_size if method == 'GET' else 0
+        yield ReplayRequest(method, path, SYNTHETIC_STATUS[method],
+                            bytes_sent, 0.0)
+
+
+def parse_latency(spec, rand=random):
+    """Parse a backend latency distribution.
+
+    One of "fixed:SECONDS", "uniform:LOW:HIGH", "exponential:MEAN",
+    "lognormal:MEDIAN:SIGMA", or "log" to use each request's logged
+    request_time.
+
+    :returns: a function getting the latency in seconds for a request.
+    :raises ValueError: if spec is invalid.
+    """
+    name, _, args = spec.partition(':')
+    args = [float(arg) for arg in args.split(':') if arg]
+    if name == 'log' and not args:
+        return lambda request: request.latency
+    if name == 'fixed' and len(args) == 1:
+        return lambda request: args[0]
+    if name == 'uniform' and len(args) == 2:
+        return lambda request: rand.uniform(args[0], args[1])
+    if name == 'exponential' and len(args) == 1 and args[0] > 0:
+        return lambda request: rand.expovariate(1 / args[0])
+    if name == 'lognormal' and len(args) == 2 and args[0] > 0:
+        mu = math.log(args[0])
+        return lambda request: rand.lognormvariate(mu, args[1])
+    raise ValueError('Invalid latency distribution {0!r}'.format(spec))
+
+
+def with_latency(requests, latency):
+    """Draw the backend latency of each request up front."""
+    return [request._replace(latency=max(0.0, latency(request)))
+            for request in requests]
+
+
+class StandInApp(object):
+    """WSGI app standing in for the proxy app.
+
+    Sleeps for the request's latency, then responds with its status and up
+    to max_body bytes of its body.
+    """
+    def __init__(self, max_body=1048576):
+        self.max_body = max_body
+
+    def _body(self, size):
+        while size > 0:
+            chunk = min(size, CHUNK_SIZE)
+            size -= chunk
+            yield ' ' * chunk
+
+    def __call__(self, env, start_response):
+        request = env['replay.request']
+        if request.latency > 0:
+            eventlet.sleep(request.latency)
+        size = 0
+        if request.method != 'HEAD':
+            size = min(request.bytes_sent, self.max_body)
+        reason = swob.RESPONSE_REASONS.get(request.status, ('Unknown',))[0]
+        start_response('{0} {1}'.format(request.status, reason), [
+            ('Content-Length', str(size)),
+            ('X-Backend-Storage-Policy-Index', '0')])
+        return self._body(size)
+
+
+def inspector_headers(inspector, hmac_key=None, ttl=86400):
+    """Get the environ keys to request inspector, signed if hmac_key."""
+    if not inspector:
+        return {}
+    headers = {'HTTP_INSPECTOR': inspector}
+    if hmac_key:
+        expires = int(time.time() + ttl)
+        headers['HTTP_INSPECTOR_EXPIRES'] = str(expires)
+        headers['HTTP_INSPECTOR_SIG'] = create_sig(
+            inspector.split(), expires, hmac_key)
+    return headers
+
+
+def make_env(request, trans_id, headers=None):
+    env = {'REQUEST_METHOD': request.method,
+           'PATH_INFO': request.path,
+           'QUERY_STRING': '',
+           'SERVER_PROTOCOL': 'HTTP/1.1',
+           'SERVER_NAME': '127.0.0.1',
+           'SERVER_PORT': '8080',
+           'wsgi.input': StringIO.StringIO(''),
+           'swift.trans_id': trans_id,
+           'replay.request': request}
+    if headers:
+        env.update(headers)
+    return env
+
+
+def run(app, requests, concurrency, headers=None):
+    """Replay requests through app with up to concurrency at a time.
+
+    The latency of a request is the time from calling app until its body
+    has been read.
+
+    :returns: a dict of the latency percentiles, throughput, CPU time per
+              request and counts of statuses and errors.
+    """
+    histogram = LatencyHistogram()
+    statuses = collections.defaultdict(int)
+    counts = {'errors': 0}
+
+    def start_response(status, response_headers, exc_info=None):
+        statuses[status.split(' ', 1)[0]] += 1
+
+    def replay(request, trans_id):
+        env = make_env(request, trans_id, headers)
+        start = time.time()
+        try:
+            app_iter = app(env, start_response)
+            try:
+                for chunk in app_iter:
+                    pass
+            finally:
+                close_if_possible(app_iter)
+        except Exception:
+            counts['errors'] += 1
+        histogram.record(time.time() - start)
+
+    pool = eventlet.GreenPool(max(1, concurrency))
+    cpu_start = sum(os.times()[:2])
+    start = time.time()
+    for i, request in enumerate(requests):
+        pool.spawn_n(replay, request, 'tx{0:021x}'.format(i))
+    pool.waitall()
+    elapsed = time.time() - start
+    cpu = sum(os.times()[:2]) - cpu_start
+
+    result = histogram.to_dict()
+    result.update({
+        'elapsed': elapsed,
+        'throughput': histogram.count / elapsed if elapsed > 0 else 0.0,
+        'cpu_per_request': cpu / histogram.count if histogram.count else 0.0,
+        'statuses': dict(statuses),
+        'errors': counts['errors']})
+    return result
+
+
+def overhead(result, baseline):
+    """Compare a run to a baseline run, such as with inspection off.
+
+    :returns: a dict of the relative change in throughput, and of the
+              difference in seconds of CPU time per request and of the
+              p50 and p99 latencies.
+    """
+    delta = {}
+    if baseline.get('throughput'):
+        delta['throughput'] = (
+            result['throughput'] / baseline['throughput'] - 1)
+    for key in ('cpu_per_request', 'p50', 'p99'):
+        if result.get(key) is not None and baseline.get(key) is not None:
+            delta[key] = result[key] - baseline[key]
+    return delta
+
+
+def repeat_requests(requests, count):
+    """Cycle through requests until count have been taken."""
+    return list(itertools.islice(itertools.cycle(requests), count))
@@ -0,0 +1,90 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+
+import swift.common.ring as ring
+import swift.common.storage_policy as storage_policy
+
+
+class RingCache(object):
+    """Cache of loaded rings for a single swift_dir.
+
+    Rings are keyed by ring name and storage policy index and are only
+    deserialized again when the mtime of the ring file changes.  The mtime
+    is checked at most once every ``reload_time`` seconds per ring.
+    """
+    def __init__(self, swift_dir, reload_time=15):
+        self.swift_dir = swift_dir
+        self.reload_time = reload_time
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._rings = {}
+
+    def get_ring(self, ring_name, policy_index=None):
+        """Get the ring for ring_name ('account', 'container' or 'object').
+
+        :param ring_name: type of ring to get.
+        :param policy_index: storage policy index, only used for object rings.
+        :returns: a swift.common.ring.Ring instance.
+        """
+        name = ring_name
+        if ring_name == 'object':
+            policy = storage_policy.POLICIES.get_by_index(policy_index)
+            if not policy:
+                raise storage_policy.PolicyError(
+                    'No policy with index {0}'.format(policy_index))
+            name = policy.ring_name
+            key = (ring_name, policy.idx)
+        else:
+            key = (ring_name, None)
+        now = time.time()
+        entry = self._rings.get(key)
+        if entry is not None:
+            cached_ring, path, mtime, next_check = entry
+            if now < next_check:
+                self.hits += 1
+                return cached_ring
+            if os.path.getmtime(path) == mtime:
+                entry[3] = now + self.reload_time
+                self.hits += 1
+                return cached_ring
+            self.reloads += 1
+        else:
+            self.misses += 1
+
+        path = os.path.join(self.swift_dir, name + '.ring.gz')
+        mtime = os.path.getmtime(path)
+        cached_ring = ring.Ring(self.swift_dir, ring_name=name)
+        self._rings[key] = [cached_ring, path, mtime, now + self.reload_time]
+        return cached_ring
+
+    def stats(self):
+        """Get the cache counters as a dict."""
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'rings': len(self._rings)}
+
+
+_ring_caches = {}
+
+
+def get_ring_cache(swift_dir):
+    """Get the process-wide RingCache for swift_dir."""
+    cache = _ring_caches.get(swift_dir)
+    if cache is None:
+        cache = _ring_caches[swift_dir] = RingCache(swift_dir)
+    return cache
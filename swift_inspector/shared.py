@@ -0,0 +1,247 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Latency histograms shared by all the workers of a server.
+
+The histograms are kept in a fixed layout, mmap'd file, usually in
+/dev/shm, split into a slot per worker:
+
+    header | slot 0 | slot 1 | ...
+    slot:   pid, key count | keys | per key: count, total, min, max, buckets
+
+Each worker claims a slot with an fcntl lock on its first byte the first
+time it records a value, and is then the only writer of that slot, so no
+locking is needed to record.  The lock is released when the worker exits,
+and the next worker to claim the slot carries on from its counts.  Readers
+sum the histograms of every slot, so they may see a value partially
+recorded, which is fine for stats.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+
+from swift_inspector.stats import LatencyHistogram, METHODS, status_class
+
+MAGIC = 'SWINSP01'
+HEADER = struct.Struct('<8sIIII')
+HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct('<QQ')
+SLOT_HEADER_SIZE = 64
+KEY_SIZE = 64
+VALUE = struct.Struct('<Q')
+
+# Slots claimed by this process, per file.
+_claimed = {}
+
+
+class SharedStats(object):
+    """Per-worker slots of latency histograms in a shared file.
+
+    :param path: file to map, created if needed.  It is replaced with a new
+                 file if its layout doesn't match the other parameters.
+    :param slots: maximum number of workers.
+    :param keys: maximum number of histograms per worker.
+    """
+    def __init__(self, path, slots=64, keys=64, sub_bucket_bits=5):
+        self.path = path
+        self.slots = slots
+        self.keys = keys
+        self.layout = LatencyHistogram(sub_bucket_bits)
+        self.buckets = self.layout.max_index + 1
+        self.entry_size = (4 + self.buckets) * VALUE.size
+        self.slot_size = (SLOT_HEADER_SIZE + keys * KEY_SIZE +
+                          keys * self.entry_size)
+        self.size = HEADER_SIZE + slots * self.slot_size
+        self.dropped = 0
+        self.slot = None
+        self.offset = None
+        self.index = {}
+
+        self.fd = self._open(HEADER.pack(MAGIC, slots, keys, self.buckets,
+                                         KEY_SIZE))
+        fstat = os.fstat(self.fd)
+        self.file_id = (fstat.st_dev, fstat.st_ino)
+        self.map = mmap.mmap(self.fd, self.size)
+
+    def _open(self, header):
+        """Open the file, replacing it if its layout doesn't match.
+
+        A new layout is written to a temporary file which is renamed over
+        the path, so workers still using the old one keep their own mapping
+        of the old file rather than having it truncated under them.
+        """
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            # Only one server process checks and replaces the layout at a
+            # time.
+            fcntl.lockf(fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+            try:
+                fstat = os.fstat(fd)
+                try:
+                    current = os.stat(self.path).st_ino == fstat.st_ino
+                except OSError:
+                    current = False
+                if current:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    if fstat.st_size == self.size and \
+                            os.read(fd, HEADER.size) == header:
+                        return fd
+                    self._replace(header)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+            # The file was replaced, by us or another process, so open the
+            # new one.
+            os.close(fd)
+
+    def _replace(self, header):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or '.',
+            prefix='.' + os.path.basename(self.path))
+        try:
+            os.ftruncate(fd, self.size)
+            os.write(fd, header)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        finally:
+            os.close(fd)
+
+    def _slot_offset(self, slot):
+        return HEADER_SIZE + slot * self.slot_size
+
+    def claim(self):
+        """Claim a free slot for this process.
+
+        :returns: True if a slot was claimed.
+        """
+        claimed = _claimed.setdefault((self.file_id, os.getpid()), set())
+        for slot in range(self.slots):
+            if slot in claimed:
+                continue
+            offset = self._slot_offset(slot)
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+            except IOError:
+                continue
+            claimed.add(slot)
+            self.slot = slot
+            self.offset = offset
+            nkeys = SLOT_HEADER.unpack_from(self.map, offset)[1]
+            self.index = dict(
+                (key, i) for i, key in enumerate(self._read_keys(offset)))
+            SLOT_HEADER.pack_into(self.map, offset, os.getpid(), nkeys)
+            return True
+        self.slot = False
+        return False
+
+    def _read_keys(self, offset):
+        nkeys = min(SLOT_HEADER.unpack_from(self.map, offset)[1], self.keys)
+        keys_offset = offset + SLOT_HEADER_SIZE
+        return [self.map[keys_offset + i * KEY_SIZE:
+                         keys_offset + (i + 1) * KEY_SIZE].rstrip('\0')
+                for i in range(nkeys)]
+
+    def _entry_offset(self, offset, index):
+        return (offset + SLOT_HEADER_SIZE + self.keys * KEY_SIZE +
+                index * self.entry_size)
+
+    def record(self, method, status, policy, inspector, seconds):
+        if self.slot is None:
+            self.claim()
+        if self.slot is False:
+            self.dropped += 1
+            return
+        if method not in METHODS:
+            method = 'OTHER'
+        key = '|'.join((method, status_class(status), str(policy),
+                        inspector))
+        index = self.index.get(key)
+        if index is None:
+            if len(self.index) >= self.keys or len(key) > KEY_SIZE:
+                self.dropped += 1
+                return
+            index = len(self.index)
+            keys_offset = self.offset + SLOT_HEADER_SIZE + index * KEY_SIZE
+            self.map[keys_offset:keys_offset + KEY_SIZE] = key.ljust(
+                KEY_SIZE, '\0')
+            # The key is written before the key count, for readers.
+            SLOT_HEADER.pack_into(self.map, self.offset, os.getpid(),
+                                  index + 1)
+            self.index[key] = index
+
+        value = max(0, int(seconds * 1000000))
+        bucket = min(self.layout.bucket_index(value), self.layout.max_index)
+        entry = self._entry_offset(self.offset, index)
+        count, total, low, high = struct.unpack_from('<4Q', self.map, entry)
+        if not count or value < low:
+            low = value
+        if value > high:
+            high = value
+        struct.pack_into('<4Q', self.map, entry, count + 1, total + value,
+                         low, high)
+        bucket_offset = entry + (4 + bucket) * VALUE.size
+        VALUE.pack_into(self.map, bucket_offset,
+                        VALUE.unpack_from(self.map, bucket_offset)[0] + 1)
+
+    def histograms(self):
+        """Get the histograms summed over every slot.
+
+        :returns: a tuple of (dict of key tuple to LatencyHistogram, pids of
+                  the slots which have been claimed, including by workers
+                  which have since exited)
+        """
+        histograms = {}
+        pids = []
+        for slot in range(self.slots):
+            offset = self._slot_offset(slot)
+            pid = SLOT_HEADER.unpack_from(self.map, offset)[0]
+            if not pid:
+                continue
+            pids.append(pid)
+            for index, key in enumerate(self._read_keys(offset)):
+                entry = self._entry_offset(offset, index)
+                count, total, low, high = struct.unpack_from(
+                    '<4Q', self.map, entry)
+                if not count:
+                    continue
+                histogram = LatencyHistogram(self.layout.sub_bucket_bits)
+                histogram.counts = list(struct.unpack_from(
+                    '<{0}Q'.format(self.buckets), self.map,
+                    entry + 4 * VALUE.size))
+                histogram.count = count
+                histogram.total = total
+                histogram.min = low
+                histogram.max = high
+                key = tuple(key.split('|', 3))
+                if key in histograms:
+                    histograms[key].merge(histogram)
+                else:
+                    histograms[key] = histogram
+        return histograms, pids
+
+    def to_dict(self):
+        """Get the server-wide histograms in the InspectorStats format."""
+        histograms, pids = self.histograms()
+        data = []
+        for key in sorted(histograms):
+            histogram = histograms[key].to_dict()
+            histogram.update(zip(('method', 'status', 'policy', 'inspector'),
+                                 key))
+            data.append(histogram)
+        return {'slots_used': len(pids),
+                'slot': self.slot,
+                'dropped': self.dropped,
+                'histograms': data}
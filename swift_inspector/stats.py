@@ -0,0 +1,169 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import swift.common.swob as swob
+
+METHODS = frozenset(['GET', 'HEAD', 'PUT', 'POST', 'DELETE', 'COPY',
+                     'OPTIONS'])
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram(object):
+    """Fixed memory, log bucketed latency histogram.
+
+    Values are recorded in microseconds.  As with HDR histograms, values
+    below 2 ** sub_bucket_bits each get their own bucket, and every power
+    of two above that is split into 2 ** (sub_bucket_bits - 1) linear
+    buckets, which bounds the relative error of a bucket to
+    1 / 2 ** (sub_bucket_bits - 1).  Values above max_value are counted in
+    the last bucket.
+    """
+    def __init__(self, sub_bucket_bits=5, max_value=2 ** 32):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count >> 1
+        self.max_index = self.bucket_index(max_value)
+        self.counts = [0] * (self.max_index + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def bucket_index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return (self.sub_bucket_count + (shift - 1) * self.sub_bucket_half +
+                (value >> shift) - self.sub_bucket_half)
+
+    def bucket_bounds(self, index):
+        """Get the (lower, upper) microsecond bounds of a bucket."""
+        if index < self.sub_bucket_count:
+            return index, index + 1
+        offset = index - self.sub_bucket_count
+        shift = offset // self.sub_bucket_half + 1
+        lower = (offset % self.sub_bucket_half + self.sub_bucket_half) << shift
+        return lower, lower + (1 << shift)
+
+    def record(self, seconds):
+        value = int(seconds * 1000000)
+        if value < 0:
+            value = 0
+        index = self.bucket_index(value)
+        if index > self.max_index:
+            index = self.max_index
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or
+                                      other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or
+                                      other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, percentile):
+        """Get the value at a percentile in seconds, or None if empty."""
+        if not self.count:
+            return None
+        target = self.count * percentile / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                lower, upper = self.bucket_bounds(index)
+                value = min((lower + upper - 1) / 2.0, self.max)
+                return value / 1000000.0
+        return self.max / 1000000.0
+
+    def to_dict(self):
+        data = {'count': self.count}
+        if self.count:
+            data['min'] = self.min / 1000000.0
+            data['max'] = self.max / 1000000.0
+            data['mean'] = self.total / 1000000.0 / self.count
+            for percentile in PERCENTILES:
+                data['p{0}'.format(str(percentile).replace('.', ''))] = \
+                    self.percentile(percentile)
+        return data
+
+
+def status_class(status):
+    """Get the status class, e.g. '2xx', from a WSGI status string."""
+    return '{0}xx'.format(str(status)[:1])
+
+
+class InspectorStats(object):
+    """Latency histograms keyed by method, status class, storage policy and
+    the inspector that measured them.
+
+    :param shared: a swift_inspector.shared.SharedStats values are also
+                   recorded in, for stats across all workers.
+    """
+    def __init__(self, sub_bucket_bits=5, shared=None):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.shared = shared
+        self.histograms = {}
+
+    def record(self, method, status, policy, inspector, seconds):
+        if self.shared is not None:
+            self.shared.record(method, status, policy, inspector, seconds)
+        if method not in METHODS:
+            method = 'OTHER'
+        key = (method, status_class(status), str(policy), inspector)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram(
+                self.sub_bucket_bits)
+        histogram.record(seconds)
+
+    def to_list(self):
+        histograms = []
+        for key in sorted(self.histograms):
+            data = self.histograms[key].to_dict()
+            data.update(zip(('method', 'status', 'policy', 'inspector'), key))
+            histograms.append(data)
+        return histograms
+
+
+def get_policy_index(env, headers):
+    """Get the storage policy index of a request from its response headers
+    or backend request headers, or '-' if it isn't known.
+    """
+    for header, value in headers:
+        if header.lower() == 'x-backend-storage-policy-index':
+            return value
+    return env.get('HTTP_X_BACKEND_STORAGE_POLICY_INDEX', '-')
+
+
+def stats_response(env, start_response, data):
+    """Respond to a request for the stats endpoint with data as JSON."""
+    if env.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+        return swob.HTTPMethodNotAllowed(
+            request=swob.Request(env),
+            headers={'Allow': 'GET, HEAD'})(env, start_response)
+    return swob.Response(
+        request=swob.Request(env), body=json.dumps(data),
+        content_type='application/json')(env, start_response)
@@ -0,0 +1,91 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact output of inspector results.
+
+Instead of a header per result, the results of every inspector are gathered
+into a Server-Timing header, for the timing results, and an
+Inspector-Trace header holding all of them as a JSON object, zlib compressed
+and base64url encoded.  If the encoded trace would be larger than the size
+cap, results are dropped, largest first, and their names listed under the
+"truncated" key.
+"""
+
+import base64
+import json
+import zlib
+
+TRUNCATED_KEY = 'truncated'
+# Errors are kept as their own header so they are never truncated.
+UNCOMPACTED_HEADERS = ('inspector-error',)
+# Results which are a time in seconds, by header name without the prefix.
+TIMING_RESULTS = ('timing', 'timing-object')
+
+
+def encode_trace(results):
+    return base64.urlsafe_b64encode(zlib.compress(json.dumps(
+        results, separators=(',', ':'), sort_keys=True)))
+
+
+def decode_trace(value):
+    return json.loads(zlib.decompress(base64.urlsafe_b64decode(value)))
+
+
+def server_timing(results):
+    """Format the results which are times in seconds as Server-Timing."""
+    metrics = []
+    for name, value in sorted(results.items()):
+        if name not in TIMING_RESULTS:
+            continue
+        try:
+            duration = float(value) * 1000
+        except (TypeError, ValueError):
+            continue
+        metrics.append('{0};dur={1:.3f}'.format(name, duration))
+    return ', '.join(metrics)
+
+
+def compact_headers(headers, max_size=4096):
+    """Replace the inspector headers in a list of headers.
+
+    :param headers: the response headers, modified in place.
+    :param max_size: maximum length of the Inspector-Trace value.
+    """
+    results = {}
+    response_headers = []
+    for header, value in headers:
+        lower = header.lower()
+        if lower.startswith('inspector-') and \
+                lower not in UNCOMPACTED_HEADERS:
+            results[lower[len('inspector-'):]] = value
+        else:
+            response_headers.append((header, value))
+    if not results:
+        return
+    timing = server_timing(results)
+    if timing:
+        response_headers.append(('Server-Timing', timing))
+
+    trace = encode_trace(results)
+    if len(trace) > max_size:
+        truncated = []
+        by_size = sorted(results, key=lambda name: len(results[name]))
+        while by_size and len(trace) > max_size:
+            name = by_size.pop()
+            del results[name]
+            truncated.append(name)
+            results[TRUNCATED_KEY] = truncated
+            trace = encode_trace(results)
+        if len(trace) > max_size:
+            trace = encode_trace({TRUNCATED_KEY: True})
+    response_headers.append(('Inspector-Trace', trace))
+    headers[:] = response_headers
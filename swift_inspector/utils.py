@@ -0,0 +1,105 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import greenlet
+
+ITER_WRAPPERS_KEY = 'swift_inspector.iter_wrappers'
+
+_switch_tracers = {}
+_previous_trace = [None]
+
+
+def add_iter_wrapper(env, wrapper):
+    """Register a callable used to wrap the response app_iter.
+
+    The wrapper is called with the app_iter and must return an iterable
+    which passes close() through to the app_iter it wraps.
+    """
+    env.setdefault(ITER_WRAPPERS_KEY, []).append(wrapper)
+
+
+def wrap_app_iter(env, app_iter):
+    """Apply all iter wrappers registered for the request to app_iter."""
+    for wrapper in env.pop(ITER_WRAPPERS_KEY, ()):
+        app_iter = wrapper(app_iter)
+    return app_iter
+
+
+def call_app(env, app, start_response):
+    """Call app and apply the request's iter wrappers to its app_iter.
+
+    If app raises, the wrappers are applied to an empty app_iter which is
+    closed, so they still release whatever they hold until the response
+    is done.
+    """
+    try:
+        app_iter = app(env, start_response)
+    except BaseException:
+        close_if_possible(wrap_app_iter(env, []))
+        raise
+    return wrap_app_iter(env, app_iter)
+
+
+def close_if_possible(app_iter):
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+
+
+def _trace_switch(event, args):
+    if event in ('switch', 'throw'):
+        origin, target = args
+        for tracer in _switch_tracers.get(origin, ()):
+            tracer(False, target)
+        for tracer in _switch_tracers.get(target, ()):
+            tracer(True, origin)
+    if _previous_trace[0] is not None:
+        _previous_trace[0](event, args)
+
+
+def add_switch_tracer(tracer):
+    """Call tracer whenever the current greenthread is switched to or from.
+
+    It is called with True and the greenlet switched from when switched
+    to, and False and the greenlet switched to when switched from.  A
+    single greenlet trace function is installed while any tracers are
+    registered.  Tracers of greenthreads which have died are dropped.
+    """
+    pruned = False
+    for current in list(_switch_tracers):
+        if current.dead:
+            del _switch_tracers[current]
+            pruned = True
+    if pruned and not _switch_tracers:
+        _restore_trace()
+    if not _switch_tracers:
+        _previous_trace[0] = greenlet.settrace(_trace_switch)
+    _switch_tracers.setdefault(greenlet.getcurrent(), []).append(tracer)
+
+
+def remove_switch_tracer(tracer):
+    """Remove a tracer, doing nothing if it isn't registered."""
+    removed = False
+    for current, tracers in list(_switch_tracers.items()):
+        if tracer in tracers:
+            tracers.remove(tracer)
+            removed = True
+            if not tracers:
+                del _switch_tracers[current]
+    if removed and not _switch_tracers:
+        _restore_trace()
+
+
+def _restore_trace():
+    greenlet.settrace(_previous_trace[0])
+    _previous_trace[0] = None
@@ -0,0 +1,35 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import swift.common.ring as ring
+import swift.common.utils as utils
+
+
+# Rings can't be loaded unless a hash path suffix is configured.
+utils.HASH_PATH_SUFFIX = 'endcap'
+
+
+def write_fake_ring(swift_dir, ring_name, replicas=3, devices=6,
+                    part_power=4):
+    """Build and write a small ring to swift_dir for use in tests."""
+    builder = ring.RingBuilder(part_power, replicas, 1)
+    for i in range(devices):
+        builder.add_dev({'id': i, 'region': 1, 'zone': i % replicas,
+                         'weight': 1, 'ip': '127.0.0.{0}'.format(i + 1),
+                         'port': 6000 + i, 'device': 'sdb{0}'.format(i)})
+    builder.rebalance()
+    path = os.path.join(swift_dir, '{0}.ring.gz'.format(ring_name))
+    builder.get_ring().save(path)
+    return path
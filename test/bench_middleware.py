@@ -0,0 +1,190 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Micro-benchmarks of the per-request cost of the inspector middlewares.
+
+Each scenario drives a middleware around a fake WSGI app, using small fake
+rings, and reports the best ns/request over several repeats along with the
+allocations per request when tracemalloc is available.
+
+    python -m test.bench_middleware --output results.json
+    python -m test.bench_middleware --baseline results.json --threshold 0.2
+
+With --baseline the run exits non-zero if any scenario is slower than its
+baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from swift_inspector.middleware import create_sig
+from swift_inspector.middleware import object as object_middleware
+from swift_inspector.middleware import proxy as proxy_middleware
+from test import write_fake_ring
+
+HMAC_KEY = 'Password1'
+
+SCENARIOS = [
+    # (name, server type, inspector header, signed)
+    ('proxy-passthrough', 'proxy', None, False),
+    ('proxy-timing', 'proxy', 'Timing', False),
+    ('proxy-handlers', 'proxy', 'Handlers', False),
+    ('proxy-nodes', 'proxy', 'Nodes', False),
+    ('proxy-timing-handlers', 'proxy', 'Timing Handlers', False),
+    ('proxy-all', 'proxy', 'Timing Handlers Nodes', False),
+    ('proxy-timing-signed', 'proxy', 'Timing', True),
+    ('proxy-all-signed', 'proxy', 'Timing Handlers Nodes', True),
+    ('object-passthrough', 'object', None, False),
+    ('object-timing', 'object', 'Timing', False),
+    ('object-handlers', 'object', 'Handlers', False),
+    ('object-all', 'object', 'Timing Handlers', False),
+    ('object-all-signed', 'object', 'Timing Handlers', True),
+]
+
+
+def fake_app(env, start_response):
+    start_response('200 OK', [('Content-Length', '0'),
+                              ('X-Backend-Storage-Policy-Index', '0')])
+    return ['']
+
+
+def fake_start_response(status, headers, exc_info=None):
+    pass
+
+
+def make_env(inspector, signed):
+    env = {'REQUEST_METHOD': 'GET',
+           'PATH_INFO': '/v1/AUTH_test/c/o',
+           'SERVER_PROTOCOL': 'HTTP/1.1',
+           'SERVER_NAME': '127.0.0.1',
+           'SERVER_PORT': '8080',
+           'swift.trans_id': 'tx0123456789abcdef'}
+    if inspector is not None:
+        env['HTTP_INSPECTOR'] = inspector
+    if signed:
+        expires = int(time.time() + 86400)
+        env['HTTP_INSPECTOR_EXPIRES'] = str(expires)
+        env['HTTP_INSPECTOR_SIG'] = create_sig(
+            inspector.split(), expires, HMAC_KEY)
+    return env
+
+
+def make_middleware(server_type, signed, swift_dir):
+    conf = {'here': swift_dir}
+    if signed:
+        conf['hmac_key'] = HMAC_KEY
+    if server_type == 'proxy':
+        return proxy_middleware.InspectorMiddleware(fake_app, conf)
+    return object_middleware.InspectorMiddleware(fake_app, conf)
+
+
+def run_scenario(server_type, inspector, signed, swift_dir, number, repeat):
+    app = make_middleware(server_type, signed, swift_dir)
+    template = make_env(inspector, signed)
+
+    def request():
+        for chunk in app(dict(template), fake_start_response):
+            pass
+
+    request()
+    best = min(timeit.repeat(request, number=number, repeat=repeat))
+    result = {'ns_per_request': best / number * 1e9,
+              'allocations_per_request': None,
+              'bytes_per_request': None}
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for i in range(number):
+            request()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        stats = after.compare_to(before, 'filename')
+        result['allocations_per_request'] = float(
+            sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+        ) / number
+        result['bytes_per_request'] = float(
+            sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+        ) / number
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Get the scenarios slower than baseline by more than threshold."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        base = baseline[name]['ns_per_request']
+        if result['ns_per_request'] > base * (1 + threshold):
+            regressions.append((name, base, result['ns_per_request']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the per-request cost of swift inspectors.')
+    parser.add_argument('--number', type=int, default=2000,
+                        help='Requests per repeat.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Repeats per scenario, the best is reported.')
+    parser.add_argument('--scenario', action='append', default=[],
+                        help='Only run the named scenario(s).')
+    parser.add_argument('--output', help='Write results as JSON to a file.')
+    parser.add_argument('--baseline', help='Baseline JSON to compare to.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed slowdown relative to the baseline.')
+    args = parser.parse_args()
+
+    swift_dir = tempfile.mkdtemp()
+    try:
+        for ring_name in ('account', 'container', 'object'):
+            write_fake_ring(swift_dir, ring_name)
+        results = {}
+        for name, server_type, inspector, signed in SCENARIOS:
+            if args.scenario and name not in args.scenario:
+                continue
+            results[name] = run_scenario(server_type, inspector, signed,
+                                         swift_dir, args.number, args.repeat)
+            print('{0:<24} {1:>12.0f} ns/request'.format(
+                name, results[name]['ns_per_request']))
+    finally:
+        shutil.rmtree(swift_dir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, current in regressions:
+            print('REGRESSION {0}: {1:.0f} -> {2:.0f} ns/request'.format(
+                name, base, current))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
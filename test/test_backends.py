@@ -0,0 +1,177 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import tempfile
+import unittest
+
+from swift_inspector import backends
+from swift_inspector import rings
+from swift_inspector.inspectors import backends as backends_inspector
+from swift_inspector.inspectors import handlers
+from test import write_fake_ring
+
+
+class FakeResponse(object):
+
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+    def getheaders(self):
+        return [(name.lower(), value) for name, value in self.headers.items()
+                ] + [('content-length', '0')]
+
+
+class FakeConnection(object):
+
+    def __init__(self, status, headers):
+        self.status = status
+        self.headers = headers
+
+    def getresponse(self):
+        return FakeResponse(self.status, self.headers)
+
+
+def fake_http_connect(status):
+    def _http_connect(ipaddr, port, device, partition, method, path,
+                      headers=None, query_string=None, ssl=False):
+        resp_headers = {}
+        if headers and 'Inspector' in headers:
+            resp_headers['Inspector-Timing-Object'] = '0.0012'
+        return FakeConnection(status, resp_headers)
+    return _http_connect
+
+
+class TestBackends(unittest.TestCase):
+
+    def test_untracked_connections_not_recorded(self):
+        http_connect = backends._wrap_http_connect(fake_http_connect(200))
+        tracker = backends.track('tx1')
+        conn = http_connect('127.0.0.1', 6010, 'sdb1', 3, 'GET', '/a/c/o',
+                            headers={'X-Trans-Id': 'tx2'})
+        conn.getresponse()
+        self.assertEqual(tracker.records, [])
+        backends.untrack(tracker)
+
+    def test_tracked_connections_recorded(self):
+        http_connect = backends._wrap_http_connect(fake_http_connect(201))
+        tracker = backends.track('tx1')
+        conn = http_connect('127.0.0.1', 6010, 'sdb1', 3, 'PUT', '/a/c/o',
+                            {'x-trans-id': 'tx1',
+                             'X-Backend-Storage-Policy-Index': '0'})
+        self.assertEqual(len(tracker.records), 1)
+        record = tracker.records[0]
+        self.assertEqual(record.status, None)
+        self.assertTrue(record.connect_time is not None)
+        conn.getresponse()
+        self.assertEqual(record.status, 201)
+        self.assertTrue(record.response_time >= record.connect_time)
+        self.assertEqual(record.server_type, 'object')
+        self.assertEqual(record.policy_index, '0')
+        backends.untrack(tracker)
+        self.assertFalse('tx1' in backends._trackers)
+
+    def test_track_requires_trans_id(self):
+        self.assertEqual(backends.track(None), None)
+
+    def test_track_shares_tracker(self):
+        tracker = backends.track('tx1')
+        self.assertTrue(backends.track('tx1') is tracker)
+        backends.untrack(tracker)
+        self.assertTrue(backends._trackers.get('tx1') is tracker)
+        backends.untrack(tracker)
+        self.assertFalse('tx1' in backends._trackers)
+
+    def test_handlers_leave_shared_tracker(self):
+        http_connect = backends._wrap_http_connect(fake_http_connect(200))
+        tracker = backends.track('tx1')
+        env = {'swift.trans_id': 'tx1', 'SERVER_PROTOCOL': 'HTTP/1.1'}
+        _start_response = handlers.proxy_wrapper(
+            env, lambda status, headers, exc_info=None: None, None, {})
+        _start_response('200 OK', [])
+        _start_response('500 Internal Error', [], ('exc', 'info', None))
+        http_connect('127.0.0.1', 6010, 'sdb1', 3, 'GET', '/a/c/o',
+                     {'X-Trans-Id': 'tx1'}).getresponse()
+        self.assertEqual(len(tracker.records), 1)
+        backends.untrack(tracker)
+        self.assertFalse('tx1' in backends._trackers)
+
+    def test_backend_headers_sent_and_collected(self):
+        http_connect = backends._wrap_http_connect(fake_http_connect(200))
+        tracker = backends.track('tx1')
+        tracker.backend_headers = {'Inspector': 'Timing'}
+        headers = {'X-Trans-Id': 'tx1'}
+        conn = http_connect('127.0.0.1', 6010, 'sdb1', 3, 'GET', '/a/c/o',
+                            headers)
+        self.assertEqual(headers, {'X-Trans-Id': 'tx1'})
+        conn.getresponse()
+        record = tracker.records[0]
+        self.assertEqual(record.inspector_headers,
+                         [('Inspector-Timing-Object', '0.0012')])
+        self.assertEqual(backends_inspector.format_node(record),
+                         '127.0.0.1:6010/sdb1/3 GET 200; Timing-Object=0.0012')
+        backends.untrack(tracker)
+
+    def test_backend_headers_not_collected_by_default(self):
+        http_connect = backends._wrap_http_connect(fake_http_connect(200))
+        tracker = backends.track('tx1')
+        conn = http_connect('127.0.0.1', 6010, 'sdb1', 3, 'GET', '/a/c/o',
+                            {'X-Trans-Id': 'tx1', 'Inspector': 'Timing'})
+        conn.getresponse()
+        self.assertEqual(tracker.records[0].inspector_headers, None)
+        backends.untrack(tracker)
+
+
+class TestFormatBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.swift_dir = tempfile.mkdtemp()
+        write_fake_ring(self.swift_dir, 'container')
+        self.ring_cache = rings.RingCache(self.swift_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.swift_dir)
+
+    def _make_record(self, node, partition):
+        record = backends.BackendRecord(
+            node['ip'], node['port'], node['device'], partition, 'HEAD',
+            '/a/c')
+        record.status = 204
+        record.connect_time = 0.001
+        record.response_time = 0.002
+        return record
+
+    def test_format_primary_and_handoff(self):
+        container_ring = self.ring_cache.get_ring('container')
+        partition, nodes = container_ring.get_nodes('a', 'c')
+        handoff = next(container_ring.get_more_nodes(partition))
+
+        primary = handlers.format_backend(
+            self._make_record(nodes[0], partition), self.ring_cache)
+        self.assertEqual(primary, '{0}:{1}/{2}/{3} HEAD 204 0.0010 0.0020'
+                         .format(nodes[0]['ip'], nodes[0]['port'],
+                                 nodes[0]['device'], partition))
+        self.assertTrue(handlers.format_backend(
+            self._make_record(handoff, partition),
+            self.ring_cache).endswith(' handoff'))
+
+    def test_format_without_response(self):
+        record = backends.BackendRecord('127.0.0.1', 6010, 'sdb1', 3, 'GET',
+                                        '/a')
+        self.assertEqual(handlers.format_backend(record),
+                         '127.0.0.1:6010/sdb1/3 GET - - -')
+
+
+if __name__ == '__main__':
+    unittest.main()
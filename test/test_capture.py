@@ -0,0 +1,105 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import shutil
+import tempfile
+import time
+import unittest
+
+from swift_inspector.middleware import create_sig
+from swift_inspector.middleware import proxy
+from test import write_fake_ring
+
+
+def fake_app(env, start_response):
+    if env['PATH_INFO'].endswith('slow'):
+        time.sleep(0.02)
+    if env['PATH_INFO'].endswith('error'):
+        start_response('503 Service Unavailable', [])
+    else:
+        start_response('200 OK', [])
+    return ['body']
+
+
+class TestTailCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.swift_dir = tempfile.mkdtemp()
+        for ring_name in ('account', 'container', 'object'):
+            write_fake_ring(self.swift_dir, ring_name)
+        self.app = proxy.InspectorMiddleware(fake_app, {
+            'here': self.swift_dir, 'tail_capture': 'true',
+            'capture_threshold': '0.01', 'capture_size': '2'})
+
+    def tearDown(self):
+        shutil.rmtree(self.swift_dir)
+
+    def _request(self, path, query_string=''):
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path,
+               'QUERY_STRING': query_string, 'SERVER_NAME': '127.0.0.1',
+               'SERVER_PORT': '8080', 'swift.trans_id': 'tx' + path}
+        return ''.join(self.app(env, lambda *args: None))
+
+    def _captures(self, query_string=''):
+        return json.loads(self._request('/inspector/slow', query_string))
+
+    def test_slow_and_failed_requests_captured(self):
+        self._request('/v1/a/fast')
+        self._request('/v1/a/slow')
+        self._request('/v1/a/error')
+        data = self._captures()
+        self.assertEqual(data['requests'], 3)
+        self.assertEqual(data['captured'], 2)
+        captures = data['captures']
+        self.assertEqual([c['path'] for c in captures],
+                         ['/v1/a/error', '/v1/a/slow'])
+        self.assertEqual(captures[0]['status'], 503)
+        self.assertTrue(captures[1]['last_byte'] >= 0.02)
+        self.assertEqual(captures[1]['bytes'], 4)
+        self.assertEqual(captures[1]['handlers'], [])
+        self.assertEqual(len(captures[1]['nodes']), 3)
+
+    def test_buffer_bounded(self):
+        for i in range(3):
+            self._request('/v1/a/{0}/error'.format(i))
+        data = self._captures('limit=1')
+        self.assertEqual(data['captured'], 3)
+        self.assertEqual([c['path'] for c in data['captures']],
+                         ['/v1/a/2/error'])
+        self.assertEqual(len(self.app.capture.captures), 2)
+
+    def test_signature_required_with_hmac_key(self):
+        app = proxy.InspectorMiddleware(fake_app, {
+            'here': self.swift_dir, 'tail_capture': 'true',
+            'hmac_key': 'Password1'})
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/inspector/slow',
+               'SERVER_NAME': '127.0.0.1', 'SERVER_PORT': '8080'}
+        status = []
+        body = ''.join(app(dict(env), lambda s, h, e=None: status.append(s)))
+        self.assertEqual(status, ['401 Unauthorized'])
+        self.assertFalse('captures' in body)
+
+        expires = int(time.time() + 60)
+        env.update({'HTTP_INSPECTOR': 'Timing',
+                    'HTTP_INSPECTOR_EXPIRES': str(expires),
+                    'HTTP_INSPECTOR_SIG': create_sig(
+                        ['Timing'], expires, 'Password1')})
+        status = []
+        body = ''.join(app(env, lambda s, h, e=None: status.append(s)))
+        self.assertEqual(status, ['200 OK'])
+        self.assertEqual(json.loads(body)['captures'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from StringIO import StringIO
+
+import eventlet
+from swift.common.storage_policy import POLICIES
+from swift.common.utils import Timestamp
+from swift.obj import diskfile
+
+from swift_inspector.inspectors import disk
+from swift_inspector.utils import call_app
+from test.test_timing import FakeLogger
+
+
+class TestDisk(unittest.TestCase):
+
+    def test_timed_input(self):
+        recorder = disk.DiskRecorder()
+        wsgi_input = disk.TimedInput(StringIO('abc\ndefg'), recorder)
+        self.assertEqual(wsgi_input.readline(), 'abc\n')
+        self.assertEqual(wsgi_input.read(), 'defg')
+        self.assertEqual(recorder.input_bytes, 8)
+        self.assertEqual(wsgi_input.getvalue(), 'abc\ndefg')
+
+    def test_timed_app_iter(self):
+        logger = FakeLogger()
+        recorder = disk.DiskRecorder()
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/sda1/0/a/c/o'}
+        app_iter = disk.TimedAppIter(['abc', 'defg'], env, recorder, logger)
+        self.assertEqual(''.join(app_iter), 'abcdefg')
+        app_iter.close()
+        self.assertEqual(recorder.read_bytes, 7)
+        self.assertEqual(len(logger.lines), 1)
+        self.assertTrue('read_bytes=7' in logger.lines[0])
+        self.assertTrue('GET.disk_read.timing' in logger.timings)
+        self.assertTrue('GET.send.timing' in logger.timings)
+        self.assertEqual(logger.stats['GET.disk_read.xfer'], 7)
+
+    def test_put_writes_timed(self):
+        devices = tempfile.mkdtemp()
+        os.mkdir(os.path.join(devices, 'sda1'))
+        try:
+            manager = diskfile.DiskFileManager(
+                {'devices': devices, 'mount_check': 'false'}, FakeLogger())
+            recorder = disk.DiskRecorder()
+            disk.install()
+            disk._recorders[eventlet.getcurrent()] = recorder
+            try:
+                df = manager.get_diskfile('sda1', '0', 'a', 'c', 'o',
+                                          policy=POLICIES[0])
+                with df.create() as writer:
+                    writer.write('abc')
+                    writer.put({
+                        'X-Timestamp': Timestamp(time.time()).internal,
+                        'Content-Length': '3',
+                        'ETag': hashlib.md5('abc').hexdigest()})
+            finally:
+                disk._recorders.pop(eventlet.getcurrent(), None)
+        finally:
+            shutil.rmtree(devices)
+        self.assertEqual(recorder.write_bytes, 3)
+        self.assertTrue(recorder.finalize_time > 0)
+        self.assertTrue(recorder.rename_time > 0)
+        self.assertTrue(
+            disk.format_put(recorder).startswith('input_bytes=0 '))
+
+    def _request(self, method, app):
+        env = {'REQUEST_METHOD': method, 'PATH_INFO': '/sda1/0/a/c/o',
+               'wsgi.input': StringIO('')}
+        responses = []
+
+        def start_response(status, headers, exc_info=None):
+            responses.append(headers)
+
+        wrapper = disk.object_wrapper(env, start_response, app, {})
+        self.assertTrue(eventlet.getcurrent() in disk._recorders)
+        app_iter = call_app(env, app, wrapper)
+        ''.join(app_iter)
+        app_iter.close()
+        return dict(responses[0])
+
+    def test_put_only_header(self):
+        def app(env, start_response):
+            start_response('200 OK', [])
+            return ['']
+
+        self.assertTrue('Inspector-Disk-Object' in self._request('PUT', app))
+        for method in ('GET', 'HEAD'):
+            self.assertFalse(
+                'Inspector-Disk-Object' in self._request(method, app))
+        self.assertFalse(eventlet.getcurrent() in disk._recorders)
+
+    def test_recorder_released_if_app_raises(self):
+        def app(env, start_response):
+            raise Exception('oops')
+
+        self.assertRaises(Exception, self._request, 'PUT', app)
+        self.assertFalse(eventlet.getcurrent() in disk._recorders)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import eventlet
+
+from swift_inspector import export
+from test.test_inspector import get_fake_app, reset_response, start_response
+
+
+class FakeSink(object):
+
+    def __init__(self):
+        self.batches = []
+
+    def send(self, lines):
+        self.batches.append(lines)
+
+
+class FakeThread(object):
+    dead = False
+
+
+class TestExporter(unittest.TestCase):
+
+    def test_records_dropped_when_full(self):
+        exporter = export.Exporter(FakeSink(), max_queue=2)
+        exporter._thread = FakeThread()
+        for i in range(5):
+            exporter.put({'i': i})
+        self.assertEqual(exporter.stats(), {
+            'queued': 2, 'exported': 0, 'dropped': 3, 'errors': 0,
+            'size': 2})
+
+    def test_flush_in_batches(self):
+        sink = FakeSink()
+        exporter = export.Exporter(sink, batch_size=2)
+        exporter._thread = FakeThread()
+        for i in range(3):
+            exporter.put({'i': i})
+        self.assertEqual(exporter.flush(), 2)
+        self.assertEqual(exporter.flush(), 1)
+        self.assertEqual(exporter.flush(), 0)
+        self.assertEqual([len(batch) for batch in sink.batches], [2, 1])
+        self.assertEqual(json.loads(sink.batches[1][0]), {'i': 2})
+        self.assertEqual(exporter.exported, 3)
+
+    def test_background_export(self):
+        sink = FakeSink()
+        exporter = export.Exporter(sink, interval=0.01)
+        exporter.put({'i': 0})
+        eventlet.sleep(0.05)
+        self.assertEqual(exporter.exported, 1)
+
+    def test_non_utf8_path(self):
+        sink = FakeSink()
+        exporter = export.Exporter(sink)
+        exporter._thread = FakeThread()
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/v1/a/\xff'}
+        exporter.put(export.inspection_record(env, 'proxy', '200 OK', []))
+        exporter.put({'bad': object()})
+        exporter.put({'i': 1})
+        self.assertEqual(exporter.flush(), 3)
+        self.assertEqual(json.loads(sink.batches[0][0])['path'],
+                         u'/v1/a/\ufffd')
+        self.assertEqual(exporter.exported, 2)
+        self.assertEqual(exporter.dropped, 1)
+
+    def test_dead_thread_respawned(self):
+        sink = FakeSink()
+        exporter = export.Exporter(sink, interval=0.01)
+        exporter._thread = eventlet.spawn(lambda: None)
+        eventlet.sleep(0)
+        self.assertTrue(exporter._thread.dead)
+        exporter.put({'i': 0})
+        eventlet.sleep(0.05)
+        self.assertEqual(exporter.exported, 1)
+
+    def test_make_sink(self):
+        self.assertTrue(isinstance(export.make_sink('udp://127.0.0.1:9999'),
+                                   export.DatagramSink))
+        self.assertTrue(isinstance(export.make_sink('file:///tmp/x.log'),
+                                   export.RotatingFileSink))
+        self.assertRaises(ValueError, export.make_sink, 'udp://127.0.0.1')
+        self.assertRaises(ValueError, export.make_sink, 'http://a:1')
+
+    def test_inspection_record(self):
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/v1/a',
+               'swift.trans_id': 'tx1'}
+        record = export.inspection_record(
+            env, 'proxy', '200 OK', [('Content-Length', '0'),
+                                     ('Inspector-Timing', '0.01')])
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['timing'], '0.01')
+        self.assertFalse('content-length' in record)
+
+    def test_proxy_exports_inspected_requests(self):
+        app = get_fake_app({'hmac_key': '',
+                            'export_sink': 'udp://127.0.0.1:9999'})
+        app.exporter._thread = FakeThread()
+        reset_response()
+        env = {'HTTP_INSPECTOR': 'Timing', 'REQUEST_METHOD': 'GET'}
+        ''.join(app(env, start_response))
+        self.assertEqual(len(app.exporter.queue), 1)
+        self.assertTrue('timing' in app.exporter.queue[0])
+
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_datagram_sink_splits_batches(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(1)
+        sink = export.DatagramSink(socket.AF_INET, server.getsockname(),
+                                   max_size=10)
+        sink.send(['abcdef\n', 'ghijkl\n'])
+        self.assertEqual(server.recv(100), 'abcdef\n')
+        self.assertEqual(server.recv(100), 'ghijkl\n')
+        sink.close()
+        server.close()
+
+    def test_file_sink_rotates(self):
+        path = os.path.join(self.tempdir, 'inspector.log')
+        sink = export.RotatingFileSink(path, max_bytes=10, backup_count=2)
+        for line in ('aaaaaaaaaa\n', 'bbbbbbbbbb\n', 'cc\n'):
+            sink.send([line])
+        sink.close()
+        with open(path) as f:
+            self.assertEqual(f.read(), 'cc\n')
+        with open(path + '.1') as f:
+            self.assertEqual(f.read(), 'bbbbbbbbbb\n')
+        with open(path + '.2') as f:
+            self.assertEqual(f.read(), 'aaaaaaaaaa\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import tempfile
+import unittest
+
+from swift_inspector import hot
+from swift_inspector import rings
+from test import write_fake_ring
+
+
+class TestSketches(unittest.TestCase):
+
+    def test_count_min_never_under_estimates(self):
+        sketch = hot.CountMinSketch(width=16, depth=3)
+        for i in range(100):
+            sketch.add('key{0}'.format(i % 10))
+        for i in range(10):
+            self.assertTrue(sketch.estimate('key{0}'.format(i)) >= 10)
+
+    def test_space_saving_keeps_heavy_hitters(self):
+        top = hot.SpaceSaving(k=3)
+        for i in range(100):
+            top.add('hot')
+            top.add('cold{0}'.format(i))
+        self.assertEqual(len(top.counts), 3)
+        self.assertTrue(top.counts['hot'] >= 100)
+
+    def test_window_slides(self):
+        hitters = hot.WindowedHeavyHitters(window=10, slices=2, k=4)
+        hitters.add('a', now=1)
+        hitters.add('a', now=6)
+        hitters.add('b', now=6)
+        self.assertEqual(hitters.top(now=9), [('a', 2), ('b', 1)])
+        self.assertEqual(hitters.top(now=12), [('a', 1), ('b', 1)])
+        self.assertEqual(hitters.top(now=21), [])
+
+
+class TestHotTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.swift_dir = tempfile.mkdtemp()
+        for ring_name in ('account', 'container', 'object'):
+            write_fake_ring(self.swift_dir, ring_name)
+        self.ring_cache = rings.RingCache(self.swift_dir)
+        self.tracker = hot.HotTracker(self.ring_cache)
+
+    def tearDown(self):
+        shutil.rmtree(self.swift_dir)
+
+    def test_requests_counted(self):
+        for i in range(3):
+            self.tracker.track({'PATH_INFO': '/v1/a/c'})
+        self.tracker.track({'PATH_INFO': '/v1/a'})
+        partition = self.ring_cache.get_ring('container').get_part('a', 'c')
+        stats = self.tracker.stats()
+        self.assertEqual(stats['partitions'][0], {
+            'partition': 'container/{0}'.format(partition), 'count': 3})
+        self.assertEqual(sum([device['count']
+                              for device in stats['devices']]), 12)
+
+    def test_object_requests_need_policy(self):
+        self.tracker.track({'PATH_INFO': '/v1/a/c/o'})
+        self.assertEqual(self.tracker.stats()['partitions'], [])
+        self.tracker.track({'PATH_INFO': '/v1/a/c/o', 'swift.infocache': {
+            'container/a/c': {'storage_policy': '0'}}})
+        self.assertTrue(self.tracker.stats()['partitions'][0][
+            'partition'].startswith('object-0/'))
+
+    def test_invalid_paths_ignored(self):
+        self.tracker.track({'PATH_INFO': '/info'})
+        self.tracker.track({'PATH_INFO': '/v1/a/c/o', 'swift.infocache': {
+            'container/a/c': {'storage_policy': '9'}}})
+        stats = self.tracker.stats()
+        self.assertEqual(stats['partitions'], [])
+        self.assertEqual(stats['errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+import eventlet
+import greenlet
+
+from swift_inspector import utils
+from swift_inspector.inspectors import hub
+
+
+def block_hub():
+    time.sleep(0.05)
+
+
+class TestHub(unittest.TestCase):
+
+    def test_sampler_overlap(self):
+        sampler = hub.LagSampler(0.1)
+        sampler.record(10.0, 0.5)
+        sampler.record(11.0, 0.0)
+        sampler.record(12.0, 1.0)
+        self.assertEqual(sampler.overlap(9.0, 13.0), 1.5)
+        self.assertEqual(sampler.overlap(9.75, 11.5), 0.75)
+        self.assertEqual(sampler.overlap(12.0, 13.0), 0.0)
+        self.assertEqual(len(sampler.samples), 2)
+        self.assertEqual(sampler.max_lag, 1.0)
+
+    def test_scheduling_delay_measured(self):
+        def request():
+            trace = hub.HubTrace()
+            eventlet.spawn(block_hub)
+            eventlet.sleep(0)
+            trace.finish()
+            return trace
+
+        trace = eventlet.spawn(request).wait()
+        self.assertEqual(trace.yields, 1)
+        self.assertTrue(trace.delay >= 0.04)
+        self.assertTrue(trace.run < 0.04)
+        self.assertEqual(utils._switch_tracers, {})
+
+    def test_tracer_removed_if_app_raises(self):
+        def app(env, start_response):
+            raise Exception('oops')
+
+        def request():
+            env = {}
+            wrapper = hub.proxy_wrapper(env, None, app, {})
+            self.assertNotEqual(utils._switch_tracers, {})
+            self.assertRaises(Exception, utils.call_app, env, app, wrapper)
+
+        eventlet.spawn(request).wait()
+        self.assertEqual(utils._switch_tracers, {})
+        self.assertEqual(utils._previous_trace, [None])
+
+    def test_dead_greenthread_tracer_dropped(self):
+        calls = []
+
+        def tracer(switched_to, other):
+            calls.append(switched_to)
+
+        eventlet.spawn(utils.add_switch_tracer, tracer).wait()
+        self.assertEqual(len(utils._switch_tracers), 1)
+        del calls[:]
+
+        def request():
+            utils.add_switch_tracer(tracer)
+            self.assertEqual(utils._previous_trace, [None])
+            eventlet.sleep(0)
+            utils.remove_switch_tracer(tracer)
+
+        eventlet.spawn(request).wait()
+        self.assertEqual(calls, [False, True])
+        self.assertEqual(utils._switch_tracers, {})
+        self.assertEqual(utils._previous_trace, [None])
+        self.assertEqual(greenlet.gettrace(), None)
+
+    def test_header_includes_hub_lag(self):
+        sampler = hub.LagSampler(0.001)
+        responses = []
+
+        def start_response(status, headers, exc_info=None):
+            responses.append(dict(headers))
+
+        def request():
+            wrapper = hub.proxy_wrapper({}, start_response, None,
+                                        {'hub_sampler': sampler})
+            eventlet.sleep(0.01)
+            block_hub()
+            eventlet.sleep(0.01)
+            wrapper('200 OK', [])
+
+        eventlet.spawn(request).wait()
+        sampler.stop()
+        value = responses[0]['Inspector-Hub']
+        self.assertTrue(value.startswith('yields=2 '))
+        hub_lag = float(value.rsplit('hub_lag=', 1)[1])
+        self.assertTrue(hub_lag >= 0.04)
+
+    def test_lag_sampler_config(self):
+        self.assertEqual(hub.get_lag_sampler({}), None)
+        self.assertEqual(
+            hub.get_lag_sampler({'hub_lag_interval': '0.5'}).interval, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,7 @@ import hmac
 import time
 import unittest
 
+from swift_inspector import middleware
 from swift_inspector.middleware import proxy
 
 
@@ -309,5 +310,186 @@ class TestInspector(unittest.TestCase):
         self.assertEqual(exc_info, None)
         self.assertTrue(body == '')
 
+
+class TestSampling(unittest.TestCase):
+
+    def setUp(self):
+        reset_response()
+
+    def test_sampled_results_not_added_to_headers(self):
+        app = get_fake_app(config={'sample_rate': '1'})
+        env = _make_env()
+
+        body = ''.join(app(env, start_response))
+        (status, headers, exc_info) = get_response()
+
+        for h, v in headers:
+            h = h.lower()
+            self.assertFalse(h.startswith('inspector'),
+                             'True is not false ("{0}", "{1}")'.format(h, v))
+        self.assertEqual(status, '200 OK')
+        self.assertTrue(body == '')
+        self.assertEqual(app.sampled_requests, 1)
+        self.assertTrue(app.sample_overhead >= 0)
+
+    def test_unsampled_requests_pass_through(self):
+        app = get_fake_app(config={'sample_rate': '1',
+                                   'sample_rate_methods': 'GET:0'})
+        env = _make_env()
+        env['REQUEST_METHOD'] = 'GET'
+
+        ''.join(app(env, start_response))
+        self.assertEqual(app.sampled_requests, 0)
+
+    def test_most_specific_sample_rate_used(self):
+        app = get_fake_app(config={
+            'sample_rate': '0.1',
+            'sample_rate_methods': 'GET:0.2',
+            'sample_rate_accounts': 'AUTH_a:0.3',
+            'sample_rate_containers': 'AUTH_a/c:0.4'})
+
+        def rate(method, path):
+            return app.get_sample_rate(
+                {'REQUEST_METHOD': method, 'PATH_INFO': path})
+
+        self.assertEqual(rate('PUT', '/v1/AUTH_b/c/o'), 0.1)
+        self.assertEqual(rate('GET', '/v1/AUTH_b/c/o'), 0.2)
+        self.assertEqual(rate('GET', '/v1/AUTH_a'), 0.3)
+        self.assertEqual(rate('PUT', '/v1/AUTH_a/d/o'), 0.3)
+        self.assertEqual(rate('PUT', '/v1/AUTH_a/c/o'), 0.4)
+
+    def test_invalid_sample_rates(self):
+        self.assertRaises(ValueError, proxy.parse_sample_rates, 'GET')
+        self.assertRaises(ValueError, proxy.parse_sample_rates, 'GET:x')
+        self.assertEqual(proxy.parse_sample_rates('GET:1 a/c:0.5'),
+                         {'GET': 1.0, 'a/c': 0.5})
+
+
+class TestSignatureCache(unittest.TestCase):
+
+    def _sign(self, inspector, expires, key='Password1'):
+        return hmac.new(key, '{0}\n{1}'.format(inspector.lower(), expires),
+                        hashlib.sha1).hexdigest()
+
+    def test_verified_signature_cached(self):
+        cache = middleware.SignatureCache('Password1')
+        expires = str(int(time.time() + 86400))
+        sig = self._sign('Timing', expires)
+        cache.check('Timing', expires, sig)
+        cache.check('Timing', expires, sig)
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_invalid_signature_not_cached(self):
+        cache = middleware.SignatureCache('Password1')
+        expires = str(int(time.time() + 86400))
+        sig = self._sign('Timing', expires, key='INVALID')
+        for i in range(2):
+            self.assertRaises(middleware.InspectorError, cache.check,
+                              'Timing', expires, sig)
+        self.assertEqual(cache.stats(),
+                         {'hits': 0, 'misses': 2, 'size': 0})
+
+    def test_expired_signature_evicted(self):
+        cache = middleware.SignatureCache('Password1')
+        expires = str(int(time.time() + 86400))
+        sig = self._sign('Timing', expires)
+        cache.check('Timing', expires, sig)
+        cache._cache[('Timing', expires, sig)] = int(time.time() - 1)
+        self.assertRaises(middleware.InspectorError, cache.check,
+                          'Timing', expires, sig)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_least_recently_used_evicted(self):
+        cache = middleware.SignatureCache('Password1', max_size=2)
+        expires = str(int(time.time() + 86400))
+        for inspector in ('Timing', 'Nodes', 'Timing', 'Handlers'):
+            cache.check(inspector, expires, self._sign(inspector, expires))
+        self.assertEqual(
+            [key[0] for key in cache._cache], ['Timing', 'Handlers'])
+
+    def test_default_inspectors_signed(self):
+        cache = middleware.SignatureCache('Password1', default=['Timing'])
+        expires = str(int(time.time() + 86400))
+        cache.check('Nodes', expires, self._sign('Timing Nodes', expires))
+
+
+class TestPlanCache(unittest.TestCase):
+
+    def test_plan_memoized_per_header(self):
+        handlers = {'timing': object(), 'nodes': object()}
+        plans = middleware.PlanCache(handlers)
+        plan = plans.get('Timing Nodes')
+        self.assertTrue(plans.get('Timing Nodes') is plan)
+        self.assertEqual(plan.handlers,
+                         [handlers['timing'], handlers['nodes']])
+        self.assertEqual(plan.error, None)
+
+    def test_plan_keyed_on_raw_header(self):
+        handlers = {'timing': object(), 'nodes': object()}
+        plans = middleware.PlanCache(handlers, default=['Timing'])
+        plan = plans.get('Nodes')
+        self.assertTrue(plans.get('Nodes') is plan)
+        self.assertFalse(plans.get('nodes timing') is plan)
+        self.assertEqual(plans.get('nodes timing').handlers, plan.handlers)
+        self.assertEqual(list(plans._plans), [(('Timing',), 'Nodes'),
+                                              (('Timing',), 'nodes timing')])
+
+    def test_repeated_names_used_once(self):
+        handlers = {'timing': object()}
+        plans = middleware.PlanCache(handlers)
+        self.assertEqual(plans.get('Timing timing').handlers,
+                         [handlers['timing']])
+        plan = plans.get('Timing Timing Bogus bogus')
+        self.assertEqual(plan.handlers, [handlers['timing']])
+        self.assertEqual(plan.error,
+                         ERROR_MSG_INVALID_INSPECTOR.format('Bogus'))
+
+    def test_invalid_inspectors_precomputed(self):
+        plans = middleware.PlanCache({'timing': object()},
+                                     default=['Timing'])
+        plan = plans.get('foo bar')
+        self.assertEqual(len(plan.handlers), 1)
+        self.assertEqual(plan.error,
+                         ERROR_MSG_INVALID_INSPECTOR.format('Foo, Bar'))
+
+    def test_cache_bounded_lru(self):
+        plans = middleware.PlanCache({'a': object(), 'b': object()},
+                                     max_size=2)
+        plan_a = plans.get('a')
+        plans.get('b')
+        self.assertTrue(plans.get('a') is plan_a)
+        plans.get('a b')
+        self.assertEqual(list(plans._plans), [((), 'a'), ((), 'a b')])
+
+    def test_invalid_plans_not_cached(self):
+        plans = middleware.PlanCache({'timing': object()}, max_size=1)
+        plan = plans.get('Timing')
+        for i in range(10):
+            plans.get('junk{0}'.format(i))
+        self.assertEqual(list(plans._plans), [((), 'Timing')])
+        self.assertTrue(plans.get('Timing') is plan)
+
+
+class TestBackendSigner(unittest.TestCase):
+
+    def test_signed_headers_verified_and_reused(self):
+        signer = middleware.BackendSigner(['Timing', 'Disk'], 'Password1')
+        headers = signer.headers()
+        self.assertTrue(signer.headers() is headers)
+        self.assertEqual(headers['Inspector'], 'Timing Disk')
+        middleware.SignatureCache('Password1').check(
+            headers['Inspector'], headers['Inspector-Expires'],
+            headers['Inspector-Sig'])
+
+    def test_headers_renewed(self):
+        signer = middleware.BackendSigner(['Timing'], 'Password1', ttl=0)
+        self.assertFalse(signer.headers() is signer.headers())
+
+    def test_unsigned_without_key(self):
+        signer = middleware.BackendSigner(['Timing'])
+        self.assertEqual(signer.headers(), {'Inspector': 'Timing'})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,147 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import unittest
+
+from swift_inspector.inspectors import memory
+from swift_inspector.utils import call_app, wrap_app_iter
+from test.test_timing import FakeLogger
+
+Frame = collections.namedtuple('Frame', 'filename lineno')
+Stat = collections.namedtuple('Stat', 'traceback size_diff count_diff')
+
+
+class FakeSnapshot(object):
+
+    def __init__(self, size):
+        self.size = size
+
+    def compare_to(self, other, key_type):
+        return [Stat([Frame('app.py', 10)], self.size - other.size, 1)]
+
+
+class FakeTracemalloc(object):
+    """Only as much of tracemalloc as the inspector uses."""
+
+    def __init__(self):
+        self.tracing = False
+        self.size = 0
+        self.peak = 0
+
+    def is_tracing(self):
+        return self.tracing
+
+    def start(self, frames):
+        self.tracing = True
+
+    def stop(self):
+        self.tracing = False
+
+    def allocate(self, size):
+        self.size += size
+        self.peak = max(self.peak, self.size)
+
+    def get_traced_memory(self):
+        return self.size, self.peak
+
+    def take_snapshot(self):
+        return FakeSnapshot(self.size)
+
+
+class TestMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.tracemalloc = memory.tracemalloc
+        memory.tracemalloc = FakeTracemalloc()
+
+    def tearDown(self):
+        memory.tracemalloc = self.tracemalloc
+
+    def _request(self, config):
+        config = dict(config, signed=True)
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/v1/a/c/o'}
+        tracemalloc = memory.tracemalloc
+        responses = []
+
+        def start_response(status, headers, exc_info=None):
+            responses.append(headers)
+
+        def app(env, start_response):
+            tracemalloc.allocate(100)
+            start_response('200 OK', [])
+            tracemalloc.allocate(-40)
+            return ['body']
+
+        wrapper = memory.proxy_wrapper(env, start_response, app, config)
+        body = ''.join(wrap_app_iter(env, app(env, wrapper)))
+        self.assertEqual(body, 'body')
+        return dict(responses[0])
+
+    def test_delta_peak_and_sites(self):
+        logger = FakeLogger()
+        headers = self._request({'memory_top': 5, 'logger': logger})
+        self.assertEqual(headers['Inspector-Memory'], 'delta=100 peak=100')
+        self.assertEqual(headers['Inspector-Memory-Sites'],
+                         'app.py:10 +100B +1')
+        self.assertTrue('delta=60 peak=100' in logger.lines[0])
+        self.assertEqual(logger.stats['GET.memory.delta'], 60)
+        self.assertFalse(memory.tracemalloc.tracing)
+
+    def test_not_sampled(self):
+        headers = self._request({'memory_sample_rate': 0})
+        self.assertEqual(headers['Inspector-Memory'], 'Not Sampled')
+        self.assertFalse(memory.tracemalloc.tracing)
+
+    def test_tracing_left_running_if_already_started(self):
+        memory.tracemalloc.tracing = True
+        self._request({})
+        self.assertTrue(memory.tracemalloc.tracing)
+
+    def test_requires_signature(self):
+        env = {}
+        responses = []
+        wrapper = memory.proxy_wrapper(
+            env, lambda status, headers, exc_info=None: responses.append(
+                headers), None, {'signed': False})
+        wrapper('200 OK', [])
+        self.assertEqual(responses[0],
+                         [('Inspector-Memory', 'Requires hmac_key')])
+        self.assertFalse(memory.tracemalloc.tracing)
+
+    def test_tracing_stopped_if_app_raises(self):
+        env = {}
+
+        def app(env, start_response):
+            raise Exception('oops')
+
+        wrapper = memory.proxy_wrapper(
+            env, None, app, {'signed': True})
+        self.assertTrue(memory.tracemalloc.tracing)
+        self.assertRaises(Exception, call_app, env, app, wrapper)
+        self.assertFalse(memory.tracemalloc.tracing)
+
+    def test_unavailable(self):
+        memory.tracemalloc = None
+        env = {}
+        responses = []
+        wrapper = memory.object_wrapper(
+            env, lambda status, headers, exc_info=None: responses.append(
+                headers), None, {'signed': True})
+        wrapper('200 OK', [])
+        self.assertEqual(responses[0],
+                         [('Inspector-Memory-Object', 'Unavailable')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import tempfile
+import unittest
+
+from swift_inspector import rings
+from swift_inspector.inspectors import nodes
+from test import write_fake_ring
+
+
+class FakeMemcache(object):
+
+    def __init__(self, data):
+        self.data = data
+
+    def get(self, key):
+        return self.data.get(key)
+
+
+class FakeApp(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, env, start_response):
+        self.calls.append(env['PATH_INFO'])
+        start_response('204 No Content',
+                       [('X-Backend-Storage-Policy-Index', '1')])
+        return ['']
+
+
+class TestGetContainerPolicy(unittest.TestCase):
+
+    def setUp(self):
+        nodes._container_policies.clear()
+        self.app = FakeApp()
+
+    def tearDown(self):
+        nodes._container_policies.clear()
+
+    def test_from_env(self):
+        env = {'swift.infocache': {'container/a/c': {'storage_policy': '2'}}}
+        self.assertEqual(
+            nodes.get_container_policy(self.app, 'a', 'c', env=env),
+            ('2', 'env'))
+        self.assertEqual(self.app.calls, [])
+
+    def test_from_memcache(self):
+        env = {'swift.cache': FakeMemcache(
+            {'container/a/c': {'storage_policy': '3'}})}
+        self.assertEqual(
+            nodes.get_container_policy(self.app, 'a', 'c', env=env),
+            ('3', 'memcache'))
+        self.assertEqual(self.app.calls, [])
+
+    def test_from_backend_then_local(self):
+        policy_index, source = nodes.get_container_policy(
+            self.app, 'a', 'c', env={})
+        self.assertEqual(source, 'backend')
+        self.assertEqual(str(policy_index), '1')
+        self.assertTrue('/v1/a/c' in self.app.calls)
+        calls = len(self.app.calls)
+
+        policy_index, source = nodes.get_container_policy(
+            self.app, 'a', 'c', env={})
+        self.assertEqual(source, 'local')
+        self.assertEqual(str(policy_index), '1')
+        self.assertEqual(len(self.app.calls), calls)
+
+    def test_local_cache_expires(self):
+        nodes._container_policies[('a', 'c')] = ('1', 0)
+        self.assertEqual(
+            nodes.get_container_policy(self.app, 'a', 'c')[1], 'backend')
+
+
+class TestHandoffCache(unittest.TestCase):
+
+    def setUp(self):
+        self.swift_dir = tempfile.mkdtemp()
+        write_fake_ring(self.swift_dir, 'account', devices=8)
+        self.ring_cache = rings.RingCache(self.swift_dir)
+        self.ring = self.ring_cache.get_ring('account')
+        self.all_handoffs = list(self.ring.get_more_nodes(1))
+
+    def tearDown(self):
+        shutil.rmtree(self.swift_dir)
+
+    def test_pages_match_generator(self):
+        cache = nodes.HandoffCache(self.ring_cache)
+        handoffs, more = cache.get_handoffs(self.ring, 1, 0, 2)
+        self.assertEqual(handoffs, self.all_handoffs[:2])
+        self.assertTrue(more)
+        handoffs, more = cache.get_handoffs(self.ring, 1, 2, 100)
+        self.assertEqual(handoffs, self.all_handoffs[2:])
+        self.assertFalse(more)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_only_requested_handoffs_enumerated(self):
+        cache = nodes.HandoffCache(self.ring_cache)
+        cache.get_handoffs(self.ring, 1, 0, 1)
+        self.assertEqual(len(cache._cache.values()[0][1]), 2)
+
+    def test_huge_offset_bounded_by_devices(self):
+        cache = nodes.HandoffCache(self.ring_cache)
+        self.assertEqual(cache.get_handoffs(self.ring, 1, 1000000000, 10),
+                         ([], False))
+        self.assertEqual(cache._cache.values()[0][1], self.all_handoffs)
+
+    def test_invalidated_on_reload(self):
+        cache = nodes.HandoffCache(self.ring_cache)
+        cache.get_handoffs(self.ring, 1, 0, 1)
+        self.ring_cache.reloads += 1
+        cache.get_handoffs(self.ring, 1, 0, 1)
+        self.assertEqual(cache.misses, 2)
+
+    def test_lru_bounded(self):
+        cache = nodes.HandoffCache(self.ring_cache, max_size=1)
+        cache.get_handoffs(self.ring, 1, 0, 1)
+        cache.get_handoffs(self.ring, 2, 0, 1)
+        self.assertEqual(list(cache._cache),
+                         [(self.ring.serialized_path, 2)])
+
+    def test_handoff_range(self):
+        config = {'handoff_limit': 3, 'handoff_max_limit': 5}
+        self.assertEqual(nodes.get_handoff_range({}, config), (0, 3))
+        self.assertEqual(nodes.get_handoff_range(
+            {'HTTP_INSPECTOR_HANDOFFS_OFFSET': '4',
+             'HTTP_INSPECTOR_HANDOFFS_LIMIT': '50'}, config), (4, 5))
+        self.assertRaises(ValueError, nodes.get_handoff_range,
+                          {'HTTP_INSPECTOR_HANDOFFS_LIMIT': '-1'}, config)
+
+    def test_handoff_offset_capped(self):
+        config = {'handoff_max_offset': 20}
+        self.assertEqual(nodes.get_handoff_range(
+            {'HTTP_INSPECTOR_HANDOFFS_OFFSET': '20'}, config), (20, 10))
+        self.assertRaises(ValueError, nodes.get_handoff_range,
+                          {'HTTP_INSPECTOR_HANDOFFS_OFFSET': '1000000000'},
+                          config)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+import swift.common.swob as swob
+
+from swift_inspector import placement
+from swift_inspector import rings
+from swift_inspector.inspectors import nodes
+from swift_inspector.middleware import proxy
+from test import write_fake_ring
+
+
+def fake_app(env, start_response):
+    start_response('204 No Content', [('X-Backend-Storage-Policy-Index', '0')])
+    return ['']
+
+
+class TestParsePath(unittest.TestCase):
+
+    def test_parse_path(self):
+        self.assertEqual(placement.parse_path('a\n'), ('a', None, None))
+        self.assertEqual(placement.parse_path('/a/c'), ('a', 'c', None))
+        self.assertEqual(placement.parse_path('a/c/o/p\r\n'),
+                         ('a', 'c', 'o/p'))
+        self.assertEqual(placement.parse_path('\n'), None)
+        self.assertRaises(ValueError, placement.parse_path, 'a//o')
+        self.assertRaises(ValueError, placement.parse_path, 'a/c/')
+
+
+class TestPlacement(unittest.TestCase):
+
+    def setUp(self):
+        self.swift_dir = tempfile.mkdtemp()
+        for ring_name in ('account', 'container', 'object'):
+            write_fake_ring(self.swift_dir, ring_name)
+        self.ring_cache = rings.RingCache(self.swift_dir)
+        nodes._container_policies.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.swift_dir)
+
+    def test_lookup_matches_ring(self):
+        lookup = placement.PlacementLookup(self.ring_cache, policy_index=0,
+                                           handoffs=2)
+        record = lookup.record('a/c/o\n')
+        object_ring = self.ring_cache.get_ring('object', 0)
+        partition, nodes = object_ring.get_nodes('a', 'c', 'o')
+        self.assertEqual(record['partition'], partition)
+        self.assertEqual(len(record['nodes']), len(nodes))
+        self.assertEqual(len(record['handoffs']), 2)
+        self.assertEqual(record['path'], 'a/c/o')
+
+    def test_container_policy_looked_up_once(self):
+        calls = []
+
+        def get_policy(account, container):
+            calls.append((account, container))
+            return 0
+        lookup = placement.PlacementLookup(self.ring_cache,
+                                           get_policy=get_policy)
+        for line in ('a/c/o1', 'a/c/o2', 'a/d/o1', 'a/c'):
+            lookup.record(line)
+        self.assertEqual(calls, [('a', 'c'), ('a', 'd')])
+
+    def test_invalid_path_reported(self):
+        lookup = placement.PlacementLookup(self.ring_cache)
+        self.assertEqual(lookup.record('a//o'),
+                         {'path': 'a//o', 'error': 'Invalid path'})
+
+    def test_batch_endpoint(self):
+        app = proxy.InspectorMiddleware(fake_app, {'here': self.swift_dir})
+        req = swob.Request.blank('/inspector/nodes?handoffs=1',
+                                 method='POST', body='a\na/c\n\na/c/o\n')
+        resp = req.get_response(app)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.content_type, 'application/x-ndjson')
+        records = [json.loads(line) for line in resp.body.splitlines()]
+        self.assertEqual([r['path'] for r in records], ['a', 'a/c', 'a/c/o'])
+        self.assertTrue(all(len(r['handoffs']) == 1 for r in records))
+
+        req = swob.Request.blank('/inspector/nodes')
+        self.assertEqual(req.get_response(app).status_int, 405)
+
+    def test_long_lines_rejected(self):
+        app = proxy.InspectorMiddleware(fake_app, {'here': self.swift_dir})
+        long_path = 'a/c/' + 'o' * (placement.MAX_LINE_LENGTH * 2)
+        req = swob.Request.blank('/inspector/nodes', method='POST',
+                                 body='a\n' + long_path + '\na/c\n')
+        records = [json.loads(line)
+                   for line in req.get_response(app).body.splitlines()]
+        self.assertEqual([r['path'] for r in records],
+                         ['a', long_path[:placement.TOO_LONG_PREFIX], 'a/c'])
+        self.assertEqual(records[1]['error'], 'Line too long')
+        self.assertFalse('error' in records[2])
+
+    def test_line_of_max_length_at_end_accepted(self):
+        path = 'a/c/' + 'o' * (placement.MAX_LINE_LENGTH - 4)
+        lines = list(placement.iter_lines(StringIO.StringIO(path)))
+        self.assertEqual(lines, [path])
+
+    def test_batch_endpoint_requires_signature(self):
+        app = proxy.InspectorMiddleware(fake_app, {'here': self.swift_dir,
+                                                   'hmac_key': 'Password1'})
+        req = swob.Request.blank('/inspector/nodes', method='POST',
+                                 body='a\n')
+        resp = req.get_response(app)
+        self.assertEqual(resp.status_int, 401)
+        self.assertEqual(resp.headers['Inspector-Error'],
+                         'Missing Header: Inspector-Sig')
+
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.swift_dir = tempfile.mkdtemp()
+        for ring_name in ('account', 'container', 'object'):
+            write_fake_ring(self.swift_dir, ring_name)
+        self.paths = os.path.join(self.swift_dir, 'paths.txt')
+        with open(self.paths, 'w') as f:
+            f.write('a\na/c\na/c/o1\na/c/o2\n\na//o\n')
+        self.summary = os.path.join(self.swift_dir, 'summary.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.swift_dir)
+
+    def _main(self, *args):
+        stdout = StringIO.StringIO()
+        placement.main([self.paths, '--swift-dir', self.swift_dir,
+                        '--workers', '1', '--summary', self.summary] +
+                       list(args), stdout=stdout)
+        with open(self.summary) as f:
+            summary = json.load(f)
+        return [json.loads(line) for line in stdout.getvalue().splitlines()], \
+            summary
+
+    def _main_error(self, *args):
+        stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            self.assertRaises(SystemExit, self._main, *args)
+            return sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+
+    def test_records_and_summary(self):
+        records, summary = self._main('--handoffs', '1')
+        self.assertEqual([r['path'] for r in records],
+                         ['a', 'a/c', 'a/c/o1', 'a/c/o2', 'a//o'])
+        for record in records[:4]:
+            self.assertEqual(len(record['nodes']), 3)
+            self.assertEqual(len(record['handoffs']), 1)
+        self.assertEqual(records[4]['error'], 'Invalid path')
+        self.assertEqual(sum(summary['partitions']['object'].values()), 2)
+        self.assertEqual(sum(summary['devices']['object'].values()), 6)
+        self.assertEqual(sum(summary['devices']['account'].values()), 3)
+
+    def test_summary_only_top(self):
+        records, summary = self._main('--summary-only', '--top', '1')
+        self.assertEqual(records, [])
+        self.assertEqual(len(summary['devices']['object']), 1)
+
+    def test_missing_ring(self):
+        os.unlink(os.path.join(self.swift_dir, 'container.ring.gz'))
+        self.assertTrue('Unable to load rings' in self._main_error())
+
+    def test_bad_policy(self):
+        self.assertTrue('No policy with index 7' in
+                        self._main_error('--policy', '7'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import eventlet
+
+from swift_inspector.inspectors import probe
+
+
+class FakeResponse(object):
+
+    status = 200
+
+    def read(self):
+        return ''
+
+    def getheader(self, name):
+        return {'X-Timestamp': '1400000000.00000',
+                'Etag': 'd41d8cd98f00b204e9800998ecf8427e'}.get(name)
+
+
+class FakeConnection(object):
+
+    def __init__(self, device):
+        self.device = device
+        self.closed = False
+
+    def getresponse(self):
+        if self.device == 'slow':
+            eventlet.sleep(1)
+        return FakeResponse()
+
+    def close(self):
+        self.closed = True
+
+
+def fake_http_connect(ipaddr, port, device, partition, method, path,
+                      headers=None):
+    if device == 'dead':
+        raise IOError('connection refused')
+    return FakeConnection(device)
+
+
+class TestProbe(unittest.TestCase):
+
+    def setUp(self):
+        self.http_connect = probe.bufferedhttp.http_connect
+        probe.bufferedhttp.http_connect = fake_http_connect
+
+    def tearDown(self):
+        probe.bufferedhttp.http_connect = self.http_connect
+
+    def test_probe_nodes(self):
+        nodes = [{'ip': '127.0.0.1', 'port': 6010, 'device': device}
+                 for device in ('sdb1', 'dead', 'slow')]
+        results = probe.probe_nodes(nodes, 3, '/a/c/o', {}, 0.1, 10)
+        self.assertEqual([result[0] for result in results],
+                         [200, 'error', 'timeout'])
+        self.assertEqual(results[0][2], '1400000000.00000')
+        self.assertTrue(results[2][1] < 1)
+
+    def test_format_probe(self):
+        node = {'ip': '127.0.0.1', 'port': 6010, 'device': 'sdb1'}
+        self.assertEqual(
+            probe.format_probe(node, 3, ('timeout', 0.1, None, None), True),
+            '127.0.0.1:6010/sdb1/3 timeout 0.1000 - - handoff')
+
+
+if __name__ == '__main__':
+    unittest.main()
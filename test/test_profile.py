@@ -0,0 +1,88 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+
+import eventlet
+import greenlet
+
+from swift_inspector import utils
+from swift_inspector.inspectors import profile
+from swift_inspector.utils import wrap_app_iter
+
+
+def request_work():
+    return sum(range(1000))
+
+
+def other_work():
+    return sum(range(1000))
+
+
+def fake_app(env, start_response):
+    eventlet.spawn(other_work)
+    eventlet.sleep(0)
+    request_work()
+    start_response('200 OK', [])
+    return ['body']
+
+
+class TestProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir)
+
+    def _request(self, config):
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/v1/a/c/o',
+               'swift.trans_id': 'tx1'}
+        responses = []
+
+        def start_response(status, headers, exc_info=None):
+            responses.append(dict(headers))
+
+        wrapper = profile.proxy_wrapper(env, start_response, fake_app,
+                                        config)
+        self.assertEqual(
+            ''.join(wrap_app_iter(env, fake_app(env, wrapper))), 'body')
+        return responses[0]
+
+    def test_requires_hmac_key(self):
+        headers = self._request({})
+        self.assertEqual(headers['Inspector-Profile'], 'Requires hmac_key')
+
+    def test_request_greenthread_profiled(self):
+        headers = self._request({'signed': True,
+                                 'profile_dir': self.profile_dir,
+                                 'profile_top': 100})
+        self.assertTrue('(request_work)' in headers['Inspector-Profile'])
+        self.assertFalse('(other_work)' in headers['Inspector-Profile'])
+        self.assertEqual(utils._switch_tracers, {})
+        self.assertEqual(greenlet.gettrace(), None)
+
+        filenames = os.listdir(self.profile_dir)
+        self.assertEqual(len(filenames), 1)
+        self.assertTrue(filenames[0].startswith('tx1-'))
+        stats = pstats.Stats(os.path.join(self.profile_dir, filenames[0]))
+        self.assertTrue(any(name == 'request_work'
+                            for _, _, name in stats.stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
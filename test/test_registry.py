@@ -0,0 +1,120 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import sys
+import unittest
+
+from swift_inspector import inspectors
+from swift_inspector.inspectors import timing
+
+
+class FakeLogger(object):
+    def __init__(self):
+        self.errors = []
+
+    def exception(self, msg):
+        self.errors.append(msg)
+
+
+class TestInspectorRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self._entry_points = inspectors._entry_points
+        self.entry_points = {}
+        inspectors._entry_points = lambda server_type: dict(
+            self.entry_points.get(server_type, {}))
+        self.required_modules = inspectors.REQUIRED_MODULES.copy()
+
+    def tearDown(self):
+        inspectors._entry_points = self._entry_points
+        inspectors.REQUIRED_MODULES = self.required_modules
+
+    def test_server_types(self):
+        proxy = inspectors.InspectorRegistry('proxy')
+        obj = inspectors.InspectorRegistry('object')
+        self.assertTrue('nodes' in proxy)
+        self.assertFalse('nodes' in obj)
+        self.assertTrue('disk' in obj)
+        self.assertFalse('disk' in proxy)
+
+    def test_loaded_on_first_get(self):
+        registry = inspectors.InspectorRegistry('proxy')
+        self.assertEqual(registry.loaded(), [])
+        self.assertTrue(registry.get('timing') is timing.proxy_wrapper)
+        self.assertEqual(registry.loaded(), ['timing'])
+        self.assertEqual(registry.get('foo'), None)
+
+    def test_enable_and_exclude_per_instance(self):
+        registry = inspectors.get_registry(
+            'proxy', {'inspectors': 'Timing Nodes Probe', 'exclude': 'Probe'})
+        self.assertEqual(registry.names(), ['nodes', 'timing'])
+        self.assertEqual(registry.get('probe'), None)
+        other = inspectors.get_registry('proxy', {})
+        self.assertTrue('probe' in other)
+
+    def test_entry_points(self):
+        def custom(env, start_response, app, config):
+            return start_response
+        self.entry_points['proxy'] = {'custom': lambda: custom,
+                                      'timing': lambda: custom}
+        registry = inspectors.InspectorRegistry('proxy')
+        self.assertTrue(registry.get('custom') is custom)
+        self.assertTrue(registry.get('timing') is custom)
+        self.assertFalse('custom' in inspectors.InspectorRegistry('object'))
+
+    def test_required_modules(self):
+        self.entry_points['proxy'] = {'custom': lambda: None}
+        inspectors.REQUIRED_MODULES = {'timing': 'os',
+                                       'custom': 'no_such_module',
+                                       'nodes': 'no_such_module'}
+        registry = inspectors.InspectorRegistry('proxy')
+        self.assertTrue('timing' in registry)
+        self.assertFalse('custom' in registry)
+        self.assertFalse('nodes' in registry)
+
+    def test_memory_needs_tracemalloc(self):
+        registry = inspectors.InspectorRegistry('proxy')
+        self.assertEqual('memory' in registry,
+                         inspectors._importable('tracemalloc'))
+
+    def test_failed_load(self):
+        def broken():
+            raise ImportError('No module named broken')
+        self.entry_points['object'] = {'broken': broken}
+        logger = FakeLogger()
+        registry = inspectors.InspectorRegistry('object', logger=logger)
+        self.assertEqual(registry.get('broken'), None)
+        self.assertFalse('broken' in registry)
+        self.assertEqual(logger.errors,
+                         ['Unable to load object inspector broken'])
+
+
+class TestObjectImports(unittest.TestCase):
+
+    def test_proxy_modules_not_imported(self):
+        # Run in a new interpreter, as other tests import the proxy modules.
+        output = subprocess.check_output([sys.executable, '-c', (
+            'import sys\n'
+            'from swift_inspector.middleware import object\n'
+            'object.InspectorMiddleware(None, {})\n'
+            'print(sorted(name for name in sys.modules if name in ('
+            '"swift.proxy.controllers.base", '
+            '"swift_inspector.inspectors.nodes")))')],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
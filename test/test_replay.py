@@ -0,0 +1,126 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import unittest
+
+from swift_inspector import replay
+from swift_inspector.middleware import proxy
+
+# A request for "/v1/AUTH_test/c/o x?a%" with the query string
+# "multipart-manifest=get", logged as
+# quote(quote("/v1/AUTH_test/c/o x?a%") + "?" + query_string).
+LOG_LINE = (
+    'Oct 18 12:00:00 proxy01 proxy-server: 10.0.0.1 10.0.0.1 '
+    '18/Oct/2026/12/00/00 GET '
+    '/v1/AUTH_test/c/o%2520x%253Fa%2525%3Fmultipart-manifest%3Dget '
+    'HTTP/1.0 200 - curl AUTH_tk... - 4096 - tx1234 - 0.0123 - - '
+    '1792324800.0 1792324800.0123 0')
+
+
+class TestParse(unittest.TestCase):
+
+    def test_parse_log_line(self):
+        request = replay.parse_log_line(LOG_LINE)
+        self.assertEqual(request, replay.ReplayRequest(
+            'GET', '/v1/AUTH_test/c/o x?a%', 200, 4096, 0.0123))
+
+    def test_parse_log_line_not_access_log(self):
+        self.assertEqual(replay.parse_log_line('STDOUT: starting'), None)
+        self.assertEqual(replay.parse_log_line(
+            LOG_LINE.replace(' 200 ', ' ok ')), None)
+
+    def test_parse_mix(self):
+        self.assertEqual(replay.parse_mix('get:3 PUT:1'),
+                         [('GET', 3.0), ('PUT', 1.0)])
+        self.assertRaises(ValueError, replay.parse_mix, 'FOO:1')
+        self.assertRaises(ValueError, replay.parse_mix, 'GET:0')
+
+    def test_parse_latency(self):
+        request = replay.ReplayRequest('GET', '/v1/a', 200, 0, 0.5)
+        self.assertEqual(replay.parse_latency('log')(request), 0.5)
+        self.assertEqual(replay.parse_latency('fixed:0.25')(request), 0.25)
+        latency = replay.parse_latency('uniform:0.1:0.2')(request)
+        self.assertTrue(0.1 <= latency <= 0.2)
+        self.assertTrue(replay.parse_latency('lognormal:0.01:0.5')(
+            request) > 0)
+        for spec in ('fixed', 'uniform:1', 'exponential:0', 'normal:1'):
+            self.assertRaises(ValueError, replay.parse_latency, spec)
+
+    def test_synthetic_requests_reproducible(self):
+        mix = replay.parse_mix('GET:1 PUT:1')
+        first = list(replay.synthetic_requests(
+            50, mix, rand=random.Random(1)))
+        second = list(replay.synthetic_requests(
+            50, mix, rand=random.Random(1)))
+        self.assertEqual(first, second)
+        self.assertEqual(set(r.method for r in first), set(['GET', 'PUT']))
+        for request in first:
+            self.assertEqual(request.bytes_sent,
+                             4096 if request.method == 'GET' else 0)
+
+
+class TestRun(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = replay.with_latency(
+            [replay.ReplayRequest('GET', '/v1/AUTH_test/c/o', 200, 100, 0),
+             replay.ReplayRequest('HEAD', '/v1/AUTH_test/c/o', 404, 100, 0),
+             replay.ReplayRequest('PUT', '/v1/AUTH_test/c/o', 201, 0, 0)] *
+            10, replay.parse_latency('fixed:0.001'))
+
+    def test_run(self):
+        app = proxy.InspectorMiddleware(replay.StandInApp(), {})
+        result = replay.run(app, self.requests, 10,
+                            replay.inspector_headers('Timing'))
+        self.assertEqual(result['count'], 30)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['statuses'],
+                         {'200': 10, '404': 10, '201': 10})
+        self.assertTrue(result['p50'] >= 0.001)
+        self.assertTrue(result['throughput'] > 0)
+
+    def test_errors_counted(self):
+        def broken_app(env, start_response):
+            raise Exception('oops')
+        result = replay.run(broken_app, self.requests, 5)
+        self.assertEqual(result['errors'], 30)
+        self.assertEqual(result['count'], 30)
+
+    def test_inspector_headers_signed(self):
+        headers = replay.inspector_headers('Timing', 'Password1')
+        app = proxy.InspectorMiddleware(
+            replay.StandInApp(), {'hmac_key': 'Password1'})
+        captured = []
+
+        def start_response(status, response_headers, exc_info=None):
+            captured.append(dict(response_headers))
+        env = replay.make_env(self.requests[0], 'tx1', headers)
+        list(app(env, start_response))
+        self.assertTrue('Inspector-Timing' in captured[0])
+        self.assertFalse('Inspector-Error' in captured[0])
+
+    def test_overhead(self):
+        delta = replay.overhead(
+            {'throughput': 90.0, 'cpu_per_request': 0.002, 'p50': 0.02,
+             'p99': None},
+            {'throughput': 100.0, 'cpu_per_request': 0.001, 'p50': 0.01,
+             'p99': 0.05})
+        self.assertAlmostEqual(delta['throughput'], -0.1)
+        self.assertAlmostEqual(delta['cpu_per_request'], 0.001)
+        self.assertAlmostEqual(delta['p50'], 0.01)
+        self.assertFalse('p99' in delta)
+
+
+if __name__ == '__main__':
+    unittest.main()
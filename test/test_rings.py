@@ -0,0 +1,69 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from swift_inspector import rings
+from test import write_fake_ring
+
+
+class TestRingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.swift_dir = tempfile.mkdtemp()
+        for ring_name in ('account', 'container', 'object'):
+            write_fake_ring(self.swift_dir, ring_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.swift_dir)
+
+    def test_ring_reused(self):
+        cache = rings.RingCache(self.swift_dir)
+        first = cache.get_ring('container')
+        second = cache.get_ring('container')
+        self.assertTrue(first is second)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.reloads, 0)
+
+    def test_rings_keyed_by_name_and_policy(self):
+        cache = rings.RingCache(self.swift_dir)
+        account_ring = cache.get_ring('account')
+        object_ring = cache.get_ring('object', 0)
+        self.assertFalse(account_ring is object_ring)
+        self.assertTrue(cache.get_ring('object', None) is object_ring)
+        self.assertTrue(cache.get_ring('object', '0') is object_ring)
+        self.assertEqual(cache.stats()['rings'], 2)
+
+    def test_reload_on_mtime_change(self):
+        cache = rings.RingCache(self.swift_dir, reload_time=0)
+        first = cache.get_ring('account')
+        path = os.path.join(self.swift_dir, 'account.ring.gz')
+        mtime = os.path.getmtime(path)
+        os.utime(path, (mtime + 10, mtime + 10))
+        second = cache.get_ring('account')
+        self.assertFalse(first is second)
+        self.assertEqual(cache.reloads, 1)
+        self.assertTrue(cache.get_ring('account') is second)
+        self.assertEqual(cache.hits, 1)
+
+    def test_process_wide_cache(self):
+        self.assertTrue(rings.get_ring_cache(self.swift_dir) is
+                        rings.get_ring_cache(self.swift_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
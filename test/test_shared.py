@@ -0,0 +1,112 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from swift_inspector import shared
+
+
+class TestSharedStats(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'stats')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _fork(self, records, wait=False):
+        """Record values in a child process, which holds its slot until
+        its pipe is closed if wait is set.
+        """
+        read_fd, write_fd = os.pipe()
+        done_read, done_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(write_fd)
+            os.close(done_read)
+            stats = shared.SharedStats(self.path, slots=4, keys=4)
+            for seconds in records:
+                stats.record('GET', '200 OK', '0', 'timing', seconds)
+            os.write(done_write, 'x')
+            if wait:
+                os.read(read_fd, 1)
+            os._exit(0)
+        os.close(read_fd)
+        os.close(done_write)
+        os.read(done_read, 1)
+        os.close(done_read)
+        if not wait:
+            os.close(write_fd)
+            os.waitpid(pid, 0)
+        return pid, write_fd
+
+    def test_workers_aggregated(self):
+        stats = shared.SharedStats(self.path, slots=4, keys=4)
+        pid, write_fd = self._fork([0.001, 0.002], wait=True)
+        stats.record('GET', '200 OK', '0', 'timing', 0.003)
+        stats.record('PUT', '201 Created', '0', 'timing', 0.01)
+        self.assertEqual(stats.slot, 1)
+        data = stats.to_dict()
+        self.assertEqual(data['slots_used'], 2)
+        histograms = dict(((h['method'], h['status']), h)
+                          for h in data['histograms'])
+        self.assertEqual(histograms[('GET', '2xx')]['count'], 3)
+        self.assertEqual(histograms[('GET', '2xx')]['min'], 0.001)
+        self.assertEqual(histograms[('GET', '2xx')]['max'], 0.003)
+        self.assertEqual(histograms[('PUT', '2xx')]['count'], 1)
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+
+    def test_slot_of_exited_worker_reused(self):
+        self._fork([0.001])
+        stats = shared.SharedStats(self.path, slots=4, keys=4)
+        stats.record('GET', '200 OK', '0', 'timing', 0.002)
+        self.assertEqual(stats.slot, 0)
+        data = stats.to_dict()
+        self.assertEqual(data['slots_used'], 1)
+        self.assertEqual(data['histograms'][0]['count'], 2)
+
+    def test_keys_bounded(self):
+        stats = shared.SharedStats(self.path, slots=1, keys=1)
+        stats.record('GET', '200 OK', '0', 'timing', 0.001)
+        stats.record('GET', '200 OK', '0', 'first_byte', 0.001)
+        self.assertEqual(stats.dropped, 1)
+
+    def test_layout_reset(self):
+        stats = shared.SharedStats(self.path, slots=1, keys=1)
+        stats.record('GET', '200 OK', '0', 'timing', 0.001)
+        stats = shared.SharedStats(self.path, slots=2, keys=1)
+        self.assertEqual(stats.to_dict()['histograms'], [])
+
+    def test_layout_reset_leaves_old_mapping(self):
+        old = shared.SharedStats(self.path, slots=4, keys=4)
+        old.record('GET', '200 OK', '0', 'timing', 0.001)
+        new = shared.SharedStats(self.path, slots=1, keys=1)
+        self.assertNotEqual(old.file_id, new.file_id)
+        self.assertEqual(os.fstat(old.fd).st_size, old.size)
+        # The old worker keeps recording into its own file.
+        old.record('GET', '200 OK', '0', 'timing', 0.002)
+        self.assertEqual(old.to_dict()['histograms'][0]['count'], 2)
+        self.assertEqual(new.to_dict()['histograms'], [])
+        self.assertEqual(os.listdir(self.tempdir), ['stats'])
+        self.assertEqual(
+            shared.SharedStats(self.path, slots=1, keys=1).file_id,
+            new.file_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+import unittest
+
+from swift_inspector import stats
+from swift_inspector.middleware import create_sig
+from swift_inspector.middleware import object as object_middleware
+from swift_inspector.middleware import proxy
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_bucket_bounds_contain_values(self):
+        histogram = stats.LatencyHistogram()
+        for value in (0, 1, 31, 32, 33, 63, 64, 1000, 123456, 2 ** 31):
+            lower, upper = histogram.bucket_bounds(
+                histogram.bucket_index(value))
+            self.assertTrue(lower <= value < upper, (value, lower, upper))
+
+    def test_fixed_size(self):
+        histogram = stats.LatencyHistogram()
+        size = len(histogram.counts)
+        histogram.record(10 ** 6)
+        self.assertEqual(len(histogram.counts), size)
+        self.assertEqual(histogram.counts[-1], 1)
+
+    def test_percentiles(self):
+        histogram = stats.LatencyHistogram()
+        for i in range(1, 1001):
+            histogram.record(i / 1000.0)
+        data = histogram.to_dict()
+        self.assertEqual(data['count'], 1000)
+        self.assertEqual(data['min'], 0.001)
+        self.assertEqual(data['max'], 1.0)
+        # Buckets have a relative error of at most 1/16.
+        for key, expected in (('p50', 0.5), ('p99', 0.99), ('p999', 0.999)):
+            self.assertTrue(abs(data[key] - expected) <= expected / 16.0,
+                            (key, data[key]))
+
+    def test_empty(self):
+        histogram = stats.LatencyHistogram()
+        self.assertEqual(histogram.percentile(50), None)
+        self.assertEqual(histogram.to_dict(), {'count': 0})
+
+
+class TestInspectorStats(unittest.TestCase):
+
+    def test_keys(self):
+        inspector_stats = stats.InspectorStats()
+        inspector_stats.record('GET', '200 OK', '0', 'timing', 0.1)
+        inspector_stats.record('GET', '204 No Content', 0, 'timing', 0.2)
+        inspector_stats.record('FOO', '503 Unavailable', '-', 'timing', 0.3)
+        histograms = inspector_stats.to_list()
+        self.assertEqual(len(histograms), 2)
+        self.assertEqual(histograms[0]['method'], 'GET')
+        self.assertEqual(histograms[0]['status'], '2xx')
+        self.assertEqual(histograms[0]['count'], 2)
+        self.assertEqual(histograms[1]['method'], 'OTHER')
+        self.assertEqual(histograms[1]['status'], '5xx')
+
+
+class TestStatsEndpoint(unittest.TestCase):
+
+    def _call(self, app, env):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+        body = ''.join(app(env, start_response))
+        return response['status'], body
+
+    def test_timing_recorded_and_served(self):
+        def fake_app(env, start_response):
+            start_response('200 OK', [])
+            return ['']
+        app = proxy.InspectorMiddleware(fake_app, {})
+
+        self._call(app, {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/v1/a',
+                         'HTTP_INSPECTOR': 'Timing'})
+        status, body = self._call(app, {'REQUEST_METHOD': 'GET',
+                                        'PATH_INFO': '/inspector/stats'})
+        self.assertEqual(status, '200 OK')
+        data = json.loads(body)
+        self.assertEqual(data['server_type'], 'proxy')
+        self.assertEqual(len(data['histograms']), 1)
+        self.assertEqual(data['histograms'][0]['inspector'], 'timing')
+        self.assertEqual(data['histograms'][0]['count'], 1)
+
+        status, body = self._call(app, {'REQUEST_METHOD': 'PUT',
+                                        'PATH_INFO': '/inspector/stats'})
+        self.assertEqual(status, '405 Method Not Allowed')
+
+    def test_signature_required_with_hmac_key(self):
+        def fake_app(env, start_response):
+            start_response('200 OK', [])
+            return ['']
+        expires = int(time.time() + 60)
+        signed = {'HTTP_INSPECTOR': 'Timing',
+                  'HTTP_INSPECTOR_EXPIRES': str(expires),
+                  'HTTP_INSPECTOR_SIG': create_sig(
+                      ['Timing'], expires, 'Password1')}
+        for middleware in (proxy, object_middleware):
+            app = middleware.InspectorMiddleware(
+                fake_app, {'hmac_key': 'Password1'})
+            env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/inspector/stats'}
+            status, body = self._call(app, dict(env))
+            self.assertEqual(status, '401 Unauthorized')
+            self.assertFalse('histograms' in body)
+
+            env.update(signed)
+            status, body = self._call(app, env)
+            self.assertEqual(status, '200 OK')
+            self.assertTrue('histograms' in json.loads(body))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from swift_inspector.inspectors import timing
+
+
+class FakeLogger(object):
+
+    def __init__(self):
+        self.lines = []
+        self.timings = {}
+        self.stats = {}
+
+    def info(self, msg):
+        self.lines.append(msg)
+
+    def timing(self, metric, timing_ms):
+        self.timings[metric] = timing_ms
+
+    def update_stats(self, metric, amount):
+        self.stats[metric] = amount
+
+
+class TestStreamingTiming(unittest.TestCase):
+
+    def _make_iter(self, app_iter, logger):
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/v1/a/c/o'}
+        return timing.StreamingTiming(app_iter, env, 0, 'proxy',
+                                      {'logger': logger})
+
+    def test_body_timing_logged(self):
+        logger = FakeLogger()
+        body = ''.join(self._make_iter(['abc', 'defg'], logger))
+        self.assertEqual(body, 'abcdefg')
+        self.assertEqual(len(logger.lines), 1)
+        self.assertTrue('bytes=7' in logger.lines[0])
+        self.assertTrue('GET.first_byte.timing' in logger.timings)
+        self.assertTrue('GET.last_byte.timing' in logger.timings)
+        self.assertEqual(logger.stats['GET.xfer'], 7)
+
+    def test_close_passed_through_and_finished_once(self):
+        closed = []
+
+        class ClosingIter(list):
+            def close(self):
+                closed.append(True)
+
+        logger = FakeLogger()
+        app_iter = self._make_iter(ClosingIter(['abc']), logger)
+        for chunk in app_iter:
+            pass
+        app_iter.close()
+        self.assertEqual(closed, [True])
+        self.assertEqual(len(logger.lines), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
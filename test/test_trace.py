@@ -0,0 +1,74 @@
+# Copyright 2014 Richard Hawkins
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from swift_inspector import trace
+from test.test_inspector import (
+    get_fake_app, get_response, reset_response, start_response)
+
+
+class TestTrace(unittest.TestCase):
+
+    def test_compact_headers(self):
+        headers = [('Content-Type', 'text/plain'),
+                   ('Inspector-Timing', '0.0125'),
+                   ('Inspector-Nodes', 'http://127.0.0.1:6010/sdb1/3'),
+                   ('Inspector-More-Nodes-Next', '10'),
+                   ('Inspector-Error', 'Invalid Inspectors: Foo')]
+        trace.compact_headers(headers)
+        headers = dict(headers)
+        self.assertEqual(headers['Server-Timing'], 'timing;dur=12.500')
+        self.assertEqual(headers['Inspector-Error'],
+                         'Invalid Inspectors: Foo')
+        self.assertFalse('Inspector-Timing' in headers)
+        self.assertEqual(trace.decode_trace(headers['Inspector-Trace']),
+                         {'timing': '0.0125',
+                          'nodes': 'http://127.0.0.1:6010/sdb1/3',
+                          'more-nodes-next': '10'})
+
+    def test_server_timing_only_timing_results(self):
+        self.assertEqual(trace.server_timing({
+            'timing': '0.0125', 'timing-object': '0.002',
+            'more-nodes-next': '10', 'probe': '1.5'}),
+            'timing;dur=12.500, timing-object;dur=2.000')
+
+    def test_trace_truncated_largest_first(self):
+        headers = [('Inspector-Timing', '0.0125'),
+                   ('Inspector-More-Nodes', ''.join(
+                       [chr(i % 94 + 33) for i in range(4096)]))]
+        trace.compact_headers(headers, max_size=200)
+        value = dict(headers)['Inspector-Trace']
+        self.assertTrue(len(value) <= 200)
+        self.assertEqual(trace.decode_trace(value),
+                         {'timing': '0.0125', 'truncated': ['more-nodes']})
+
+    def test_no_results(self):
+        headers = [('Content-Type', 'text/plain')]
+        trace.compact_headers(headers)
+        self.assertEqual(headers, [('Content-Type', 'text/plain')])
+
+    def test_compact_output_requested(self):
+        reset_response()
+        app = get_fake_app()
+        env = {'HTTP_INSPECTOR': 'Timing', 'HTTP_INSPECTOR_OUTPUT': 'compact'}
+        ''.join(app(env, start_response))
+        headers = dict(get_response()[1])
+        self.assertTrue(headers['Server-Timing'].startswith('timing;dur='))
+        self.assertTrue('timing' in trace.decode_trace(
+            headers['Inspector-Trace']))
+        self.assertFalse('Inspector-Timing' in headers)
+
+
+if __name__ == '__main__':
+    unittest.main()